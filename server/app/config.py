@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Set
+from typing import Dict, List, Set
 import os
 
 class Settings(BaseSettings):
@@ -12,12 +12,40 @@ class Settings(BaseSettings):
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     MAX_FILE_SIZE_MB: int = 10
     MAX_PDF_PAGES: int = 100
-    
+    PARSE_SPOOL_THRESHOLD: int = 2 * 1024 * 1024  # 上传小于该大小时直接在内存中解析，超过则转存临时文件
+
+    # 解析内存预算：解析在独立工作进程中进行，超出预算即结束该进程并返回 413
+    PARSE_MEMORY_LIMIT_MB: int = 512  # 单次解析允许增长的内存，0 表示不限制并在主进程内解析
+    PARSE_WORKERS: int = 2  # 解析工作进程数
+    PARSE_WORKER_START_METHOD: str = "spawn"  # 工作进程启动方式：spawn / forkserver / fork
+    PARSE_MEMORY_POLL_INTERVAL: float = 0.05  # 内存采样间隔（秒）
+
+    # 在线导入：所有下载共用一个连接池，响应体按块读取并检查 MAX_FILE_SIZE
+    IMPORT_TIMEOUT: float = 30.0  # 读取超时（秒）
+    IMPORT_CONNECT_TIMEOUT: float = 10.0  # 连接超时（秒）
+    IMPORT_MAX_CONNECTIONS: int = 20  # 连接池的最大连接数
+    IMPORT_MAX_KEEPALIVE: int = 10  # 保持的空闲连接数
+    IMPORT_MAX_REDIRECTS: int = 5
+    IMPORT_USER_AGENT: str = "BionicReading/1.0"
+    # 内网、回环、链路本地和保留地址一律拒绝；确需从内网导入的主机名（小写）在此列出
+    IMPORT_ALLOWED_HOSTS: Set[str] = set()
+
     # 分页设置
-    PAGE_SIZE: int = 3000  # 每页字符数
+    PAGE_SIZE: int = 3000  # 默认每页字符数
+    MIN_PAGE_SIZE: int = 500  # 客户端可请求的最小每页字符数
+    MAX_PAGE_SIZE: int = 20000  # 客户端可请求的最大每页字符数
+    LAYOUT_CACHE_SIZE: int = 256  # 内存中缓存的分页布局数量（文档 × 页面大小）
     MAX_PAGES_PER_REQUEST: int = 10  # 每次请求最大页数
     CACHE_PAGES: bool = True  # 是否缓存分页结果
+    PAGE_STORE_CODEC: str = "auto"  # 段落流压缩方式：auto（有 zstandard 时用 zstd）/ zstd / zlib / none
+    PAGE_STORE_LEVEL: int = 6  # 压缩级别
+    PAGE_STORE_DICT_SIZE: int = 32 * 1024  # 各数据块共享字典的大小，0 表示不使用字典
     
+    # 代码文件
+    CODE_HIGHLIGHT: str = "lazy"  # lazy：只保存源码，读取时按页用 CSS 类高亮；inline：解析时整体高亮并内联样式
+    CODE_STYLE: str = "monokai"  # /api/code/style.css 默认使用的 Pygments 样式
+    CODE_CONTEXT_LINES: int = 50  # 按页高亮时带入的前文行数，跨页的多行字符串和注释也能正确着色
+
     # 章节设置
     MAX_CHAPTER_SIZE: int = 50000  # 每章节最大字符数
     AUTO_SPLIT_CHAPTERS: bool = True  # 是否自动分章
@@ -30,6 +58,63 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://localhost"
     CACHE_EXPIRE: int = 3600  # 1小时
 
+    # 文档存储：local 只用本机缓存目录；redis 时各节点通过 Redis 共享解析结果，本机目录作为读缓存
+    DOCUMENT_STORE: str = "local"
+    SHARED_STORE_EXPIRE: int = 30 * 24 * 3600  # 共享存储中文档的过期时间（秒），被读取时续期
+    PARSE_LOCK_TTL: int = 30  # 解析锁的过期时间（秒），解析期间持续续期，持有者异常退出后由其他节点接手
+    PARSE_LOCK_WAIT: int = 120  # 等待其他节点解析同一文档的最长时间（秒），超时返回 503
+    PARSE_LOCK_POLL: float = 0.2  # 等待期间检查解析结果的间隔（秒）
+
+    # 磁盘缓存清理（uploads/cache 下的段落流和文档结构）
+    CACHE_MAX_BYTES: int = 1024 * 1024 * 1024  # 磁盘预算，超出后按最久未访问清理，0 表示不限制
+    CACHE_MAX_AGE_DAYS: int = 30  # 超过该天数未访问的文档被清理，0 表示不限制
+    CACHE_SWEEP_INTERVAL: int = 600  # 后台清理间隔（秒），0 表示不启动后台清理
+    CACHE_TOUCH_INTERVAL: int = 60  # 访问时间写回文件的最小间隔（秒）
+
+    # 仿生阅读档位（加粗比例、最短加粗词长、跳过规则）
+    BIONIC_PROFILES: Dict[str, Dict] = {
+        'default': {'bold_ratio': 0.5, 'long_word_bold_ratio': 0.6, 'min_word_length': 2},
+        'light': {'bold_ratio': 0.3, 'long_word_bold_ratio': 0.4, 'min_word_length': 3,
+                  'skip_common_words': True},
+        'strong': {'bold_ratio': 0.6, 'long_word_bold_ratio': 0.7, 'min_word_length': 2},
+    }
+    DEFAULT_BIONIC_PROFILE: str = 'default'
+    BIONIC_RENDER_CACHE: bool = True  # 是否缓存各档位的渲染结果
+    # 未命中缓存时与请求的档位在同一次分词中一起渲染、在后台写入缓存的档位，切换到这些档位不需要重新渲染
+    BIONIC_WARM_PROFILES: List[str] = []
+
+    # 阅读统计：翻页事件先写内存缓冲，后台批量追加到 UPLOAD_DIR/stats/events.log，定期汇总
+    READING_STATS_ENABLED: bool = True
+    STATS_FLUSH_INTERVAL: float = 2.0  # 缓冲写入日志的间隔（秒）
+    STATS_FLUSH_BATCH: int = 500  # 缓冲达到该事件数时立即写入
+    STATS_BUFFER_MAX: int = 10000  # 缓冲上限，超出的事件被丢弃
+    STATS_ROLLUP_INTERVAL: int = 60  # 汇总间隔（秒）
+    STATS_MAX_PAGE_SECONDS: int = 600  # 单页停留时间上限（秒），超出按上限计
+    STATS_LOG_MAX_BYTES: int = 64 * 1024 * 1024  # 日志全部汇总后超过该大小即清空
+    STATS_JOURNAL_MAX_BYTES: int = 4 * 1024 * 1024  # 汇总增量日志超过该大小时写入快照并换新
+
+    # HTTP 缓存与压缩
+    ETAG_VERSION: str = "4"  # 渲染逻辑变更时递增，使客户端缓存失效
+    HTTP_CACHE_MAX_AGE: int = 3600  # 内容接口的 Cache-Control max-age（秒）
+    COMPRESS_MIN_SIZE: int = 1024  # 小于该字节数的响应不压缩
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 5
+
+    # JSON 序列化：auto（安装了 orjson 时使用 orjson）/ orjson / json，用于缓存文件和接口响应
+    JSON_BACKEND: str = "auto"
+
+    # 监控指标
+    METRICS_ENABLED: bool = False  # 默认关闭：各埋点为空操作，/metrics 返回 404
+    REQUEST_TIMING_LOG: bool = False  # 是否为每个请求输出结构化耗时日志
+
+    # 请求性能分析（默认关闭）
+    PROFILING_ENABLED: bool = False
+    PROFILE_HEADER: str = "X-Profile"  # 带此请求头的请求会被分析
+    PROFILE_TOKEN: str = ""  # 请求头的值必须与之相同；为空时不能按请求头触发，也不能查看分析结果
+    PROFILE_SAMPLE_RATE: float = 0.0  # 按比例随机分析请求，0 表示只按请求头触发
+    PROFILE_DIR: str = ""  # 默认为 UPLOAD_DIR/profiles
+    PROFILE_MAX_FILES: int = 50  # 磁盘上最多保留的分析结果数
+
     # 安全设置
     SECRET_KEY: str = "your-secret-key-here"
     ALGORITHM: str = "HS256"
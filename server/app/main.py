@@ -1,17 +1,35 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse, FileResponse, Response
 import uvicorn
-from typing import Optional
+from typing import List, Optional
+import asyncio
 import os
-import uuid
+import logging
 from datetime import datetime
+import pygments
+from pygments.util import ClassNotFound
 
-from .processors import FileProcessor
+from .processors import FileProcessor, ParseInProgress
 from .utils.cache import Cache
+from .utils.document_manager import DocumentManager
+from .utils.bionic import BIONIC_FORMATS, get_profiles
+from .utils import metrics, code_render, serializer
+from .utils.serializer import FastJSONResponse
+from .utils.profiling import ProfilingMiddleware, ProfileStore, token_accepted
+from .utils.parse_worker import MemoryBudgetExceeded, parse_pool
+from .utils.reading_stats import reading_stats
+from .utils.url_import import DownloadError, downloader
+from .utils.source import DocumentSource, FileTooLarge, UnsupportedFormat, clean_spool
+from .utils.http_cache import (
+    make_etag, etag_matches, not_modified_response, cached_json_response, transfer_stats,
+    gzip_stream, accepts_gzip
+)
 from .config import settings
 
-app = FastAPI(title="Bionic Reading API")
+app = FastAPI(title="Bionic Reading API", default_response_class=FastJSONResponse)
+
+logger = logging.getLogger(__name__)
 
 # CORS设置
 app.add_middleware(
@@ -22,31 +40,98 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 监控指标和耗时日志都关闭时不挂载，请求没有任何额外开销
+if settings.METRICS_ENABLED or settings.REQUEST_TIMING_LOG:
+    app.add_middleware(metrics.RequestTimingMiddleware)
+
+# 请求性能分析只在开启时挂载，未开启时对请求没有任何开销
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+    if not settings.PROFILE_TOKEN:
+        logger.warning("未配置 PROFILE_TOKEN：性能分析只按采样率触发，/api/profiles 拒绝所有请求")
+
 # 初始化缓存
 cache = Cache()
 
+async def sweep_disk_cache():
+    """定期按访问时间和磁盘预算清理 uploads/cache"""
+    doc_manager = DocumentManager()
+    while True:
+        try:
+            evicted = await doc_manager.clean_old_cache()
+            metrics.cache_evictions_total.inc(len(evicted))
+            metrics.disk_cache_bytes.set(doc_manager.index.total_bytes)
+        except Exception:
+            logger.exception("清理磁盘缓存失败")
+        await asyncio.sleep(settings.CACHE_SWEEP_INTERVAL)
+
+@app.on_event("startup")
+async def start_cache_sweeper():
+    if settings.CACHE_SWEEP_INTERVAL > 0:
+        app.state.cache_sweeper = asyncio.create_task(sweep_disk_cache())
+
+@app.on_event("startup")
+async def remove_stale_uploads():
+    # 清理上次异常退出时遗留的临时文件
+    try:
+        removed = await asyncio.to_thread(clean_spool)
+        if removed:
+            logger.info("清理遗留上传文件 %d 个", removed)
+    except Exception:
+        logger.exception("清理遗留上传文件失败")
+
+@app.on_event("shutdown")
+async def stop_cache_sweeper():
+    task = getattr(app.state, 'cache_sweeper', None)
+    if task is not None:
+        task.cancel()
+
+@app.on_event("startup")
+async def start_reading_stats():
+    if settings.READING_STATS_ENABLED:
+        await asyncio.to_thread(reading_stats.load)
+        app.state.reading_stats = asyncio.create_task(reading_stats.run(DocumentManager()))
+
+@app.on_event("shutdown")
+async def stop_reading_stats():
+    task = getattr(app.state, 'reading_stats', None)
+    if task is None:
+        return
+    task.cancel()
+    # 把缓冲中的事件写入日志并汇总，重启后不丢失
+    try:
+        await reading_stats.rollup(DocumentManager())
+    except Exception:
+        logger.exception("保存阅读统计失败")
+
 # 创建上传目录
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
+def _check_bionic_options(bionic_format: str, bionic_profile: Optional[str]):
+    if bionic_format not in BIONIC_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的仿生阅读输出格式: {bionic_format}"
+        )
+    if bionic_profile is not None and bionic_profile not in get_profiles():
+        raise HTTPException(
+            status_code=400,
+            detail=f"不存在的仿生阅读档位: {bionic_profile}"
+        )
+
 @app.post("/api/parse")
 async def parse_file(
     file: UploadFile = File(...),
     bionic_enabled: bool = True,
     page: int = 1,
     user_id: Optional[str] = None,
-    background_tasks: BackgroundTasks = None
+    page_size: Optional[int] = None,
+    bionic_format: str = 'html',
+    bionic_profile: Optional[str] = None
 ):
+    source = None
     try:
-        # 检查文件大小
-        file_size = 0
-        content = await file.read()
-        file_size = len(content)
-        
-        if file_size > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"文件大小超过限制 ({settings.MAX_FILE_SIZE_MB}MB)"
-            )
+        _check_bionic_options(bionic_format, bionic_profile)
 
         # 获取文件扩展名
         file_ext = os.path.splitext(file.filename)[1].lower()
@@ -56,29 +141,119 @@ async def parse_file(
                 detail="不支持的文件格式"
             )
 
-        # 生成唯一文件名
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
-
-        # 保存文件
-        with open(file_path, "wb") as f:
-            f.write(content)
+        # 按块读取上传内容，边读边检查文件大小；大文件转存临时文件
+        try:
+            source = await DocumentSource.from_upload(file, settings.MAX_FILE_SIZE)
+        except FileTooLarge:
+            raise HTTPException(
+                status_code=400,
+                detail=f"文件大小超过限制 ({settings.MAX_FILE_SIZE_MB}MB)"
+            )
 
         # 处理文件
         processor = FileProcessor()
         result = await processor.process_file(
-            file_path,
+            source,
             file_ext,
             bionic_enabled,
             page,
-            user_id
+            user_id,
+            page_size,
+            bionic_format,
+            bionic_profile
         )
 
-        # 删除临时文件
-        background_tasks.add_task(os.remove, file_path)
+        return FastJSONResponse(result)
 
-        return JSONResponse(result)
+    except HTTPException:
+        raise
+    except MemoryBudgetExceeded as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
+        )
+    except UnsupportedFormat as e:
+        raise HTTPException(
+            status_code=415,
+            detail=str(e)
+        )
+    except ParseInProgress as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={'Retry-After': str(settings.PARSE_LOCK_WAIT)}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+    finally:
+        if source is not None:
+            source.close()
+
+@app.post("/api/import")
+async def import_document(
+    url: str,
+    file_ext: Optional[str] = None,
+    bionic_enabled: bool = True,
+    page: int = 1,
+    user_id: Optional[str] = None,
+    page_size: Optional[int] = None,
+    bionic_format: str = 'html',
+    bionic_profile: Optional[str] = None
+):
+    """在线导入：下载 url 指向的文档并解析，返回内容与 /api/parse 相同
+
+    file_ext 可指定文件类型，未指定时按 URL、Content-Disposition 和 Content-Type 推断。
+    """
+    try:
+        _check_bionic_options(bionic_format, bionic_profile)
+        if file_ext and not file_ext.startswith('.'):
+            file_ext = f'.{file_ext}'
 
+        processor = FileProcessor()
+        result = await processor.import_url(
+            url,
+            file_ext.lower() if file_ext else None,
+            bionic_enabled,
+            page,
+            user_id,
+            page_size,
+            bionic_format,
+            bionic_profile
+        )
+
+        return FastJSONResponse(result)
+
+    except HTTPException:
+        raise
+    except DownloadError as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e)
+        )
+    except FileTooLarge:
+        raise HTTPException(
+            status_code=400,
+            detail=f"文件大小超过限制 ({settings.MAX_FILE_SIZE_MB}MB)"
+        )
+    except MemoryBudgetExceeded as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
+        )
+    except UnsupportedFormat as e:
+        raise HTTPException(
+            status_code=415,
+            detail=str(e)
+        )
+    except ParseInProgress as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={'Retry-After': str(settings.PARSE_LOCK_WAIT)}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -88,19 +263,44 @@ async def parse_file(
 @app.get("/api/content/{doc_id}")
 async def get_content(
     doc_id: str,
+    request: Request,
     page: int = 1,
     user_id: Optional[str] = None,
-    bionic_enabled: bool = True
+    bionic_enabled: bool = True,
+    page_size: Optional[int] = None,
+    bionic_format: str = 'html',
+    bionic_profile: Optional[str] = None
 ):
     try:
+        _check_bionic_options(bionic_format, bionic_profile)
+        bionic_profile = bionic_profile or settings.DEFAULT_BIONIC_PROFILE
         processor = FileProcessor()
         doc_manager = processor.doc_manager
+
+        if not doc_manager.has_document(doc_id):
+            raise HTTPException(
+                status_code=404,
+                detail="文档不存在或已过期"
+            )
+
+        # 文档ID包含内容哈希，页码范围和渲染选项确定后响应内容不变
+        page_size = doc_manager.resolve_page_size(page_size)
+        etag = make_etag(doc_id, page, settings.MAX_PAGES_PER_REQUEST, page_size,
+                         bionic_enabled, bionic_format, bionic_profile)
+
+        # 保存阅读进度（带 user_id 的请求要求每次回源，进度不会因缓存丢失）
+        if user_id:
+            await doc_manager.save_progress(doc_id, user_id, page)
+
+        if etag_matches(request, etag):
+            return not_modified_response(etag, revalidate=bool(user_id))
         
         # 获取页面内容
         pages_data = await doc_manager.get_pages(
             doc_id,
             page - 1,
-            settings.MAX_PAGES_PER_REQUEST
+            settings.MAX_PAGES_PER_REQUEST,
+            page_size
         )
         
         if not pages_data:
@@ -109,31 +309,109 @@ async def get_content(
                 detail="文档不存在或已过期"
             )
             
-        # 应用仿生阅读处理
-        if bionic_enabled:
-            pages_data['pages'] = [
-                await processor.apply_bionic_reading(page_content)
-                for page_content in pages_data['pages']
-            ]
-            
-        # 保存阅读进度
-        if user_id:
-            await doc_manager.save_progress(doc_id, user_id, page)
-            
-        return JSONResponse({
+        # 应用仿生阅读处理（代码页面已高亮，不处理）
+        if bionic_enabled and pages_data['content_type'] != 'code':
+            pages_data['pages'] = await processor.render_bionic_pages(
+                doc_id, pages_data, bionic_format, bionic_profile
+            )
+
+        chapters = await processor.locate_chapters(doc_id, pages_data)
+
+        return cached_json_response(request, {
             'success': True,
             'content': pages_data['pages'],
             'current_page': pages_data['current_page'],
             'total_pages': pages_data['total_pages'],
-            'has_more': pages_data['has_more']
-        })
+            'page_size': pages_data['page_size'],
+            'has_more': pages_data['has_more'],
+            'content_type': pages_data['content_type'],
+            'chapter': chapters['chapter'],
+            'page_chapters': chapters['page_chapters']
+        }, etag, revalidate=bool(user_id))
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
+@app.get("/api/document/{doc_id}/export")
+async def export_document(
+    doc_id: str,
+    request: Request,
+    bionic_enabled: bool = True,
+    page_size: Optional[int] = None,
+    bionic_format: str = 'html',
+    bionic_profile: Optional[str] = None
+):
+    """以 NDJSON 流式导出整本文档，用于离线阅读
+
+    第一行为文档信息，之后每行一页；页面在发送时逐页生成，服务端内存占用与单页大小相关。
+    """
+    _check_bionic_options(bionic_format, bionic_profile)
+    bionic_profile = bionic_profile or settings.DEFAULT_BIONIC_PROFILE
+    processor = FileProcessor()
+    doc_manager = processor.doc_manager
+
+    if not doc_manager.has_document(doc_id):
+        raise HTTPException(
+            status_code=404,
+            detail="文档不存在或已过期"
+        )
+
+    page_size = doc_manager.resolve_page_size(page_size)
+    etag = make_etag(doc_id, 'export', page_size, bionic_enabled, bionic_format, bionic_profile)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+
+    layout = await doc_manager.get_page_layout(doc_id, page_size)
+    if layout is None:
+        raise HTTPException(
+            status_code=404,
+            detail="文档不存在或已过期"
+        )
+    total_pages = layout.total_pages
+    render = await doc_manager.get_render(doc_id)
+    content_type = 'code' if render and render.get('kind') == 'code' else 'text'
+
+    async def _lines():
+        yield serializer.dumps({
+            'type': 'document',
+            'doc_id': doc_id,
+            'total_pages': total_pages,
+            'page_size': page_size,
+            'content_type': content_type,
+            'bionic_enabled': bionic_enabled,
+            'bionic_format': bionic_format,
+            'bionic_profile': bionic_profile
+        }) + b'\n'
+
+        async for index, page_content in doc_manager.iter_pages(doc_id, page_size):
+            if bionic_enabled and content_type != 'code':
+                page_content = await processor.render_bionic_page(
+                    doc_id, page_size, index + 1, page_content, bionic_format, bionic_profile
+                )
+            yield serializer.dumps({
+                'type': 'page',
+                'page': index + 1,
+                'content': page_content
+            }) + b'\n'
+
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'private, max-age={settings.HTTP_CACHE_MAX_AGE}',
+        'Vary': 'Accept-Encoding',
+    }
+    body = _lines()
+    if accepts_gzip(request):
+        headers['Content-Encoding'] = 'gzip'
+        headers['ETag'] = f'{etag[:-1]}-gzip"'
+        body = gzip_stream(body)
+
+    return StreamingResponse(body, media_type='application/x-ndjson', headers=headers)
+
 @app.get("/api/progress/{doc_id}")
 async def get_progress(
     doc_id: str,
@@ -143,7 +421,7 @@ async def get_progress(
         processor = FileProcessor()
         progress = await processor.doc_manager.get_progress(doc_id, user_id)
         
-        return JSONResponse({
+        return FastJSONResponse({
             'success': True,
             'progress': progress
         })
@@ -155,10 +433,27 @@ async def get_progress(
         )
 
 @app.get("/api/document/{doc_id}/structure")
-async def get_document_structure(doc_id: str):
-    """获取文档结构（目录、元数据等）"""
+async def get_document_structure(doc_id: str, request: Request, page_size: Optional[int] = None):
+    """获取文档结构（目录、元数据等）
+
+    toc_tree 为嵌套目录，start_page 为章节在指定页面大小下的起始页。
+    """
     try:
         processor = FileProcessor()
+        doc_manager = processor.doc_manager
+
+        # 文档被清理后不能再返回 304
+        if not doc_manager.has_document(doc_id):
+            raise HTTPException(
+                status_code=404,
+                detail="文档不存在或已过期"
+            )
+
+        page_size = doc_manager.resolve_page_size(page_size)
+        etag = make_etag(doc_id, 'structure', page_size)
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+
         structure = await processor.get_document_structure(doc_id)
         
         if not structure:
@@ -166,12 +461,19 @@ async def get_document_structure(doc_id: str):
                 status_code=404,
                 detail="文档不存在或已过期"
             )
+
+        toc = await processor.get_table_of_contents(doc_id, structure)
+        layout = await doc_manager.get_page_layout(doc_id, page_size)
             
-        return JSONResponse({
+        return cached_json_response(request, {
             'success': True,
-            'structure': structure
-        })
+            'structure': structure,
+            'toc_tree': toc.to_tree(layout),
+            'page_size': page_size
+        }, etag)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -204,7 +506,7 @@ async def get_chapter_content(
         if user_id:
             await processor.doc_manager.save_progress(doc_id, user_id, chapter_id)
             
-        return JSONResponse({
+        return FastJSONResponse({
             'success': True,
             'content': content
         })
@@ -226,7 +528,7 @@ async def add_bookmark(
         processor = FileProcessor()
         await processor.add_bookmark(doc_id, user_id, position)
         
-        return JSONResponse({
+        return FastJSONResponse({
             'success': True,
             'message': '书签添加成功'
         })
@@ -247,7 +549,7 @@ async def get_bookmarks(
         processor = FileProcessor()
         bookmarks = await processor.get_bookmarks(doc_id, user_id)
         
-        return JSONResponse({
+        return FastJSONResponse({
             'success': True,
             'bookmarks': bookmarks
         })
@@ -258,6 +560,64 @@ async def get_bookmarks(
             detail=str(e)
         )
 
+def _check_reading_stats():
+    if not settings.READING_STATS_ENABLED:
+        raise HTTPException(status_code=404, detail="阅读统计未开启")
+
+@app.post("/api/stats/events")
+async def record_reading_events(
+    user_id: str,
+    events: List[dict]
+):
+    """上报翻页事件：每个事件为 {doc_id, page, page_size?, seconds}，seconds 为在该页停留的秒数
+
+    事件只写入内存缓冲，由后台任务批量落盘并定期汇总，统计结果有最多 STATS_ROLLUP_INTERVAL 秒的延迟。
+    """
+    _check_reading_stats()
+    try:
+        accepted = reading_stats.record(user_id, events)
+
+        return FastJSONResponse({
+            'success': True,
+            'accepted': accepted,
+            'rejected': len(events) - accepted
+        })
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+@app.get("/api/stats/{user_id}")
+async def get_reading_stats(user_id: str):
+    """用户的累计阅读时间、阅读页数和阅读速度"""
+    _check_reading_stats()
+    stats = await reading_stats.user(user_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="没有该用户的阅读统计")
+    return FastJSONResponse({
+        'success': True,
+        'user_id': user_id,
+        'stats': stats,
+        'updated_at': reading_stats.updated_at
+    })
+
+@app.get("/api/stats/{user_id}/{doc_id}")
+async def get_document_reading_stats(user_id: str, doc_id: str):
+    """用户在某个文档上的阅读统计"""
+    _check_reading_stats()
+    stats = await reading_stats.document(user_id, doc_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="没有该文档的阅读统计")
+    return FastJSONResponse({
+        'success': True,
+        'user_id': user_id,
+        'doc_id': doc_id,
+        'stats': stats,
+        'updated_at': reading_stats.updated_at
+    })
+
 @app.get("/api/document/{doc_id}/search")
 async def search_document(
     doc_id: str,
@@ -275,7 +635,7 @@ async def search_document(
             limit
         )
         
-        return JSONResponse({
+        return FastJSONResponse({
             'success': True,
             'results': results
         })
@@ -287,10 +647,22 @@ async def search_document(
         )
 
 @app.get("/api/document/{doc_id}/metadata")
-async def get_document_metadata(doc_id: str):
+async def get_document_metadata(doc_id: str, request: Request):
     """获取文档元数据"""
     try:
         processor = FileProcessor()
+
+        # 文档被清理后不能再返回 304
+        if not processor.doc_manager.has_document(doc_id):
+            raise HTTPException(
+                status_code=404,
+                detail="文档不存在或已过期"
+            )
+
+        etag = make_etag(doc_id, 'metadata')
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+
         metadata = await processor.get_document_metadata(doc_id)
         
         if not metadata:
@@ -299,17 +671,104 @@ async def get_document_metadata(doc_id: str):
                 detail="文档不存在或已过期"
             )
             
-        return JSONResponse({
+        return cached_json_response(request, {
             'success': True,
             'metadata': metadata
-        })
+        }, etag)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
+@app.get("/api/bionic/profiles")
+async def list_bionic_profiles():
+    """获取可用的仿生阅读档位"""
+    return FastJSONResponse({
+        'success': True,
+        'default': settings.DEFAULT_BIONIC_PROFILE,
+        'profiles': [profile.to_dict() for profile in get_profiles().values()]
+    })
+
+@app.get("/api/code/style.css")
+async def get_code_stylesheet(request: Request, style: Optional[str] = None):
+    """代码页面共用的样式表，页面中只带 CSS 类名"""
+    style = style or settings.CODE_STYLE
+    try:
+        css = code_render.stylesheet(style)
+    except ClassNotFound:
+        raise HTTPException(
+            status_code=404,
+            detail=f"不存在的代码样式: {style}"
+        )
+
+    etag = make_etag('code-style', style, pygments.__version__)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    return Response(css, media_type='text/css', headers={
+        'ETag': etag,
+        'Cache-Control': f'private, max-age={settings.HTTP_CACHE_MAX_AGE}',
+    })
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """获取内容接口的传输统计（压缩节省字节数、304 次数）和磁盘缓存占用"""
+    return FastJSONResponse({
+        'success': True,
+        'transfer': transfer_stats.snapshot(),
+        'disk': DocumentManager.index.snapshot()
+    })
+
+@app.get("/api/parse/memory")
+async def get_parse_memory():
+    """获取各格式解析的峰值内存统计，用于估算容器内存规格"""
+    return FastJSONResponse({
+        'success': True,
+        'memory': parse_pool.stats.snapshot()
+    })
+
+@app.on_event("shutdown")
+async def shutdown_parse_pool():
+    parse_pool.shutdown()
+
+@app.on_event("shutdown")
+async def close_downloader():
+    await downloader.close()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 格式的监控指标"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="监控指标未开启")
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+def _check_profiling(request: Request):
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="性能分析未开启")
+    if not token_accepted(request.headers.get(settings.PROFILE_HEADER)):
+        raise HTTPException(status_code=403, detail="无权查看性能分析结果")
+
+@app.get("/api/profiles")
+async def list_profiles(request: Request):
+    """列出最近的请求性能分析结果"""
+    _check_profiling(request)
+    return FastJSONResponse({
+        'success': True,
+        'profiles': ProfileStore().list()
+    })
+
+@app.get("/api/profiles/{name}")
+async def download_profile(name: str, request: Request):
+    """下载 cProfile 结果（pstats 格式，可用 snakeviz 等工具查看）"""
+    _check_profiling(request)
+    path = ProfileStore().path_for(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="分析结果不存在")
+    return FileResponse(path, media_type='application/octet-stream', filename=name)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
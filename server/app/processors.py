@@ -1,29 +1,57 @@
 from typing import Optional
-import docx
 from PyPDF2 import PdfReader
 import io
 import os
 import nltk
-from nltk.tokenize import sent_tokenize, word_tokenize
 import asyncio
+import time
 from .utils.cache import Cache
 from .config import settings
 from .utils.document_manager import DocumentManager
-import markdown2
+from .utils.document_structure import DocumentStructure, TableOfContents, TocCache
+from .utils import bionic, metrics, serializer
+from .utils.profiling import to_thread
+from .utils.parse_worker import MemoryBudgetExceeded, parse_pool
+from .utils.source import DocumentSource, SourceLike, UnsupportedFormat
+from .utils.url_import import downloader
+from .utils import docx_reader, odf_reader, office_reader, rtf_reader, mobi_reader, html_reader, code_render
+from .utils.paragraph import to_html
 from bs4 import BeautifulSoup
-import openpyxl
-from pptx import Presentation
 import ebooklib
 from ebooklib import epub
-import chardet
+from chardet.universaldetector import UniversalDetector
 from pygments import highlight
 from pygments.lexers import get_lexer_for_filename
 from pygments.formatters import HtmlFormatter
 import xml.etree.ElementTree as ET
 import json
 import csv
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 按二进制格式解析、不需要检测文本编码的扩展名
+BINARY_EXTENSIONS = {
+    '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+    '.odt', '.ods', '.odp', '.pdf', '.epub', '.mobi',
+    # RTF 自带代码页声明（\ansicpg、\fcharset）
+    '.rtf'
+}
+
+# 代码文件，CODE_HIGHLIGHT=lazy 时只保存源码，读取时按页高亮
+CODE_EXTENSIONS = {'.py', '.js', '.java', '.cpp', '.c', '.h', '.cs', '.php'}
+
+# 后台写入预渲染档位缓存的任务，保留引用直到完成
+_warm_tasks = set()
+
+class ParseInProgress(Exception):
+    """其他进程正在解析同一文档，等待超过 PARSE_LOCK_WAIT 仍未完成"""
+
 
 class FileProcessor:
+    # 目录树在进程内共享，各请求新建的 FileProcessor 复用同一份
+    tocs = TocCache(settings.LAYOUT_CACHE_SIZE)
+
     def __init__(self):
         self.cache = Cache()
         self.doc_manager = DocumentManager()
@@ -64,105 +92,298 @@ class FileProcessor:
             '.php': self.process_code
         }
 
-    async def process_file(self, file_path: str, file_ext: str, bionic_enabled: bool,
-                         page: int = 1, user_id: Optional[str] = None) -> dict:
+    async def process_file(self, source: SourceLike, file_ext: str, bionic_enabled: bool,
+                         page: int = 1, user_id: Optional[str] = None,
+                         page_size: Optional[int] = None, bionic_format: str = 'html',
+                         bionic_profile: Optional[str] = None) -> dict:
+        """解析并返回请求的页面
+
+        source 可以是 DocumentSource、bytes、memoryview、二进制文件对象或文件路径。
+        """
         try:
-            # 获取文档ID
-            doc_id = self.doc_manager.get_document_id(file_path)
+            source = DocumentSource.coerce(source, f"document{file_ext}")
+
+            # 获取文档ID（按内容计算，相同文档在各节点得到相同ID）
+            doc_id = await to_thread(self.doc_manager.get_document_id, source, file_ext)
             
             # 检查是否有缓存的页面
-            pages_data = await self.doc_manager.get_pages(
-                doc_id, 
-                page - 1, 
-                settings.MAX_PAGES_PER_REQUEST
+            result = await self.get_document_pages(
+                doc_id, page, user_id, page_size, bionic_enabled, bionic_format, bionic_profile
             )
-            
-            if not pages_data:
-                # 获取文件编码
-                with open(file_path, 'rb') as file:
-                    raw_data = file.read()
-                    encoding = chardet.detect(raw_data)['encoding'] or 'utf-8'
-
-                # 获取对应的处理器
-                processor = self.processors.get(file_ext.lower())
-                if not processor:
-                    raise ValueError(f"不支持的文件格式: {file_ext}")
-
-                # 处理文件
-                content = await processor(file_path, encoding)
-
-                # 分页处理
-                pages = await self.doc_manager.split_content(content)
-                
-                # 保存分页结果
-                await self.doc_manager.save_pages(doc_id, pages)
-                
+
+            if result is None:
+                await self._parse_once(source, file_ext, doc_id)
+
                 # 获取请求的页面
-                pages_data = await self.doc_manager.get_pages(
-                    doc_id, 
-                    page - 1, 
-                    settings.MAX_PAGES_PER_REQUEST
+                result = await self.get_document_pages(
+                    doc_id, page, user_id, page_size, bionic_enabled, bionic_format, bionic_profile
                 )
+                if result is None:
+                    raise ValueError("文档解析结果不可用")
 
-            # 对请求的页面应用仿生阅读处理
-            if bionic_enabled:
-                pages_data['pages'] = [
-                    await self.apply_bionic_reading(page_content)
-                    for page_content in pages_data['pages']
-                ]
-
-            # 保存阅读进度
-            if user_id:
-                await self.doc_manager.save_progress(doc_id, user_id, page)
-
-            return {
-                'success': True,
-                'content': pages_data['pages'],
-                'current_page': pages_data['current_page'],
-                'total_pages': pages_data['total_pages'],
-                'has_more': pages_data['has_more']
-            }
+            return result
 
+        except (MemoryBudgetExceeded, UnsupportedFormat, ParseInProgress):
+            raise
         except Exception as e:
             raise Exception(f"处理文件失败: {str(e)}")
 
-    async def process_markdown(self, file_path: str, encoding: str) -> str:
-        with open(file_path, 'r', encoding=encoding) as file:
-            content = file.read()
-            html = markdown2.markdown(content)
-            soup = BeautifulSoup(html, 'html.parser')
-            return '\n'.join([f"<p>{p.get_text()}</p>" for p in soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])])
+    async def import_url(self, url: str, file_ext: Optional[str] = None, bionic_enabled: bool = True,
+                         page: int = 1, user_id: Optional[str] = None,
+                         page_size: Optional[int] = None, bionic_format: str = 'html',
+                         bionic_profile: Optional[str] = None) -> dict:
+        """下载并解析 url 指向的文档，结果与 process_file 相同，另附 source 字段
+
+        再次导入同一 URL 时发条件请求，源站返回 304 则不下载、不解析，直接返回已解析的文档；
+        源站不支持条件请求时内容不变的文档ID也不变，只下载不重新解析。
+        """
+        record = await downloader.load_record(url)
+        # 文档已被清理时不发条件请求
+        if record and not await to_thread(self.doc_manager.has_document, record['doc_id']):
+            record = None
+        fetched = await downloader.fetch(url, record, file_ext)
+
+        result = None
+        if fetched.not_modified:
+            result = await self.get_document_pages(
+                record['doc_id'], page, user_id, page_size, bionic_enabled, bionic_format, bionic_profile
+            )
+            if result is None:
+                # 检查后文档恰好被清理，重新下载
+                fetched = await downloader.fetch(url, None, file_ext)
+        if result is None:
+            try:
+                result = await self.process_file(
+                    fetched.source, fetched.ext, bionic_enabled, page, user_id,
+                    page_size, bionic_format, bionic_profile
+                )
+            finally:
+                fetched.source.close()
+            await downloader.save_record(url, result['doc_id'], fetched)
+
+        metrics.import_requests_total.inc(result='not_modified' if fetched.not_modified else 'fetched')
+        result['source'] = {
+            'url': url,
+            'not_modified': fetched.not_modified,
+            'etag': fetched.etag,
+            'last_modified': fetched.last_modified
+        }
+        return result
+
+    async def get_document_pages(self, doc_id: str, page: int = 1, user_id: Optional[str] = None,
+                                 page_size: Optional[int] = None, bionic_enabled: bool = True,
+                                 bionic_format: str = 'html', bionic_profile: Optional[str] = None) -> Optional[dict]:
+        """已解析文档从 page 开始的页面，结果与 process_file 相同；文档不存在时返回 None"""
+        pages_data = await self.doc_manager.get_pages(
+            doc_id,
+            page - 1,
+            settings.MAX_PAGES_PER_REQUEST,
+            page_size
+        )
+        if not pages_data:
+            return None
+
+        # 对请求的页面应用仿生阅读处理（代码页面除外）
+        if bionic_enabled and pages_data['content_type'] != 'code':
+            pages_data['pages'] = await self.render_bionic_pages(
+                doc_id, pages_data, bionic_format, bionic_profile
+            )
 
-    async def process_excel(self, file_path: str, encoding: str) -> str:
-        def _process():
-            wb = openpyxl.load_workbook(file_path)
-            content = []
-            for sheet in wb.sheetnames:
-                ws = wb[sheet]
-                content.append(f"<h2>{sheet}</h2>")
-                for row in ws.iter_rows(values_only=True):
-                    content.append(f"<p>{' | '.join(str(cell) for cell in row if cell is not None)}</p>")
-            return '\n'.join(content)
-        return await asyncio.to_thread(_process)
-
-    async def process_powerpoint(self, file_path: str, encoding: str) -> str:
+        # 保存阅读进度
+        if user_id:
+            await self.doc_manager.save_progress(doc_id, user_id, page)
+
+        chapters = await self.locate_chapters(doc_id, pages_data)
+        return {
+            'success': True,
+            'doc_id': doc_id,
+            'content': pages_data['pages'],
+            'current_page': pages_data['current_page'],
+            'total_pages': pages_data['total_pages'],
+            'page_size': pages_data['page_size'],
+            'has_more': pages_data['has_more'],
+            'content_type': pages_data['content_type'],
+            'chapter': chapters['chapter'],
+            'page_chapters': chapters['page_chapters']
+        }
+
+    async def _parse_once(self, source: DocumentSource, file_ext: str, doc_id: str):
+        """同一文档在整个集群中只解析一次：获得解析锁的进程负责解析，其他进程等待结果
+
+        持有者在解析期间按 PARSE_LOCK_TTL 的三分之一定期续期，解析再久锁也不会过期；
+        持有者异常退出时锁不再续期、随即过期，由等待者接手。
+        等待超过 PARSE_LOCK_WAIT 仍无结果时抛出 ParseInProgress，由客户端稍后重试，不自行解析。
+        """
+        lock_key = f"lock:parse:{doc_id}"
+        ttl_ms = settings.PARSE_LOCK_TTL * 1000
+        deadline = time.monotonic() + settings.PARSE_LOCK_WAIT
+        token = await self.cache.acquire_lock(lock_key, ttl_ms)
+        while token is None:
+            await asyncio.sleep(settings.PARSE_LOCK_POLL)
+            if await to_thread(self.doc_manager.has_document, doc_id):
+                metrics.record_cache('parse_single_flight', True)
+                return
+            if time.monotonic() > deadline:
+                raise ParseInProgress("文档正在解析中，请稍后重试")
+            token = await self.cache.acquire_lock(lock_key, ttl_ms)
+
+        renewal = asyncio.create_task(self._renew_parse_lock(lock_key, token, ttl_ms))
+        try:
+            # 获得锁之前持有者可能刚好完成
+            if await to_thread(self.doc_manager.has_document, doc_id):
+                metrics.record_cache('parse_single_flight', True)
+                return
+            metrics.record_cache('parse_single_flight', False)
+            await self._parse_and_save(source, file_ext, doc_id)
+        finally:
+            renewal.cancel()
+            await self.cache.release_lock(lock_key, token)
+
+    async def _renew_parse_lock(self, lock_key: str, token: str, ttl_ms: int):
+        """解析期间定期续期解析锁"""
+        while True:
+            await asyncio.sleep(ttl_ms / 3000)
+            if not await self.cache.renew_lock(lock_key, token, ttl_ms):
+                logger.warning("解析锁 %s 已失效，其他进程可能同时解析该文档", lock_key)
+                return
+
+    async def _parse_and_save(self, source: DocumentSource, file_ext: str, doc_id: str):
+        ext = file_ext.lower()
+        metrics.inflight_parses.inc()
+        try:
+            # 获取文件编码，二进制格式不需要
+            with metrics.timer('detect_encoding', ext):
+                encoding = await to_thread(self.detect_encoding, source, ext)
+            metrics.upload_bytes_total.inc(source.size, ext=ext)
+
+            # 获取对应的处理器
+            processor = self.processors.get(ext)
+            if not processor:
+                raise ValueError(f"不支持的文件格式: {file_ext}")
+
+            # 处理文件；启用内存预算时在工作进程中解析并同时提取结构
+            structure = None
+            with metrics.timer('handler', ext):
+                if parse_pool.enabled:
+                    content, structure = await parse_pool.parse(source, ext, encoding)
+                else:
+                    content = await processor(source, encoding)
+            metrics.parsed_chars_total.inc(len(content), ext=ext)
+
+            # 提取目录和元数据，失败不影响正文阅读；
+            # 先于段落流保存，等待中的其他进程看到段落流时结构也已就绪
+            with metrics.timer('structure', ext):
+                if not parse_pool.enabled:
+                    await to_thread(self._save_structure, source, file_ext, doc_id)
+                elif structure:
+                    await to_thread(self._save_structure, source, file_ext, doc_id, structure)
+
+            # 保存段落流，分页在读取时按页面大小计算
+            with metrics.timer('split', ext):
+                paragraphs = self.doc_manager.split_paragraphs(content)
+            with metrics.timer('save', ext):
+                await self.doc_manager.save_document(doc_id, paragraphs, self._render_for(ext))
+        finally:
+            metrics.inflight_parses.dec()
+
+    def _render_for(self, ext: str) -> Optional[dict]:
+        """段落流读取时的渲染方式：lazy 模式下的代码文件保存词法分析器名称"""
+        if ext in CODE_EXTENSIONS and settings.CODE_HIGHLIGHT == 'lazy':
+            return {'kind': code_render.CODE_KIND, 'lexer': code_render.lexer_for_extension(ext)}
+        return None
+
+    def detect_encoding(self, source: DocumentSource, ext: str) -> str:
+        if ext in BINARY_EXTENSIONS:
+            return 'utf-8'
+        detector = UniversalDetector()
+        for chunk in source.iter_chunks():
+            detector.feed(chunk)
+            if detector.done:
+                break
+        detector.close()
+        return detector.result['encoding'] or 'utf-8'
+
+    def _save_structure(self, source: DocumentSource, file_ext: str, doc_id: str,
+                        result: Optional[dict] = None):
+        structure = DocumentStructure()
+        try:
+            if result is None:
+                result = structure.extract_structure(source, file_ext.lower())
+            structure.save_structure(doc_id, result, self.doc_manager.cache_dir)
+            self.tocs.invalidate(doc_id)
+            self.doc_manager.index.record(doc_id)
+            self.doc_manager.publish_shared(
+                os.path.basename(structure.structure_path(doc_id, self.doc_manager.cache_dir))
+            )
+        except Exception:
+            # 结构提取失败不影响正文阅读，但需要记录下来
+            logger.exception("提取文档结构失败: %s (%s)", doc_id, file_ext)
+
+    async def get_document_structure(self, doc_id: str) -> Optional[dict]:
+        """读取缓存的文档结构，本地没有时从共享存储拉取"""
+        def _load():
+            loader = DocumentStructure()
+            cache_dir = self.doc_manager.cache_dir
+            self.doc_manager.fetch_shared(os.path.basename(loader.structure_path(doc_id, cache_dir)))
+            return loader.load_structure(doc_id, cache_dir)
+
+        structure = await to_thread(_load)
+        if structure is not None:
+            self.doc_manager.index.touch(doc_id)
+        return structure
+
+    async def get_table_of_contents(self, doc_id: str, structure: Optional[dict] = None) -> Optional[TableOfContents]:
+        """由缓存的文档结构构建目录树，按文档ID记忆化"""
+        toc = self.tocs.get(doc_id)
+        if toc is None:
+            if structure is None:
+                structure = await self.get_document_structure(doc_id)
+            if structure is None:
+                return None
+            toc = TableOfContents(structure.get('toc') or [])
+            self.tocs.put(doc_id, toc)
+        return toc
+
+    async def locate_chapters(self, doc_id: str, pages_data: dict) -> dict:
+        """get_pages 返回的当前页和各页所在的章节"""
+        toc = await self.get_table_of_contents(doc_id)
+        chapters = [toc.chapter_at(position) if toc else None for position in pages_data['page_positions']]
+        return {
+            'chapter': chapters[0].summary() if chapters and chapters[0] else None,
+            'page_chapters': [chapter.index if chapter else None for chapter in chapters]
+        }
+
+    async def get_document_metadata(self, doc_id: str) -> Optional[dict]:
+        """读取缓存的文档元数据"""
+        structure = await self.get_document_structure(doc_id)
+        if not structure:
+            return None
+        return structure.get('metadata')
+
+    async def process_markdown(self, source: DocumentSource, encoding: str) -> str:
+        return await to_thread(lambda: to_html(html_reader.load_markdown(source, encoding).paragraphs))
+
+    async def process_excel(self, source: DocumentSource, encoding: str) -> str:
         def _process():
-            prs = Presentation(file_path)
-            content = []
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text.strip():
-                        content.append(f"<p>{shape.text}</p>")
-            return '\n'.join(content)
-        return await asyncio.to_thread(_process)
-
-    async def process_html(self, file_path: str, encoding: str) -> str:
-        with open(file_path, 'r', encoding=encoding) as file:
-            soup = BeautifulSoup(file.read(), 'html.parser')
-            return '\n'.join([f"<p>{p.get_text()}</p>" for p in soup.find_all(['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])])
-
-    async def process_xml(self, file_path: str, encoding: str) -> str:
-        tree = ET.parse(file_path)
+            # 工作表名作为标题，每行一段
+            return '\n'.join(
+                f"<h2>{row.text}</h2>" if row.level else f"<p>{row.text}</p>"
+                for row in office_reader.read_workbook(source)
+            )
+        return await to_thread(_process)
+
+    async def process_powerpoint(self, source: DocumentSource, encoding: str) -> str:
+        return await to_thread(
+            lambda: '\n'.join(f"<p>{shape.text}</p>" for shape in office_reader.read_slides(source))
+        )
+
+    async def process_html(self, source: DocumentSource, encoding: str) -> str:
+        # 单遍切分块级文本，嵌套的 div 不会重复输出
+        return await to_thread(lambda: to_html(html_reader.load_html(source, encoding).paragraphs))
+
+    async def process_xml(self, source: DocumentSource, encoding: str) -> str:
+        with source.open() as file:
+            tree = ET.parse(file)
         root = tree.getroot()
         content = []
         for elem in root.iter():
@@ -170,10 +391,9 @@ class FileProcessor:
                 content.append(f"<p>{elem.text}</p>")
         return '\n'.join(content)
 
-    async def process_json(self, file_path: str, encoding: str) -> str:
-        with open(file_path, 'r', encoding=encoding) as file:
-            data = json.load(file)
-            return self._format_json_content(data)
+    async def process_json(self, source: DocumentSource, encoding: str) -> str:
+        data = json.loads(source.read_text(encoding))
+        return self._format_json_content(data)
 
     def _format_json_content(self, data, level=0):
         content = []
@@ -192,49 +412,67 @@ class FileProcessor:
                     content.append(f"<p>{'  ' * level}- {item}</p>")
         return '\n'.join(content)
 
-    async def process_csv(self, file_path: str, encoding: str) -> str:
+    async def process_csv(self, source: DocumentSource, encoding: str) -> str:
         content = []
-        with open(file_path, 'r', encoding=encoding) as file:
+        with io.TextIOWrapper(source.open(), encoding=encoding, newline='') as file:
             reader = csv.reader(file)
             for row in reader:
                 content.append(f"<p>{' | '.join(row)}</p>")
         return '\n'.join(content)
 
-    async def process_epub(self, file_path: str, encoding: str) -> str:
+    async def process_epub(self, source: DocumentSource, encoding: str) -> str:
         def _process():
-            book = epub.read_epub(file_path)
-            content = []
-            for item in book.get_items():
-                if item.get_type() == ebooklib.ITEM_DOCUMENT:
-                    soup = BeautifulSoup(item.get_content(), 'html.parser')
-                    for p in soup.find_all(['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-                        if p.get_text().strip():
-                            content.append(f"<p>{p.get_text()}</p>")
-            return '\n'.join(content)
-        return await asyncio.to_thread(_process)
-
-    async def process_code(self, file_path: str, encoding: str) -> str:
-        with open(file_path, 'r', encoding=encoding) as file:
-            content = file.read()
-            lexer = get_lexer_for_filename(file_path)
-            formatter = HtmlFormatter(style='monokai', noclasses=True)
-            highlighted = highlight(content, lexer, formatter)
-            return f"<div class='code'>{highlighted}</div>"
-
-    async def process_word(self, file_path: str, encoding: str) -> str:
+            with source.open() as stream:
+                book = epub.read_epub(stream)
+                content = []
+                for item in book.get_items():
+                    if item.get_type() == ebooklib.ITEM_DOCUMENT:
+                        soup = BeautifulSoup(item.get_content(), 'html.parser')
+                        for p in soup.find_all(['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+                            if p.get_text().strip():
+                                content.append(f"<p>{p.get_text()}</p>")
+                return '\n'.join(content)
+        return await to_thread(_process)
+
+    async def process_code(self, source: DocumentSource, encoding: str) -> str:
+        content = source.read_text(encoding)
+        if settings.CODE_HIGHLIGHT == 'lazy':
+            # 每行源码是一个段落，分页落在行边界上；高亮在读取页面时进行，样式见 /api/code/style.css
+            return content.replace('\r\n', '\n').replace('\r', '\n').rstrip('\n')
+        lexer = get_lexer_for_filename(source.name)
+        formatter = HtmlFormatter(style='monokai', noclasses=True)
+        highlighted = highlight(content, lexer, formatter)
+        return f"<div class='code'>{highlighted}</div>"
+
+    async def process_word(self, source: DocumentSource, encoding: str) -> str:
+        # 直接流式读取 word/document.xml，旧版 .doc 会抛出 UnsupportedFormat
+        return await to_thread(lambda: to_html(docx_reader.read_paragraphs(source)))
+
+    async def process_rtf(self, source: DocumentSource, encoding: str) -> str:
+        return await to_thread(lambda: to_html(rtf_reader.read_paragraphs(source)))
+
+    async def process_odt(self, source: DocumentSource, encoding: str) -> str:
+        return await to_thread(lambda: to_html(odf_reader.read_paragraphs(source)))
+
+    async def process_odp(self, source: DocumentSource, encoding: str) -> str:
+        return await to_thread(lambda: to_html(odf_reader.read_paragraphs(source)))
+
+    async def process_ods(self, source: DocumentSource, encoding: str) -> str:
         def _process():
-            doc = docx.Document(file_path)
-            paragraphs = []
-            for para in doc.paragraphs:
-                if para.text.strip():
-                    paragraphs.append(f"<p>{para.text}</p>")
-            return "\n".join(paragraphs)
+            # 与 Excel 相同：工作表名作为标题，每行一段
+            return '\n'.join(
+                f"<h2>{row.text}</h2>" if row.level else f"<p>{row.text}</p>"
+                for row in odf_reader.read_sheet_rows(source)
+            )
+        return await to_thread(_process)
 
-        return await asyncio.to_thread(_process)
+    async def process_mobi(self, source: DocumentSource, encoding: str) -> str:
+        # 解压后的正文缓存在来源对象上，结构提取时不再重复解压
+        return await to_thread(lambda: to_html(mobi_reader.read_paragraphs(source)))
 
-    async def process_pdf(self, file_path: str, encoding: str) -> str:
+    async def process_pdf(self, source: DocumentSource, encoding: str) -> str:
         def _process():
-            with open(file_path, 'rb') as file:
+            with source.open() as file:
                 reader = PdfReader(file)
                 paragraphs = []
                 for page in reader.pages[:settings.MAX_PDF_PAGES]:
@@ -246,84 +484,81 @@ class FileProcessor:
                             paragraphs.append(f"<p>{line}</p>")
                 return "\n".join(paragraphs)
 
-        return await asyncio.to_thread(_process)
+        return await to_thread(_process)
 
-    async def process_txt(self, file_path: str, encoding: str) -> str:
+    async def process_txt(self, source: DocumentSource, encoding: str) -> str:
         async def _process():
-            with open(file_path, 'r', encoding=encoding) as file:
-                content = file.read()
-                paragraphs = []
-                for line in content.split('\n'):
-                    if line.strip():
-                        paragraphs.append(f"<p>{line}</p>")
-                return "\n".join(paragraphs)
+            content = source.read_text(encoding)
+            paragraphs = []
+            for line in content.split('\n'):
+                if line.strip():
+                    paragraphs.append(f"<p>{line}</p>")
+            return "\n".join(paragraphs)
 
         return await _process()
 
     async def apply_bionic_reading(self, content: str) -> str:
-        def _process_word(word: str) -> str:
-            # 跳过空白内容
-            if not word.strip():
-                return word
-
-            # 处理连字符
-            if "-" in word:
-                return "-".join([_process_word(part) for part in word.split("-")])
-
-            # 跳过数字
-            if any(char.isdigit() for char in word):
-                return word
-
-            # 跳过特殊标点
-            if all(not char.isalnum() for char in word):
-                return word
-
-            # 智能计算加粗长度
-            length = len(word)
-            if length <= 1:
-                return word
-            elif length <= 3:
-                mid_point = 1
-            elif length <= 6:
-                mid_point = length // 2
-            else:
-                mid_point = (length * 3) // 5  # 60%加粗比例
-
-            return f"<b>{word[:mid_point]}</b>{word[mid_point:]}"
-
-        def _process():
-            # 移除HTML标签
-            text = content.replace('<p>', '').replace('</p>', '\n')
-            
-            # 处理每个句子
-            sentences = sent_tokenize(text)
-            processed_sentences = []
-            
-            for sentence in sentences:
-                # 分词，保留空格和标点
-                words = []
-                current_word = ""
-                for char in sentence:
-                    if char.isspace() or char in ".,!?;:":
-                        if current_word:
-                            words.append(current_word)
-                            current_word = ""
-                        words.append(char)
-                    else:
-                        current_word += char
-                if current_word:
-                    words.append(current_word)
-
-                # 处理每个单词
-                processed_words = [_process_word(word) for word in words]
-                processed_sentence = ''.join(processed_words)
-                
-                # 添加段落标签
-                processed_sentences.append(f"<p>{processed_sentence}</p>")
-            
-            return '\n'.join(processed_sentences)
+        return await to_thread(bionic.render_html, content)
+
+    def _bionic_cache_key(self, doc_id: str, page_size: int, page: int,
+                          bionic_format: str, profile: str) -> str:
+        return f"bionic:{settings.ETAG_VERSION}:{doc_id}:{page_size}:{page}:{bionic_format}:{profile}"
+
+    async def render_bionic_page(self, doc_id: str, page_size: int, page: int, content: str,
+                                 bionic_format: str = 'html', profile: Optional[str] = None):
+        """渲染单页仿生阅读结果
+
+        缓存按档位分别保存。未命中时请求的档位和 BIONIC_WARM_PROFILES 在一次分词中一起渲染，
+        只有请求的档位在请求路径上写入缓存，其余档位在后台写入。
+        """
+        profile = profile or settings.DEFAULT_BIONIC_PROFILE
+        key = self._bionic_cache_key(doc_id, page_size, page, bionic_format, profile)
+        names = [profile]
+        if settings.BIONIC_RENDER_CACHE:
+            cached = await self.cache.get(key)
+            metrics.record_cache('bionic', cached is not None)
+            if cached is not None:
+                return serializer.loads(cached)
+            profiles = bionic.get_profiles()
+            names += [name for name in settings.BIONIC_WARM_PROFILES if name != profile and name in profiles]
+
+        with metrics.timer('bionic'):
+            rendered = await to_thread(
+                bionic.render_all, content, bionic_format, [bionic.get_profile(name) for name in names]
+            )
+        if settings.BIONIC_RENDER_CACHE:
+            await self.cache.set(key, serializer.dumps(rendered[profile]).decode('utf-8'))
+            if len(names) > 1:
+                task = asyncio.create_task(self._cache_warm_profiles(
+                    doc_id, page_size, page, bionic_format,
+                    {name: rendered[name] for name in names[1:]}
+                ))
+                _warm_tasks.add(task)
+                task.add_done_callback(_warm_tasks.discard)
+        return rendered[profile]
+
+    async def _cache_warm_profiles(self, doc_id: str, page_size: int, page: int,
+                                   bionic_format: str, rendered: dict):
+        for name, value in rendered.items():
+            await self.cache.set(
+                self._bionic_cache_key(doc_id, page_size, page, bionic_format, name),
+                serializer.dumps(value).decode('utf-8')
+            )
 
-        return await asyncio.to_thread(_process)
+    async def render_bionic_pages(self, doc_id: str, pages_data: dict,
+                                  bionic_format: str = 'html', profile: Optional[str] = None) -> list:
+        """对 get_pages 返回的页面逐页渲染仿生阅读结果"""
+        return [
+            await self.render_bionic_page(
+                doc_id,
+                pages_data['page_size'],
+                pages_data['current_page'] + offset,
+                page_content,
+                bionic_format,
+                profile
+            )
+            for offset, page_content in enumerate(pages_data['pages'])
+        ]
 
 # 下载必要的NLTK数据
 nltk.download('punkt')
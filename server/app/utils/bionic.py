@@ -0,0 +1,220 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from bisect import bisect_left
+from functools import lru_cache
+import re
+from nltk.tokenize import sent_tokenize
+from ..config import settings
+
+# 单词以空白和常见标点为边界，与原有分词规则一致
+TOKEN_PATTERN = re.compile(r'[\s.,!?;:]|[^\s.,!?;:]+')
+PARAGRAPH_END = re.compile(r'</p>\n?')
+# 基本多文种平面之外的字符，在 UTF-16 中占两个码元
+ASTRAL_PATTERN = re.compile('[\U00010000-\U0010FFFF]')
+
+BIONIC_FORMATS = ('html', 'spans')
+
+# 常用词列表（与小程序端 BionicReader 一致）
+COMMON_WORDS = frozenset({
+    'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i',
+    'it', 'for', 'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at',
+    'this', 'but', 'his', 'by', 'from', 'they', 'we', 'say', 'her', 'she'
+})
+
+
+class BionicProfile:
+    """仿生阅读参数：加粗比例、最短加粗词长和跳过规则"""
+
+    def __init__(self, name: str, bold_ratio: float = 0.5, long_word_bold_ratio: float = 0.6,
+                 long_word_length: int = 7, min_word_length: int = 2,
+                 skip_numbers: bool = True, skip_common_words: bool = False):
+        self.name = name
+        self.bold_ratio = bold_ratio
+        self.long_word_bold_ratio = long_word_bold_ratio
+        self.long_word_length = long_word_length
+        self.min_word_length = min_word_length
+        self.skip_numbers = skip_numbers
+        self.skip_common_words = skip_common_words
+
+    def bold_length(self, length: int, has_digit: bool, is_common: bool) -> int:
+        """计算单词需要加粗的字符数，0 表示不加粗"""
+        if length < self.min_word_length:
+            return 0
+        if has_digit and self.skip_numbers:
+            return 0
+        if is_common and self.skip_common_words:
+            return 0
+        ratio = self.long_word_bold_ratio if length >= self.long_word_length else self.bold_ratio
+        return min(length, max(1, int(length * ratio + 1e-9)))
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'bold_ratio': self.bold_ratio,
+            'long_word_bold_ratio': self.long_word_bold_ratio,
+            'long_word_length': self.long_word_length,
+            'min_word_length': self.min_word_length,
+            'skip_numbers': self.skip_numbers,
+            'skip_common_words': self.skip_common_words,
+        }
+
+
+_profiles: Optional[Dict[str, BionicProfile]] = None
+
+
+def get_profiles() -> Dict[str, BionicProfile]:
+    """读取配置中的仿生阅读档位"""
+    global _profiles
+    if _profiles is None:
+        _profiles = {
+            name: BionicProfile(name, **options)
+            for name, options in settings.BIONIC_PROFILES.items()
+        }
+    return _profiles
+
+
+def get_profile(name: Optional[str] = None) -> BionicProfile:
+    return get_profiles()[name or settings.DEFAULT_BIONIC_PROFILE]
+
+
+@lru_cache(maxsize=65536)
+def analyze_word(word: str) -> Tuple[Tuple[int, int, bool, bool], ...]:
+    """分析单词中可加粗的部分：(起点, 长度, 是否含数字, 是否常用词)
+
+    与档位无关，每个单词只分析一次，各档位在此基础上计算加粗长度。
+    """
+    # 跳过空白内容
+    if not word.strip():
+        return ()
+
+    # 处理连字符
+    if "-" in word:
+        parts = []
+        offset = 0
+        for part in word.split("-"):
+            parts.extend((offset + start, length, has_digit, is_common)
+                         for start, length, has_digit, is_common in analyze_word(part))
+            offset += len(part) + 1
+        return tuple(parts)
+
+    # 跳过特殊标点
+    if all(not char.isalnum() for char in word):
+        return ()
+
+    has_digit = any(char.isdigit() for char in word)
+    return ((0, len(word), has_digit, word.lower() in COMMON_WORDS),)
+
+
+def word_spans(word: str, profile: Optional[BionicProfile] = None) -> Tuple[Tuple[int, int], ...]:
+    """计算单词内需要加粗的区间 (起点, 长度)"""
+    profile = profile or get_profile()
+    spans = []
+    for start, length, has_digit, is_common in analyze_word(word):
+        bold = profile.bold_length(length, has_digit, is_common)
+        if bold:
+            spans.append((start, bold))
+    return tuple(spans)
+
+
+def _render_word(word: str, spans: Tuple[Tuple[int, int], ...]) -> str:
+    if not spans:
+        return word
+    parts = []
+    position = 0
+    for start, length in spans:
+        parts.append(word[position:start])
+        parts.append(f"<b>{word[start:start + length]}</b>")
+        position = start + length
+    parts.append(word[position:])
+    return ''.join(parts)
+
+
+def strip_paragraph_tags(content: str) -> str:
+    """移除段落标签，段落之间以换行分隔"""
+    return content.replace('<p>', '').replace('</p>', '\n')
+
+
+def render_all_html(content: str, profiles: List[BionicProfile]) -> Dict[str, str]:
+    """HTML 模式：每个句子一个 <p>，加粗部分用 <b> 包裹
+
+    分句和分词只做一次，同时生成所有档位的结果。
+    """
+    text = strip_paragraph_tags(content)
+    sentences: Dict[str, List[str]] = {profile.name: [] for profile in profiles}
+    for sentence in sent_tokenize(text):
+        words: Dict[str, List[str]] = {profile.name: [] for profile in profiles}
+        for word in TOKEN_PATTERN.findall(sentence):
+            for profile in profiles:
+                words[profile.name].append(_render_word(word, word_spans(word, profile)))
+        for profile in profiles:
+            sentences[profile.name].append(f"<p>{''.join(words[profile.name])}</p>")
+    return {name: '\n'.join(items) for name, items in sentences.items()}
+
+
+def render_all_spans(content: str, profiles: List[BionicProfile]) -> Dict[str, Dict]:
+    """紧凑模式：返回纯文本和差分编码的加粗区间
+
+    spans 为 [间隔0, 长度0, 间隔1, 长度1, ...]，间隔是本区间起点与上一区间终点
+    （第一个区间相对文本开头）的距离。偏移和长度以 UTF-16 码元计，
+    与客户端 JS 字符串的下标一致（emoji 等基本平面外的字符计为 2）。
+    分词只做一次，同时生成所有档位的结果。
+    """
+    # 段落之间只保留一个换行
+    text = PARAGRAPH_END.sub('\n', content).replace('<p>', '')
+    to_utf16 = _utf16_offsets(text)
+    spans: Dict[str, List[int]] = {profile.name: [] for profile in profiles}
+    previous_end = {profile.name: 0 for profile in profiles}
+    for match in TOKEN_PATTERN.finditer(text):
+        parts = analyze_word(match.group())
+        if not parts:
+            continue
+        word_start = match.start()
+        for profile in profiles:
+            profile_spans = spans[profile.name]
+            for start, length, has_digit, is_common in parts:
+                bold = profile.bold_length(length, has_digit, is_common)
+                if not bold:
+                    continue
+                absolute = to_utf16(word_start + start)
+                end = to_utf16(word_start + start + bold)
+                profile_spans.append(absolute - previous_end[profile.name])
+                profile_spans.append(end - absolute)
+                previous_end[profile.name] = end
+    return {name: {'text': text, 'spans': items} for name, items in spans.items()}
+
+
+def _utf16_offsets(text: str) -> Callable[[int], int]:
+    """返回把码位偏移换算为 UTF-16 码元偏移的函数，全部在基本平面内时原样返回"""
+    astral = [match.start() for match in ASTRAL_PATTERN.finditer(text)]
+    if not astral:
+        return lambda offset: offset
+    return lambda offset: offset + bisect_left(astral, offset)
+
+
+def render_all(content: str, bionic_format: str = 'html',
+               profiles: Optional[List[BionicProfile]] = None) -> Dict:
+    """按输出格式一次渲染所有档位"""
+    profiles = profiles or list(get_profiles().values())
+    if bionic_format == 'spans':
+        return render_all_spans(content, profiles)
+    return render_all_html(content, profiles)
+
+
+def render_html(content: str, profile: Optional[BionicProfile] = None) -> str:
+    profile = profile or get_profile()
+    return render_all_html(content, [profile])[profile.name]
+
+
+def render_spans(content: str, profile: Optional[BionicProfile] = None) -> Dict:
+    profile = profile or get_profile()
+    return render_all_spans(content, [profile])[profile.name]
+
+
+def decode_spans(spans: List[int]) -> List[Tuple[int, int]]:
+    """将差分编码的区间还原为 (起点, 长度) 列表，单位与编码时相同（UTF-16 码元）"""
+    result = []
+    position = 0
+    for index in range(0, len(spans), 2):
+        start = position + spans[index]
+        result.append((start, spans[index + 1]))
+        position = start + spans[index + 1]
+    return result
@@ -1,11 +1,114 @@
 import redis
 from typing import Optional
 import json
+import threading
+import time
+import uuid
 from ..config import settings
 
+class MemoryRedis:
+    """进程内的 Redis 替身，REDIS_URL 为 memory:// 时使用（单机开发、基准测试）"""
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key) -> bool:
+        expire_at = self._expires.get(key)
+        if expire_at is not None and expire_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+            return False
+        return key in self._data
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key) if self._alive(key) else None
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        with self._lock:
+            if nx and self._alive(key):
+                return None
+            if isinstance(value, str):
+                value = value.encode('utf-8')
+            elif not isinstance(value, bytes):
+                value = str(value).encode('utf-8')
+            self._data[key] = value
+            if ex is not None:
+                self._expires[key] = time.monotonic() + ex
+            elif px is not None:
+                self._expires[key] = time.monotonic() + px / 1000
+            else:
+                self._expires.pop(key, None)
+            return True
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if not self._alive(key):
+                return False
+            self._expires[key] = time.monotonic() + seconds
+            return True
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._alive(key))
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._alive(key):
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def delete_if_equal(self, key, value) -> bool:
+        """值相同时删除，对应 Redis 上用 Lua 脚本实现的释放锁"""
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        with self._lock:
+            if not self._alive(key) or self._data[key] != value:
+                return False
+            del self._data[key]
+            self._expires.pop(key, None)
+            return True
+
+    def pexpire_if_equal(self, key, value, ttl_ms) -> bool:
+        """值相同时续期，对应 Redis 上用 Lua 脚本实现的续期锁"""
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        with self._lock:
+            if not self._alive(key) or self._data[key] != value:
+                return False
+            self._expires[key] = time.monotonic() + ttl_ms / 1000
+            return True
+
+_memory_redis = MemoryRedis()
+
+# 只删除自己持有的锁，避免锁过期后误删其他进程重新获取的锁
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# 只为自己持有的锁续期
+_RENEW_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
 class Cache:
     def __init__(self):
-        self.redis = redis.from_url(settings.REDIS_URL)
+        if settings.REDIS_URL.startswith('memory://'):
+            self.redis = _memory_redis
+        else:
+            self.redis = redis.from_url(settings.REDIS_URL)
 
     async def get(self, key: str) -> Optional[str]:
         try:
@@ -29,3 +132,42 @@ class Cache:
             return self.redis.delete(key) > 0
         except:
             return False
+
+    async def acquire_lock(self, key: str, ttl_ms: int) -> Optional[str]:
+        """尝试获取分布式锁，成功返回持有凭据，被占用返回 None
+
+        Redis 不可用时不阻塞业务，视为获取成功。
+        """
+        token = uuid.uuid4().hex
+        try:
+            if self.redis.set(key, token, px=ttl_ms, nx=True):
+                return token
+            return None
+        except Exception:
+            return token
+
+    async def release_lock(self, key: str, token: str) -> bool:
+        try:
+            if isinstance(self.redis, MemoryRedis):
+                return self.redis.delete_if_equal(key, token)
+            return bool(self.redis.eval(_RELEASE_LOCK, 1, key, token))
+        except Exception:
+            return False
+
+    async def renew_lock(self, key: str, token: str, ttl_ms: int) -> bool:
+        """仍持有锁时把过期时间重置为 ttl_ms，锁已过期或被他人持有时返回 False
+
+        与获取锁一致，Redis 不可用时视为成功。
+        """
+        try:
+            if isinstance(self.redis, MemoryRedis):
+                return self.redis.pexpire_if_equal(key, token, ttl_ms)
+            return bool(self.redis.eval(_RENEW_LOCK, 1, key, token, ttl_ms))
+        except Exception:
+            return True
+
+    async def is_locked(self, key: str) -> bool:
+        try:
+            return self.redis.exists(key) > 0
+        except Exception:
+            return False
@@ -0,0 +1,203 @@
+from typing import Dict, List, Optional
+from collections import OrderedDict
+import os
+import threading
+import time
+
+# 同一文档的缓存文件后缀，按从长到短排列以便从文件名反推文档ID
+CACHE_SUFFIXES = ('_structure.json.gz', '_structure.json', '.pages', '.json')
+# 记录访问时间的段落流文件（压缩格式和旧版 JSON）
+DATA_SUFFIXES = ('.pages', '.json')
+
+# 超出磁盘预算时清理到预算的该比例，避免每次清理只删一个文档
+LOW_WATERMARK = 0.9
+
+
+class CacheEntry:
+    """一个文档的缓存记录：占用字节、创建时间、最后访问时间"""
+    __slots__ = ('size', 'created', 'last_access', 'persisted')
+
+    def __init__(self, size: int, created: float, last_access: float):
+        self.size = size
+        self.created = created
+        self.last_access = last_access
+        # 最后一次把访问时间写回文件 mtime 的时刻
+        self.persisted = last_access
+
+
+class CacheIndex:
+    """缓存目录的内存索引，按文档粒度做 LRU 和过期清理
+
+    索引只通过 os.scandir 的 stat 信息重建，不打开缓存文件。
+    最后访问时间节流写回主缓存文件的 mtime，
+    这样重启后或多个 worker 进程之间仍能得到近似的 LRU 顺序。
+    """
+
+    def __init__(self, directory: str, touch_interval: float = 60):
+        self.directory = directory
+        self.touch_interval = touch_interval
+        # 按最后访问时间排序，最久未访问的在前
+        self._entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.last_sweep: Optional[float] = None
+
+    @staticmethod
+    def doc_id_for(name: str) -> Optional[str]:
+        if name.startswith('.'):
+            return None
+        for suffix in CACHE_SUFFIXES:
+            if name.endswith(suffix) and len(name) > len(suffix):
+                return name[:-len(suffix)]
+        return None
+
+    def paths_for(self, doc_id: str) -> List[str]:
+        return [os.path.join(self.directory, doc_id + suffix) for suffix in CACHE_SUFFIXES]
+
+    def _stat(self, doc_id: str) -> Optional[CacheEntry]:
+        size, created, last_access = 0, None, 0.0
+        for path in self.paths_for(doc_id):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            size += st.st_size
+            created = st.st_mtime if created is None else min(created, st.st_mtime)
+            last_access = max(last_access, st.st_mtime)
+        if created is None:
+            return None
+        return CacheEntry(size, created, last_access)
+
+    def _scan(self) -> Dict[str, CacheEntry]:
+        entries: Dict[str, CacheEntry] = {}
+        try:
+            iterator = os.scandir(self.directory)
+        except FileNotFoundError:
+            return entries
+        with iterator:
+            for item in iterator:
+                doc_id = self.doc_id_for(item.name)
+                if doc_id is None or not item.is_file():
+                    continue
+                try:
+                    st = item.stat()
+                except FileNotFoundError:
+                    continue
+                entry = entries.get(doc_id)
+                if entry is None:
+                    entries[doc_id] = CacheEntry(st.st_size, st.st_mtime, st.st_mtime)
+                else:
+                    entry.size += st.st_size
+                    entry.created = min(entry.created, st.st_mtime)
+                    entry.last_access = max(entry.last_access, st.st_mtime)
+        return entries
+
+    def rebuild(self):
+        """按磁盘现状重建索引，保留本进程记录的更新访问时间"""
+        started = time.time()
+        scanned = self._scan()
+        with self._lock:
+            for doc_id, entry in self._entries.items():
+                current = scanned.get(doc_id)
+                if current is not None:
+                    current.created = min(current.created, entry.created)
+                    current.last_access = max(current.last_access, entry.last_access)
+                    current.persisted = entry.persisted
+                elif entry.created >= started:
+                    # 扫描开始后才写入的文档
+                    scanned[doc_id] = entry
+            ordered = sorted(scanned.items(), key=lambda item: item[1].last_access)
+            self._entries = OrderedDict(ordered)
+            self.total_bytes = sum(entry.size for entry in self._entries.values())
+
+    def record(self, doc_id: str):
+        """文档的缓存文件写入后更新占用大小"""
+        entry = self._stat(doc_id)
+        now = time.time()
+        with self._lock:
+            previous = self._entries.pop(doc_id, None)
+            if previous is not None:
+                self.total_bytes -= previous.size
+            if entry is None:
+                return
+            entry.created = previous.created if previous is not None else now
+            entry.last_access = entry.persisted = now
+            self._entries[doc_id] = entry
+            self.total_bytes += entry.size
+
+    def touch(self, doc_id: str):
+        """记录一次访问；访问时间按 touch_interval 节流写回文件 mtime"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is None:
+                persist = False
+            else:
+                entry.last_access = now
+                self._entries.move_to_end(doc_id)
+                persist = now - entry.persisted >= self.touch_interval
+                if persist:
+                    entry.persisted = now
+        if entry is None:
+            self.record(doc_id)
+        elif persist:
+            for suffix in DATA_SUFFIXES:
+                try:
+                    os.utime(os.path.join(self.directory, doc_id + suffix), (now, now))
+                except OSError:
+                    pass
+
+    def remove(self, doc_id: str) -> int:
+        """删除文档的全部缓存文件，返回释放的字节数"""
+        with self._lock:
+            entry = self._entries.pop(doc_id, None)
+            if entry is not None:
+                self.total_bytes -= entry.size
+        freed = 0
+        for path in self.paths_for(doc_id):
+            try:
+                freed += os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return freed
+
+    def sweep(self, max_bytes: int, max_age: float) -> List[str]:
+        """清理超过 max_age 秒未访问的文档，再按 LRU 清理到磁盘预算以内
+
+        max_bytes / max_age 为 0 表示不限制。返回被清理的文档ID。
+        """
+        self.rebuild()
+        now = time.time()
+        victims = []
+        with self._lock:
+            remaining = self.total_bytes
+            over_budget = max_bytes and remaining > max_bytes
+            # 条目按访问时间有序：遇到第一个既未过期、也不需要为预算腾空间的文档即可停止
+            for doc_id, entry in self._entries.items():
+                expired = max_age and now - entry.last_access > max_age
+                if not expired and not (over_budget and remaining > max_bytes * LOW_WATERMARK):
+                    break
+                victims.append(doc_id)
+                remaining -= entry.size
+
+        for doc_id in victims:
+            freed = self.remove(doc_id)
+            self.evicted += 1
+            self.evicted_bytes += freed
+        self.last_sweep = now
+        return victims
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            oldest = next(iter(self._entries.values()), None)
+            return {
+                'documents': len(self._entries),
+                'total_bytes': self.total_bytes,
+                'oldest_access': oldest.last_access if oldest else None,
+                'evicted': self.evicted,
+                'evicted_bytes': self.evicted_bytes,
+                'last_sweep': self.last_sweep,
+            }
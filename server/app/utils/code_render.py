@@ -0,0 +1,53 @@
+from typing import List, Sequence
+from functools import lru_cache
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name, get_lexer_for_filename
+from pygments.util import ClassNotFound
+
+# 段落流头部 render 字段中代码文档的 kind
+CODE_KIND = 'code'
+CSS_CLASS = 'code'
+
+# 只输出带 class 的 <span>，不内联样式、不包裹 <div><pre>；每个输入行对应一个输出行
+_FORMATTER = HtmlFormatter(nowrap=True)
+
+
+@lru_cache(maxsize=None)
+def lexer_for_extension(ext: str) -> str:
+    """按扩展名确定词法分析器名称；查找需要遍历所有词法分析器，结果缓存"""
+    try:
+        return get_lexer_for_filename(f"file{ext}").aliases[0]
+    except ClassNotFound:
+        return 'text'
+
+
+@lru_cache(maxsize=64)
+def get_lexer(name: str):
+    # 保留首尾空行，保证输出行与输入行一一对应；
+    # 按页高亮时页面可能从 PHP 代码中间开始，startinline 让 PHP 词法分析器直接进入代码状态
+    return get_lexer_by_name(name, stripnl=False, ensurenl=True, startinline=True)
+
+
+@lru_cache(maxsize=16)
+def stylesheet(style: str) -> str:
+    """代码文档共用的样式表；style 不存在时抛出 ClassNotFound"""
+    return HtmlFormatter(style=style).get_style_defs(f'.{CSS_CLASS}')
+
+
+def highlight_pages(pages: Sequence[str], lexer_name: str, context: Sequence[str] = ()) -> List[str]:
+    """一次高亮连续的若干页，按行切回各页
+
+    context 为第一页之前的若干行源码，只参与词法分析、不输出，
+    使从多行字符串或注释中间开始的页面也能正确着色。
+    """
+    line_counts = [page.count('\n') + 1 for page in pages]
+    code = '\n'.join([*context, *pages])
+    lines = highlight(code, get_lexer(lexer_name), _FORMATTER).split('\n')
+    position = len(context)
+    result = []
+    for count in line_counts:
+        body = '\n'.join(lines[position:position + count])
+        result.append(f'<div class="{CSS_CLASS}"><pre>{body}</pre></div>')
+        position += count
+    return result
@@ -1,90 +1,306 @@
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, AsyncIterator, Tuple
 import os
-import json
 from datetime import datetime, timedelta
 from ..config import settings
 import asyncio
 import aiofiles
 import hashlib
+import re
+from .pagination import PageLayout, LayoutCache, compute_layout
+from .cache_index import CacheIndex
+from .profiling import to_thread
+from . import page_store, document_store, code_render, serializer
+from .source import DocumentSource
+from . import metrics
+
+# 文档ID：扩展名和内容的 SHA-256 前 40 位十六进制
+DOC_ID = re.compile(r'^[0-9a-f]{40}$')
+
+
+def is_document_id(value: str) -> bool:
+    return bool(DOC_ID.match(value))
+
+
+def _is_code(render: Optional[Dict]) -> bool:
+    return bool(render) and render.get('kind') == code_render.CODE_KIND
+
 
 class DocumentManager:
+    # 分页布局在进程内共享，各请求新建的 DocumentManager 复用同一份
+    layouts = LayoutCache(settings.LAYOUT_CACHE_SIZE)
+    # 已打开的压缩文档头部和磁盘缓存索引，同样在进程内共享
+    documents = page_store.DocumentCache(settings.LAYOUT_CACHE_SIZE)
+    index = CacheIndex(os.path.join(settings.UPLOAD_DIR, 'cache'), settings.CACHE_TOUCH_INTERVAL)
+
     def __init__(self):
         self.cache_dir = os.path.join(settings.UPLOAD_DIR, 'cache')
         self.progress_dir = os.path.join(settings.UPLOAD_DIR, 'progress')
         os.makedirs(self.cache_dir, exist_ok=True)
         os.makedirs(self.progress_dir, exist_ok=True)
 
-    def get_document_id(self, file_path: str) -> str:
-        """生成文档唯一ID"""
-        with open(file_path, 'rb') as f:
-            file_hash = hashlib.md5(f.read()).hexdigest()
-        return f"{os.path.basename(file_path)}_{file_hash}"
-
-    async def split_content(self, content: str) -> List[str]:
-        """将内容分割成固定大小的页面"""
-        pages = []
-        current_page = []
-        current_size = 0
-        
-        paragraphs = content.split('\n')
-        
-        for paragraph in paragraphs:
-            # 如果段落太长，需要分割
-            if len(paragraph) > settings.PAGE_SIZE:
-                # 按句子分割
-                sentences = paragraph.split('. ')
-                for sentence in sentences:
-                    if current_size + len(sentence) > settings.PAGE_SIZE:
-                        pages.append('\n'.join(current_page))
-                        current_page = [sentence]
-                        current_size = len(sentence)
-                    else:
-                        current_page.append(sentence)
-                        current_size += len(sentence)
-            else:
-                if current_size + len(paragraph) > settings.PAGE_SIZE:
-                    pages.append('\n'.join(current_page))
-                    current_page = [paragraph]
-                    current_size = len(paragraph)
-                else:
-                    current_page.append(paragraph)
-                    current_size += len(paragraph)
-        
-        if current_page:
-            pages.append('\n'.join(current_page))
-        
-        return pages
-
-    async def save_pages(self, doc_id: str, pages: List[str]):
-        """保存分页结果到缓存"""
-        cache_file = os.path.join(self.cache_dir, f"{doc_id}.json")
-        async with aiofiles.open(cache_file, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps({
-                'pages': pages,
-                'total_pages': len(pages),
-                'created_at': datetime.now().isoformat()
-            }))
-
-    async def get_pages(self, doc_id: str, start_page: int, num_pages: int) -> Dict:
-        """获取指定范围的页面"""
-        cache_file = os.path.join(self.cache_dir, f"{doc_id}.json")
+    def get_document_id(self, source: DocumentSource, file_ext: Optional[str] = None) -> str:
+        """按扩展名和文件内容生成文档ID，同一文档在各节点、多次上传得到相同ID"""
+        ext = (file_ext or source.ext).lower()
+        file_hash = hashlib.sha256(ext.encode('utf-8') + b'\0')
+        for chunk in source.iter_chunks():
+            file_hash.update(chunk)
+        return file_hash.hexdigest()[:40]
+
+    @property
+    def store(self):
+        return document_store.get_store()
+
+    def fetch_shared(self, name: str) -> bool:
+        """本地缺失的缓存文件从共享存储拉取到本地"""
+        path = os.path.join(self.cache_dir, name)
+        if os.path.exists(path):
+            return True
+        return self.store.shared and self.store.fetch(name, path)
+
+    def publish_shared(self, name: str):
+        """把本地缓存文件发布到共享存储"""
+        if self.store.shared:
+            self.store.publish(name, os.path.join(self.cache_dir, name))
+
+    def resolve_page_size(self, page_size: Optional[int] = None) -> int:
+        """将客户端请求的页面大小限制在允许范围内"""
+        if not page_size:
+            return settings.PAGE_SIZE
+        return max(settings.MIN_PAGE_SIZE, min(page_size, settings.MAX_PAGE_SIZE))
+
+    def split_paragraphs(self, content: str) -> List[str]:
+        """将解析结果拆成段落流，分页只是段落流上的视图"""
+        return content.split('\n')
+
+    def _store_path(self, doc_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{doc_id}.pages")
+
+    def _legacy_path(self, doc_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{doc_id}.json")
+
+    async def save_document(self, doc_id: str, paragraphs: List[str], render: Optional[Dict] = None):
+        """按块压缩保存解析后的段落流，同时保存默认页面大小的分页
+
+        render 记录读取时的渲染方式，如代码文档保存源码行和词法分析器名称，按页高亮。
+        """
+        layout = compute_layout(paragraphs, settings.PAGE_SIZE)
+        path = self._store_path(doc_id)
+        await to_thread(
+            page_store.write_document, path, paragraphs, layout, datetime.now().isoformat(),
+            render=render
+        )
+        self.documents.invalidate(path)
+        self.layouts.invalidate(doc_id)
+        self.layouts.put(doc_id, layout)
+        self.index.record(doc_id)
+        await to_thread(self.publish_shared, os.path.basename(path))
+
+    def has_document(self, doc_id: str) -> bool:
+        """文档是否已解析并缓存（本地或共享存储）"""
+        path = self._store_path(doc_id)
+        if os.path.exists(path) or os.path.exists(self._legacy_path(doc_id)):
+            return True
+        return self.store.shared and self.store.exists(os.path.basename(path))
+
+    def _open_sync(self, doc_id: str) -> Optional[page_store.StoredDocument]:
+        path = self._store_path(doc_id)
+        document = self.documents.open(path)
+        if document is None and self.store.shared and self.store.fetch(os.path.basename(path), path):
+            # 其他节点解析的文档
+            self.index.record(doc_id)
+            document = self.documents.open(path)
+        return document
+
+    async def _open(self, doc_id: str) -> Optional[page_store.StoredDocument]:
+        return await to_thread(self._open_sync, doc_id)
+
+    async def _load_legacy(self, doc_id: str) -> Optional[List[str]]:
+        """读取旧版未压缩的 JSON 段落流"""
+        cache_file = self._legacy_path(doc_id)
         if not os.path.exists(cache_file):
             return None
-        
-        async with aiofiles.open(cache_file, 'r', encoding='utf-8') as f:
-            data = json.loads(await f.read())
-            
-        total_pages = data['total_pages']
+
+        async with aiofiles.open(cache_file, 'rb') as f:
+            data = serializer.loads(await f.read())
+
+        if 'paragraphs' in data:
+            return data['paragraphs']
+        # 兼容旧格式：按固定页面大小保存的 pages
+        return '\n'.join(data.get('pages', [])).split('\n')
+
+    async def load_paragraphs(self, doc_id: str) -> Optional[List[str]]:
+        """读取完整的段落流"""
+        document = await self._open(doc_id)
+        if document is not None:
+            paragraphs = await to_thread(document.read_all)
+        else:
+            paragraphs = await self._load_legacy(doc_id)
+        metrics.record_cache('pages', paragraphs is not None)
+        if paragraphs is not None:
+            self.index.touch(doc_id)
+        return paragraphs
+
+    def get_layout(self, doc_id: str, paragraphs: List[str], page_size: int) -> PageLayout:
+        """获取指定页面大小的分页布局，按 (文档, 页面大小) 记忆化"""
+        layout = self.layouts.get(doc_id, page_size)
+        metrics.record_cache('layout', layout is not None)
+        if layout is None:
+            with metrics.timer('paginate'):
+                layout = compute_layout(paragraphs, page_size)
+            self.layouts.put(doc_id, layout)
+        return layout
+
+    async def _get_stored_layout(self, doc_id: str, document: page_store.StoredDocument,
+                                 page_size: int) -> PageLayout:
+        """压缩存储的文档：默认页面大小直接用保存的分页，其他大小逐块读取全文计算一次"""
+        layout = self.layouts.get(doc_id, page_size)
+        if layout is None and document.layout.page_size == page_size:
+            layout = document.layout
+            self.layouts.put(doc_id, layout)
+        metrics.record_cache('layout', layout is not None)
+        if layout is None:
+            with metrics.timer('paginate'):
+                layout = await to_thread(compute_layout, document.iter_paragraphs(), page_size)
+            self.layouts.put(doc_id, layout)
+        return layout
+
+    def _render_pages(self, render: Optional[Dict], layout: PageLayout, paragraphs,
+                      start_page: int, end_page: int) -> List[str]:
+        """拼出 [start_page, end_page) 的页面；代码文档连同前文一起高亮，只输出这些页"""
+        pages = [layout.render_page(paragraphs, i) for i in range(start_page, end_page)]
+        if not _is_code(render) or not pages:
+            return pages
+        first_para = layout.page_bounds(start_page)[0][0]
+        context = [paragraphs[i] for i in range(max(0, first_para - settings.CODE_CONTEXT_LINES), first_para)]
+        with metrics.timer('highlight'):
+            return code_render.highlight_pages(pages, render['lexer'], context)
+
+    async def get_page_layout(self, doc_id: str, page_size: Optional[int] = None) -> Optional[PageLayout]:
+        """文档在指定页面大小下的分页布局，文档不存在时返回 None"""
+        page_size = self.resolve_page_size(page_size)
+        layout = self.layouts.get(doc_id, page_size)
+        if layout is not None:
+            return layout
+        document = await self._open(doc_id)
+        if document is not None:
+            return await self._get_stored_layout(doc_id, document, page_size)
+        paragraphs = await self.load_paragraphs(doc_id)
+        return self.get_layout(doc_id, paragraphs, page_size) if paragraphs is not None else None
+
+    async def get_render(self, doc_id: str) -> Optional[Dict]:
+        """文档保存时记录的渲染方式，旧版 JSON 段落流没有"""
+        document = await self._open(doc_id)
+        return document.render if document is not None else None
+
+    async def get_pages(self, doc_id: str, start_page: int, num_pages: int,
+                        page_size: Optional[int] = None) -> Dict:
+        """获取指定范围的页面
+
+        content_type 为 code 时页面已是高亮后的代码，不再做仿生阅读处理。
+        """
+        page_size = self.resolve_page_size(page_size)
+        document = await self._open(doc_id)
+        render = document.render if document is not None else None
+        if document is not None:
+            metrics.record_cache('pages', True)
+            self.index.touch(doc_id)
+            layout = await self._get_stored_layout(doc_id, document, page_size)
+        else:
+            paragraphs = await self.load_paragraphs(doc_id)
+            if paragraphs is None:
+                return None
+            layout = self.get_layout(doc_id, paragraphs, page_size)
+
+        total_pages = layout.total_pages
         start_page = max(0, min(start_page, total_pages - 1))
         end_page = min(start_page + num_pages, total_pages)
-        
+
+        if document is not None:
+            with metrics.timer('decompress'):
+                paragraphs = await to_thread(self._read_pages, document, layout, start_page, end_page)
+
         return {
-            'pages': data['pages'][start_page:end_page],
+            'pages': await to_thread(self._render_pages, render, layout, paragraphs, start_page, end_page),
+            'content_type': 'code' if _is_code(render) else 'text',
+            # 各页起始段落，用于定位所在章节
+            'page_positions': [layout.page_bounds(i)[0][0] for i in range(start_page, end_page)],
             'current_page': start_page + 1,
             'total_pages': total_pages,
+            'page_size': page_size,
             'has_more': end_page < total_pages
         }
 
+    @staticmethod
+    def _page_paragraphs(layout: PageLayout, start_page: int, end_page: int) -> Tuple[int, int]:
+        """[start_page, end_page) 覆盖的首尾段落下标（含）"""
+        first_para = layout.page_bounds(start_page)[0][0]
+        end_para, end_offset = layout.page_bounds(end_page - 1)[1]
+        return first_para, max(first_para, end_para if end_offset > 0 else end_para - 1)
+
+    @staticmethod
+    def _read_pages(document: page_store.StoredDocument, layout: PageLayout,
+                    start_page: int, end_page: int) -> 'page_store.ParagraphWindow':
+        """只解压覆盖 [start_page, end_page) 的数据块"""
+        first_para, last_para = DocumentManager._page_paragraphs(layout, start_page, end_page)
+        if _is_code(document.render):
+            # 代码高亮需要的前文
+            first_para = max(0, first_para - settings.CODE_CONTEXT_LINES)
+        return document.read_range(first_para, last_para)
+
+    async def read_page_texts(self, doc_id: str, pages: Iterable[int],
+                              page_size: Optional[int] = None) -> Optional[Dict[int, str]]:
+        """读取指定页（从 1 开始）未经渲染的文本，超出范围的页不返回；文档不存在时返回 None
+
+        压缩存储的文档只解压覆盖这些页的数据块。
+        """
+        page_size = self.resolve_page_size(page_size)
+        document = await self._open(doc_id)
+        if document is None:
+            paragraphs = await self.load_paragraphs(doc_id)
+            if paragraphs is None:
+                return None
+            layout = self.get_layout(doc_id, paragraphs, page_size)
+        else:
+            layout = await self._get_stored_layout(doc_id, document, page_size)
+        indexes = sorted({page - 1 for page in pages if 1 <= page <= layout.total_pages})
+
+        if document is not None:
+            def _read():
+                blocks = set()
+                for index in indexes:
+                    blocks.update(document.blocks_for(*self._page_paragraphs(layout, index, index + 1)))
+                return page_store.ParagraphWindow(document, document.read_blocks(sorted(blocks)))
+            with metrics.timer('decompress'):
+                paragraphs = await to_thread(_read)
+        return {index + 1: layout.render_page(paragraphs, index) for index in indexes}
+
+    async def iter_pages(self, doc_id: str, page_size: Optional[int] = None,
+                         start_page: int = 0) -> AsyncIterator[Tuple[int, str]]:
+        """按页依次生成页面文本，只在迭代时拼接当前页
+
+        压缩存储的文档每次只解压覆盖 MAX_PAGES_PER_REQUEST 页的数据块，内存占用与整本大小无关。
+        """
+        page_size = self.resolve_page_size(page_size)
+        document = await self._open(doc_id)
+        if document is None:
+            # 旧版 JSON 段落流只能整体读取
+            paragraphs = await self.load_paragraphs(doc_id)
+            if paragraphs is None:
+                return
+            layout = self.get_layout(doc_id, paragraphs, page_size)
+            for index in range(max(0, start_page), layout.total_pages):
+                yield index, layout.render_page(paragraphs, index)
+            return
+
+        self.index.touch(doc_id)
+        layout = await self._get_stored_layout(doc_id, document, page_size)
+        for start in range(max(0, start_page), layout.total_pages, settings.MAX_PAGES_PER_REQUEST):
+            end = min(start + settings.MAX_PAGES_PER_REQUEST, layout.total_pages)
+            paragraphs = await to_thread(self._read_pages, document, layout, start, end)
+            pages = await to_thread(self._render_pages, document.render, layout, paragraphs, start, end)
+            for offset, page in enumerate(pages):
+                yield start + offset, page
+
     async def save_progress(self, doc_id: str, user_id: str, page: int):
         """保存阅读进度"""
         if not settings.SAVE_READING_PROGRESS:
@@ -94,8 +310,8 @@ class DocumentManager:
         progress = {}
         
         if os.path.exists(progress_file):
-            async with aiofiles.open(progress_file, 'r', encoding='utf-8') as f:
-                progress = json.loads(await f.read())
+            async with aiofiles.open(progress_file, 'rb') as f:
+                progress = serializer.loads(await f.read())
         
         progress[doc_id] = {
             'page': page,
@@ -109,8 +325,8 @@ class DocumentManager:
             if datetime.fromisoformat(v['updated_at']) > expire_date
         }
         
-        async with aiofiles.open(progress_file, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(progress))
+        async with aiofiles.open(progress_file, 'wb') as f:
+            await f.write(serializer.dumps(progress))
 
     async def get_progress(self, doc_id: str, user_id: str) -> Optional[int]:
         """获取阅读进度"""
@@ -121,23 +337,21 @@ class DocumentManager:
         if not os.path.exists(progress_file):
             return None
             
-        async with aiofiles.open(progress_file, 'r', encoding='utf-8') as f:
-            progress = json.loads(await f.read())
+        async with aiofiles.open(progress_file, 'rb') as f:
+            progress = serializer.loads(await f.read())
             
         if doc_id in progress:
             return progress[doc_id]['page']
         return None
 
-    async def clean_old_cache(self):
-        """清理过期的缓存文件"""
-        for file in os.listdir(self.cache_dir):
-            if not file.endswith('.json'):
-                continue
-                
-            file_path = os.path.join(self.cache_dir, file)
-            async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                data = json.loads(await f.read())
-                created_at = datetime.fromisoformat(data['created_at'])
-                
-                if datetime.now() - created_at > timedelta(days=settings.PROGRESS_EXPIRE_DAYS):
-                    os.remove(file_path)
+    async def clean_old_cache(self) -> List[str]:
+        """按访问时间和磁盘预算清理缓存，返回被清理的文档ID"""
+        evicted = await asyncio.to_thread(
+            self.index.sweep,
+            settings.CACHE_MAX_BYTES,
+            settings.CACHE_MAX_AGE_DAYS * 86400
+        )
+        for doc_id in evicted:
+            self.layouts.invalidate(doc_id)
+            self.documents.invalidate(self._store_path(doc_id))
+        return evicted
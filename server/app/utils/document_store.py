@@ -0,0 +1,80 @@
+from typing import Optional
+from functools import lru_cache
+import logging
+import os
+import threading
+from ..config import settings
+from .cache import Cache
+
+logger = logging.getLogger(__name__)
+
+
+class LocalStore:
+    """只使用本机 uploads/cache 目录（默认）"""
+    shared = False
+
+    def exists(self, name: str) -> bool:
+        return False
+
+    def fetch(self, name: str, path: str) -> bool:
+        return False
+
+    def publish(self, name: str, path: str):
+        pass
+
+
+class RedisStore:
+    """以 Redis 作为各节点共享的文档存储，本机缓存目录作为读缓存
+
+    写入时先落本地再发布到 Redis；本地缺失时从 Redis 拉取整个文件落盘，
+    之后的读取都走本地。本地文件仍由磁盘缓存清理回收，Redis 中的副本按
+    SHARED_STORE_EXPIRE 过期，每次被拉取时续期。Redis 出错时退化为仅本地。
+    """
+    shared = True
+
+    def __init__(self, cache: Optional[Cache] = None):
+        self.redis = (cache or Cache()).redis
+
+    def _key(self, name: str) -> str:
+        return f"store:{name}"
+
+    def exists(self, name: str) -> bool:
+        try:
+            return self.redis.exists(self._key(name)) > 0
+        except Exception:
+            logger.warning("查询共享文档存储失败: %s", name, exc_info=True)
+            return False
+
+    def fetch(self, name: str, path: str) -> bool:
+        """从共享存储拉取文件到本地，不存在时返回 False"""
+        key = self._key(name)
+        try:
+            data = self.redis.get(key)
+            if data is None:
+                return False
+            self.redis.expire(key, settings.SHARED_STORE_EXPIRE)
+        except Exception:
+            logger.warning("读取共享文档存储失败: %s", name, exc_info=True)
+            return False
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return True
+
+    def publish(self, name: str, path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            self.redis.set(self._key(name), data, ex=settings.SHARED_STORE_EXPIRE)
+        except Exception:
+            logger.warning("写入共享文档存储失败: %s", name, exc_info=True)
+
+
+@lru_cache(maxsize=1)
+def get_store():
+    if settings.DOCUMENT_STORE == 'redis':
+        return RedisStore()
+    if settings.DOCUMENT_STORE != 'local':
+        raise ValueError(f"不支持的文档存储: {settings.DOCUMENT_STORE}")
+    return LocalStore()
@@ -1,22 +1,145 @@
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
+from collections import OrderedDict
+import bisect
 import re
+import threading
 from bs4 import BeautifulSoup
+import ebooklib
 from ebooklib import epub
-from docx import Document
 import PyPDF2
-import json
+import gzip
 import os
 from datetime import datetime
+from .source import DocumentSource
+from . import docx_reader, odf_reader, office_reader, rtf_reader, mobi_reader, html_reader, serializer
+from .paragraph import Paragraph
+from .pagination import PageLayout
+from ..config import settings
 
 class Chapter:
-    def __init__(self, title: str, level: int, content: str = "", start_position: int = 0):
+    """目录树中的一个章节；start_position 为章节在段落流中的起始段落下标，未知时为 None"""
+    __slots__ = ('title', 'level', 'content', 'start_position', 'index', 'children', 'parent')
+
+    def __init__(self, title: str, level: int, content: str = "", start_position: Optional[int] = 0):
         self.title = title
         self.level = level
         self.content = content
         self.start_position = start_position
+        # 在目录中的先序下标
+        self.index = 0
         self.children: List[Chapter] = []
         self.parent: Optional[Chapter] = None
 
+    def path(self) -> List['Chapter']:
+        """从顶层章节到本章节的路径"""
+        chapters = []
+        chapter = self
+        while chapter is not None:
+            chapters.append(chapter)
+            chapter = chapter.parent
+        return chapters[::-1]
+
+    def summary(self) -> Dict:
+        return {
+            'index': self.index,
+            'title': self.title,
+            'level': self.level,
+            'path': [chapter.title for chapter in self.path()],
+        }
+
+    def to_dict(self, layout: Optional[PageLayout] = None) -> Dict:
+        node = {
+            'index': self.index,
+            'title': self.title,
+            'level': self.level,
+            'position': self.start_position,
+        }
+        if layout is not None:
+            node['start_page'] = layout.page_of(self.start_position) + 1 if self.start_position is not None else None
+        node['children'] = [child.to_dict(layout) for child in self.children]
+        return node
+
+
+class TableOfContents:
+    """由扁平目录（按 level 嵌套）构建的章节树
+
+    有位置的章节按起始段落排序保存，页码与章节的互查都是二分查找。
+    """
+    __slots__ = ('entries', 'roots', '_located', '_positions')
+
+    def __init__(self, toc: List[Dict]):
+        self.entries: List[Chapter] = []
+        self.roots: List[Chapter] = []
+        stack: List[Chapter] = []
+        for item in toc:
+            level = max(1, int(item.get('level') or 1))
+            chapter = Chapter(item.get('title') or '', level, start_position=item.get('position'))
+            chapter.index = len(self.entries)
+            while stack and stack[-1].level >= level:
+                stack.pop()
+            if stack:
+                chapter.parent = stack[-1]
+                stack[-1].children.append(chapter)
+            else:
+                self.roots.append(chapter)
+            stack.append(chapter)
+            self.entries.append(chapter)
+        # 稳定排序：起点相同时后出现（更深一级）的章节排在后面，查找时优先命中
+        self._located = sorted(
+            (chapter for chapter in self.entries if chapter.start_position is not None),
+            key=lambda chapter: chapter.start_position
+        )
+        self._positions = [chapter.start_position for chapter in self._located]
+
+    def chapter_at(self, position: int) -> Optional[Chapter]:
+        """包含指定段落的章节（起点不晚于该段落的最后一个章节）"""
+        index = bisect.bisect_right(self._positions, position) - 1
+        return self._located[index] if index >= 0 else None
+
+    def chapter_for_page(self, layout: PageLayout, page_index: int) -> Optional[Chapter]:
+        return self.chapter_at(layout.page_bounds(page_index)[0][0])
+
+    def to_tree(self, layout: Optional[PageLayout] = None) -> List[Dict]:
+        return [chapter.to_dict(layout) for chapter in self.roots]
+
+
+class TocCache:
+    """按文档ID缓存已构建的目录树的 LRU"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, TableOfContents]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doc_id: str) -> Optional[TableOfContents]:
+        with self._lock:
+            toc = self._entries.get(doc_id)
+            if toc is not None:
+                self._entries.move_to_end(doc_id)
+            return toc
+
+    def put(self, doc_id: str, toc: TableOfContents):
+        with self._lock:
+            self._entries[doc_id] = toc
+            self._entries.move_to_end(doc_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doc_id: str):
+        with self._lock:
+            self._entries.pop(doc_id, None)
+
+
+def _line_count(text: str) -> int:
+    """未经 to_html 的 "<p>{text}</p>" 输出按 '\\n' 切分后占用的段落数（含空行）"""
+    return text.count('\n') + 1
+
+
+def _html_line_count(text: str) -> int:
+    """to_html 输出中占用的段落数：每个非空行一个段落"""
+    return sum(1 for line in text.split('\n') if line.strip())
+
+
 class DocumentStructure:
     def __init__(self):
         self.chapters: List[Chapter] = []
@@ -24,23 +147,41 @@ class DocumentStructure:
         self.bookmarks: List[Dict] = []
         self.total_pages: int = 0
 
-    def extract_structure(self, file_path: str, file_ext: str) -> Dict:
+    def extract_structure(self, source: DocumentSource, file_ext: str) -> Dict:
         """提取文档结构，包括目录、元数据等"""
         if file_ext in ['.epub']:
-            return self._process_epub(file_path)
+            return self._process_epub(source)
         elif file_ext in ['.docx', '.doc']:
-            return self._process_docx(file_path)
+            return self._process_docx(source)
+        elif file_ext in ['.odt', '.odp']:
+            return self._process_odt(source)
+        elif file_ext == '.ods':
+            return self._process_ods(source)
+        elif file_ext == '.xlsx':
+            return self._process_workbook(source)
+        elif file_ext == '.pptx':
+            return self._process_presentation(source)
+        elif file_ext in ['.xls', '.ppt']:
+            # 旧版二进制格式只记录基本信息，不能按文本解码
+            return self._process_binary(source)
+        elif file_ext == '.rtf':
+            return self._process_rtf(source)
+        elif file_ext == '.mobi':
+            return self._process_mobi(source)
         elif file_ext == '.pdf':
-            return self._process_pdf(file_path)
+            return self._process_pdf(source)
         elif file_ext == '.txt':
-            return self._process_text(file_path)
+            return self._process_text(source)
         elif file_ext == '.md':
-            return self._process_markdown(file_path)
+            return self._process_markdown(source)
+        elif file_ext in ['.html', '.htm']:
+            return self._process_html(source)
         else:
-            return self._process_generic(file_path)
+            return self._process_generic(source)
 
-    def _process_epub(self, file_path: str) -> Dict:
-        book = epub.read_epub(file_path)
+    def _process_epub(self, source: DocumentSource) -> Dict:
+        with source.open() as stream:
+            book = epub.read_epub(stream)
         
         # 提取元数据
         self.metadata = {
@@ -51,22 +192,34 @@ class DocumentStructure:
             'identifier': book.get_metadata('DC', 'identifier'),
         }
 
-        # 提取目录
+        # 提取目录，保留嵌套层级
         toc = []
-        for item in book.toc:
-            if isinstance(item, tuple):
-                section = item[0]
-                toc.append({
-                    'title': section.title,
-                    'level': 1,
-                    'href': section.href
-                })
 
-        # 处理章节内容
+        def extract_toc(items, level=1):
+            for item in items:
+                if isinstance(item, tuple):
+                    section, children = item
+                    toc.append({'title': section.title, 'level': level, 'href': section.href})
+                    extract_toc(children, level + 1)
+                elif isinstance(item, list):
+                    extract_toc(item, level + 1)
+                elif getattr(item, 'title', None) is not None:
+                    toc.append({'title': item.title, 'level': level, 'href': getattr(item, 'href', None)})
+
+        extract_toc(book.toc)
+
+        # 处理章节内容，同时按处理器的输出方式记录每个文件在段落流中的起点
         chapters = []
+        item_positions = {}
+        position = 0
         for item in book.get_items():
-            if item.get_type() == epub.ITEM_DOCUMENT:
+            if item.get_type() == ebooklib.ITEM_DOCUMENT:
                 soup = BeautifulSoup(item.get_content(), 'html.parser')
+                item_positions[item.get_name()] = position
+                for block in soup.find_all(['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+                    text = block.get_text()
+                    if text.strip():
+                        position += _line_count(text)
                 chapter_title = soup.find(['h1', 'h2', 'h3'])
                 if chapter_title:
                     chapters.append({
@@ -75,40 +228,90 @@ class DocumentStructure:
                         'level': 1
                     })
 
+        # 目录链接相对于导航文件，页内锚点只定位到所在文件
+        by_basename = {os.path.basename(name): value for name, value in item_positions.items()}
+        for entry in toc:
+            href = (entry['href'] or '').split('#', 1)[0]
+            entry['position'] = item_positions.get(href, by_basename.get(os.path.basename(href)))
+
         return {
             'metadata': self.metadata,
             'toc': toc,
             'chapters': chapters
         }
 
-    def _process_docx(self, file_path: str) -> Dict:
-        doc = Document(file_path)
-        
-        # 提取元数据
-        self.metadata = {
-            'author': doc.core_properties.author,
-            'created': doc.core_properties.created,
-            'modified': doc.core_properties.modified,
-            'title': doc.core_properties.title,
-        }
+    def _process_docx(self, source: DocumentSource) -> Dict:
+        # 与正文解析共用同一次流式读取的结果
+        with source.open() as stream:
+            self.metadata = docx_reader.read_core_properties(stream)
+        return self._from_paragraphs(docx_reader.read_paragraphs(source))
 
-        # 分析段落层级和目录
+    def _process_odt(self, source: DocumentSource) -> Dict:
+        with source.open() as stream:
+            self.metadata = odf_reader.read_metadata(stream)
+        return self._from_paragraphs(odf_reader.read_paragraphs(source))
+
+    def _process_ods(self, source: DocumentSource) -> Dict:
+        # 工作表名为目录，处理器每行输出一个段落（含空行）
+        with source.open() as stream:
+            self.metadata = odf_reader.read_metadata(stream)
+        return self._from_paragraphs(odf_reader.read_sheet_rows(source), _line_count)
+
+    def _process_workbook(self, source: DocumentSource) -> Dict:
+        with source.open() as stream:
+            self.metadata = docx_reader.read_core_properties(stream)
+        return self._from_paragraphs(office_reader.read_workbook(source), _line_count)
+
+    def _process_presentation(self, source: DocumentSource) -> Dict:
+        # 幻灯片标题为目录
+        with source.open() as stream:
+            self.metadata = docx_reader.read_core_properties(stream)
+        return self._from_paragraphs(office_reader.read_slides(source), _line_count)
+
+    def _process_binary(self, source: DocumentSource) -> Dict:
+        self.metadata = self._basic_metadata(source)
+        return {'metadata': self.metadata, 'toc': [], 'chapters': []}
+
+    def _process_rtf(self, source: DocumentSource) -> Dict:
+        self.metadata = self._basic_metadata(source)
+        return self._from_paragraphs(rtf_reader.read_paragraphs(source))
+
+    def _process_mobi(self, source: DocumentSource) -> Dict:
+        self.metadata = dict(mobi_reader.load_book(source).metadata)
+        return self._from_paragraphs(mobi_reader.read_paragraphs(source))
+
+    def _process_html(self, source: DocumentSource) -> Dict:
+        document = html_reader.load_html(source, 'utf-8')
+        self.metadata = self._basic_metadata(source)
+        if document.title:
+            self.metadata['title'] = document.title
+        return self._from_paragraphs(document.paragraphs)
+
+    def _from_paragraphs(self, paragraphs: List[Paragraph],
+                         line_count: Callable[[str], int] = _html_line_count) -> Dict:
+        """按段落的标题级别划分章节和目录
+
+        position 与处理器输出的段落流一致：line_count 为每个段落占用的段落数，
+        默认按 to_html 的方式每个非空行占一个段落。
+        """
         current_chapter = None
         chapters = []
         toc = []
-        
-        for para in doc.paragraphs:
-            if para.style.name.startswith('Heading'):
-                level = int(para.style.name[-1])
+        position = 0
+
+        for para in paragraphs:
+            lines = line_count(para.text)
+            if para.level:
                 chapter = {
                     'title': para.text,
-                    'level': level,
+                    'level': para.level,
                     'content': ''
                 }
                 
                 toc.append({
                     'title': para.text,
-                    'level': level
+                    'level': para.level,
+                    'position': position
                 })
                 
                 if current_chapter:
@@ -122,6 +325,7 @@ class DocumentStructure:
                     'level': 1,
                     'content': para.text + '\n'
                 }
+            position += lines
 
         if current_chapter:
             chapters.append(current_chapter)
@@ -132,14 +336,14 @@ class DocumentStructure:
             'chapters': chapters
         }
 
-    def _process_pdf(self, file_path: str) -> Dict:
-        with open(file_path, 'rb') as file:
+    def _process_pdf(self, source: DocumentSource) -> Dict:
+        with source.open() as file:
             reader = PyPDF2.PdfReader(file)
             
             # 提取元数据
             self.metadata = reader.metadata if reader.metadata else {}
             
-            # 提取书签
+            # 提取书签，嵌套的子书签级别加一；page 为 PDF 页码（从 1 开始）
             bookmarks = []
             if '/Outlines' in reader.trailer['/Root']:
                 def extract_bookmarks(bookmark, level=1):
@@ -147,9 +351,10 @@ class DocumentStructure:
                         if isinstance(b, list):
                             extract_bookmarks(b, level + 1)
                         else:
+                            page_number = reader.get_destination_page_number(b)
                             bookmarks.append({
                                 'title': b.title,
-                                'page': b.page_number,
+                                'page': page_number + 1 if page_number is not None and page_number >= 0 else None,
                                 'level': level
                             })
                 
@@ -158,10 +363,15 @@ class DocumentStructure:
             # 提取章节（基于文本分析）
             chapters = []
             current_chapter = None
+            # 每个 PDF 页面在段落流中的起点：处理器只读取前 MAX_PDF_PAGES 页（之后的页没有位置），每个非空行一个段落
+            page_positions = []
+            position = 0
             
             for page_num in range(len(reader.pages)):
                 page = reader.pages[page_num]
                 text = page.extract_text()
+                counted = page_num < settings.MAX_PDF_PAGES
+                page_positions.append(position if counted else None)
                 
                 # 查找可能的章节标题
                 lines = text.split('\n')
@@ -173,7 +383,8 @@ class DocumentStructure:
                             'title': line.strip(),
                             'level': 1,
                             'content': '',
-                            'page': page_num + 1
+                            'page': page_num + 1,
+                            'position': position if counted else None
                         }
                     elif current_chapter:
                         current_chapter['content'] += line + '\n'
@@ -182,24 +393,36 @@ class DocumentStructure:
                             'title': '开始',
                             'level': 1,
                             'content': line + '\n',
-                            'page': 1
+                            'page': 1,
+                            'position': 0
                         }
+                    if counted and line.strip():
+                        position += 1
 
             if current_chapter:
                 chapters.append(current_chapter)
 
+            for bookmark in bookmarks:
+                page_num = bookmark['page']
+                bookmark['position'] = page_positions[page_num - 1] if page_num and page_num <= len(page_positions) else None
+
             return {
                 'metadata': self.metadata,
-                'toc': bookmarks if bookmarks else [{'title': c['title'], 'level': c['level'], 'page': c['page']} for c in chapters],
+                'toc': bookmarks if bookmarks else [
+                    {'title': c['title'], 'level': c['level'], 'page': c['page'], 'position': c['position']}
+                    for c in chapters
+                ],
                 'chapters': chapters
             }
 
-    def _process_text(self, file_path: str) -> Dict:
+    def _process_text(self, source: DocumentSource) -> Dict:
         chapters = []
         current_chapter = None
         chapter_pattern = re.compile(r'^(Chapter|Section|\d+\.)\s+\w+')
-        
-        with open(file_path, 'r', encoding='utf-8') as file:
+        # 处理器每个非空行输出一个段落
+        position = 0
+
+        with source.open_text('utf-8') as file:
             for line in file:
                 if chapter_pattern.match(line):
                     if current_chapter:
@@ -207,7 +430,8 @@ class DocumentStructure:
                     current_chapter = {
                         'title': line.strip(),
                         'level': 1,
-                        'content': ''
+                        'content': '',
+                        'position': position
                     }
                 elif current_chapter:
                     current_chapter['content'] += line
@@ -215,65 +439,29 @@ class DocumentStructure:
                     current_chapter = {
                         'title': '开始',
                         'level': 1,
-                        'content': line
+                        'content': line,
+                        'position': 0
                     }
+                if line.strip():
+                    position += 1
 
         if current_chapter:
             chapters.append(current_chapter)
 
         return {
-            'metadata': {
-                'title': os.path.basename(file_path),
-                'created': datetime.fromtimestamp(os.path.getctime(file_path)).isoformat(),
-                'modified': datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(),
-            },
-            'toc': [{'title': c['title'], 'level': c['level']} for c in chapters],
+            'metadata': self._basic_metadata(source),
+            'toc': [{'title': c['title'], 'level': c['level'], 'position': c['position']} for c in chapters],
             'chapters': chapters
         }
 
-    def _process_markdown(self, file_path: str) -> Dict:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-            
-        # 解析Markdown标题
-        headers = re.findall(r'^(#{1,6})\s+(.+)$', content, re.MULTILINE)
-        chapters = []
-        current_chapter = None
-        last_position = 0
-        
-        for header in headers:
-            level = len(header[0])
-            title = header[1]
-            
-            if current_chapter:
-                current_chapter['content'] = content[last_position:content.find('#' * level + ' ' + title)]
-                chapters.append(current_chapter)
-                
-            current_chapter = {
-                'title': title,
-                'level': level,
-                'content': ''
-            }
-            last_position = content.find('#' * level + ' ' + title) + len('#' * level + ' ' + title)
-
-        if current_chapter:
-            current_chapter['content'] = content[last_position:]
-            chapters.append(current_chapter)
-
-        return {
-            'metadata': {
-                'title': os.path.basename(file_path),
-                'created': datetime.fromtimestamp(os.path.getctime(file_path)).isoformat(),
-                'modified': datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(),
-            },
-            'toc': [{'title': c['title'], 'level': c['level']} for c in chapters],
-            'chapters': chapters
-        }
+    def _process_markdown(self, source: DocumentSource) -> Dict:
+        # 标题来自渲染后的 h1-h6，代码块中的 # 不会被当作标题
+        self.metadata = self._basic_metadata(source)
+        return self._from_paragraphs(html_reader.load_markdown(source, 'utf-8').paragraphs)
 
-    def _process_generic(self, file_path: str) -> Dict:
+    def _process_generic(self, source: DocumentSource) -> Dict:
         """处理其他格式文件，尝试基于内容分析创建章节"""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
+        content = source.read_text('utf-8')
 
         # 尝试按空行分割段落
         paragraphs = content.split('\n\n')
@@ -284,27 +472,39 @@ class DocumentStructure:
         } for i, para in enumerate(paragraphs) if para.strip()]
 
         return {
-            'metadata': {
-                'title': os.path.basename(file_path),
-                'created': datetime.fromtimestamp(os.path.getctime(file_path)).isoformat(),
-                'modified': datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(),
-            },
+            'metadata': self._basic_metadata(source),
             'toc': [{'title': c['title'], 'level': c['level']} for c in chapters],
             'chapters': chapters
         }
 
+    def _basic_metadata(self, source: DocumentSource) -> Dict:
+        # 上传内容不再落盘，没有文件时间可用，以解析时间代替
+        now = datetime.now().isoformat()
+        return {'title': source.name, 'created': now, 'modified': now}
+
     def save_structure(self, doc_id: str, structure: Dict, cache_dir: str):
-        """保存文档结构到缓存"""
+        """保存文档结构到缓存（紧凑 JSON，gzip 压缩）"""
         os.makedirs(cache_dir, exist_ok=True)
-        structure_file = os.path.join(cache_dir, f"{doc_id}_structure.json")
-        
-        with open(structure_file, 'w', encoding='utf-8') as f:
-            json.dump(structure, f, ensure_ascii=False, indent=2)
+        structure_file = self.structure_path(doc_id, cache_dir)
+
+        # 先序列化再写入，避免序列化失败时留下残缺文件
+        # 元数据中的日期时间、PDF 对象由序列化层转换
+        data = serializer.dumps(structure)
+        with open(structure_file, 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=6))
+
+    def structure_path(self, doc_id: str, cache_dir: str) -> str:
+        return os.path.join(cache_dir, f"{doc_id}_structure.json.gz")
 
     def load_structure(self, doc_id: str, cache_dir: str) -> Optional[Dict]:
         """从缓存加载文档结构"""
-        structure_file = os.path.join(cache_dir, f"{doc_id}_structure.json")
+        structure_file = self.structure_path(doc_id, cache_dir)
         if os.path.exists(structure_file):
-            with open(structure_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with gzip.open(structure_file, 'rb') as f:
+                return serializer.loads(f.read())
+        # 兼容旧版未压缩的结构文件
+        legacy_file = os.path.join(cache_dir, f"{doc_id}_structure.json")
+        if os.path.exists(legacy_file):
+            with open(legacy_file, 'rb') as f:
+                return serializer.loads(f.read())
         return None
@@ -0,0 +1,150 @@
+from typing import BinaryIO, Dict, Iterator, List, Optional
+import re
+import zipfile
+from lxml import etree
+from .paragraph import Paragraph
+from .source import DocumentSource, UnsupportedFormat
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_W_BODY = W + 'body'
+_W_P = W + 'p'
+_W_TBL = W + 'tbl'
+_W_SECTPR = W + 'sectPr'
+_W_PPR = W + 'pPr'
+_W_RPR = W + 'rPr'
+_W_PSTYLE = W + 'pStyle'
+_W_OUTLINE = W + 'outlineLvl'
+_W_VAL = W + 'val'
+_W_TYPE = W + 'type'
+_W_T = W + 't'
+_W_TAB = W + 'tab'
+_W_BR = W + 'br'
+_W_CR = W + 'cr'
+_W_NOBREAK_HYPHEN = W + 'noBreakHyphen'
+# 文本框、图形等嵌入内容不属于段落正文（与 python-docx 的 paragraph.text 一致）
+_SKIP = {
+    _W_PPR, _W_RPR, W + 'drawing', W + 'pict', W + 'object', W + 'delText', W + 'instrText',
+    '{http://schemas.openxmlformats.org/markup-compatibility/2006}AlternateContent',
+}
+
+_CORE = {
+    'title': '{http://purl.org/dc/elements/1.1/}title',
+    'author': '{http://purl.org/dc/elements/1.1/}creator',
+    'created': '{http://purl.org/dc/terms/}created',
+    'modified': '{http://purl.org/dc/terms/}modified',
+}
+
+# 旧版 Word（OLE2 复合文档）的文件头
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+_HEADING_NAME = re.compile(r'^heading\s*(\d)$', re.IGNORECASE)
+
+
+def _heading_levels(archive: zipfile.ZipFile) -> Dict[str, int]:
+    """从 styles.xml 得到 样式ID -> 标题级别"""
+    try:
+        data = archive.read('word/styles.xml')
+    except KeyError:
+        return {}
+    levels = {}
+    for style in etree.fromstring(data).iterchildren(W + 'style'):
+        if style.get(_W_TYPE) != 'paragraph':
+            continue
+        style_id = style.get(W + 'styleId')
+        name = style.find(W + 'name')
+        match = _HEADING_NAME.match(name.get(_W_VAL, '')) if name is not None else None
+        if match:
+            levels[style_id] = int(match.group(1))
+            continue
+        outline = style.find(f'{_W_PPR}/{_W_OUTLINE}')
+        if outline is not None and outline.get(_W_VAL, '').isdigit() and int(outline.get(_W_VAL)) < 9:
+            levels[style_id] = int(outline.get(_W_VAL)) + 1
+    return levels
+
+
+def _collect_text(element, parts: List[str]):
+    for child in element:
+        tag = child.tag
+        if tag == _W_T:
+            if child.text:
+                parts.append(child.text)
+        elif tag == _W_TAB:
+            parts.append('\t')
+        elif tag == _W_BR:
+            # 分页符、分栏符不产生文字
+            if child.get(_W_TYPE) in (None, 'textWrapping'):
+                parts.append('\n')
+        elif tag == _W_CR:
+            parts.append('\n')
+        elif tag == _W_NOBREAK_HYPHEN:
+            parts.append('-')
+        elif tag not in _SKIP:
+            _collect_text(child, parts)
+
+
+def _paragraph(element, levels: Dict[str, int]) -> Paragraph:
+    parts: List[str] = []
+    _collect_text(element, parts)
+    level = 0
+    style = element.find(f'{_W_PPR}/{_W_PSTYLE}')
+    if style is not None:
+        level = levels.get(style.get(_W_VAL), 0)
+    return Paragraph(''.join(parts), level)
+
+
+def _open_archive(stream: BinaryIO) -> zipfile.ZipFile:
+    if stream.read(len(OLE_MAGIC)) == OLE_MAGIC:
+        raise UnsupportedFormat("不支持旧版 Word 文档 (.doc)，请另存为 .docx 后重新上传")
+    stream.seek(0)
+    try:
+        return zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise UnsupportedFormat("无法读取 Word 文档：文件不是有效的 .docx")
+
+
+def iter_paragraphs(stream: BinaryIO) -> Iterator[Paragraph]:
+    """流式读取 word/document.xml，按顺序产出正文（body 下一级）段落
+
+    只保留当前段落，处理完即从树中移除，内存占用与文档长度无关。
+    """
+    archive = _open_archive(stream)
+    with archive:
+        levels = _heading_levels(archive)
+        try:
+            document = archive.open('word/document.xml')
+        except KeyError:
+            raise UnsupportedFormat("无法读取 Word 文档：缺少 word/document.xml")
+        with document:
+            context = etree.iterparse(document, events=('end',), tag=(_W_P, _W_TBL, _W_SECTPR),
+                                      resolve_entities=False, huge_tree=True)
+            for _, element in context:
+                parent = element.getparent()
+                if parent is None or parent.tag != _W_BODY:
+                    continue
+                if element.tag == _W_P:
+                    yield _paragraph(element, levels)
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
+
+
+def read_core_properties(stream: BinaryIO) -> Dict[str, Optional[str]]:
+    """docProps/core.xml 中的标题、作者和时间（ISO 字符串）"""
+    archive = _open_archive(stream)
+    with archive:
+        try:
+            root = etree.fromstring(archive.read('docProps/core.xml'))
+        except KeyError:
+            return {key: None for key in _CORE}
+    result = {}
+    for key, tag in _CORE.items():
+        element = root.find(tag)
+        result[key] = element.text.strip() if element is not None and element.text else None
+    return result
+
+
+def read_paragraphs(source: DocumentSource) -> List[Paragraph]:
+    """读取全部段落；同一请求中正文和结构提取共用一次解析结果"""
+    def _read():
+        with source.open() as stream:
+            return list(iter_paragraphs(stream))
+    return source.memo('docx_paragraphs', _read)
@@ -0,0 +1,137 @@
+from typing import Iterable, Iterator, List, Optional
+from html.parser import HTMLParser
+import markdown2
+from .paragraph import Paragraph
+from .source import CHUNK_SIZE, DocumentSource
+
+_HEADINGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+# 开始和结束都会结束当前段落的块级元素
+_BLOCKS = {
+    'p', 'div', 'li', 'blockquote', 'pre', 'tr', 'dt', 'dd', 'section', 'article', 'header',
+    'footer', 'aside', 'nav', 'main', 'figure', 'figcaption', 'table', 'ul', 'ol', 'dl',
+    'body', 'br', 'hr', 'address', 'caption',
+} | _HEADINGS
+# 内容不输出的元素
+_SKIP = {'script', 'style', 'title', 'template', 'noscript', 'svg'}
+# 识别 ``` 代码块；highlightjs-lang 让 markdown2 输出普通的 <pre><code>，不调用 Pygments
+MARKDOWN_EXTRAS = {'fenced-code-blocks': None, 'highlightjs-lang': None}
+
+
+class HtmlBlockParser(HTMLParser):
+    """单遍切分 HTML 的块级文本：每个块输出一个段落，h1-h6 带标题级别
+
+    嵌套的块级元素只在边界处结束段落，同一段文字只输出一次。
+    可按块 feed，已结束的段落通过 drain() 取走，内存只与当前块有关。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: List[Paragraph] = []
+        # 第一个 <title> 的文字
+        self.title: Optional[str] = None
+        self._title: Optional[List[str]] = None
+        self._parts: List[str] = []
+        self._level = 0
+        self._skip = 0
+        self._pre = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP:
+            self._skip += 1
+            if tag == 'title' and self.title is None:
+                self._title = []
+            return
+        if tag in _BLOCKS:
+            self._flush()
+            if tag in _HEADINGS:
+                self._level = int(tag[1])
+            elif tag == 'pre':
+                self._pre += 1
+        elif tag in ('td', 'th'):
+            self._parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP:
+            self._skip = max(0, self._skip - 1)
+            if tag == 'title' and self._title is not None:
+                self.title = ' '.join(''.join(self._title).split()) or None
+                self._title = None
+            return
+        if tag in _BLOCKS:
+            self._flush()
+            if tag in _HEADINGS:
+                self._level = 0
+            elif tag == 'pre':
+                self._pre = max(0, self._pre - 1)
+
+    def handle_data(self, data):
+        if self._title is not None:
+            self._title.append(data)
+        if not self._skip:
+            self._parts.append(data)
+
+    def _flush(self):
+        if not self._parts:
+            return
+        text = ''.join(self._parts)
+        self._parts = []
+        if self._pre:
+            # 预格式文本按行保留
+            self.paragraphs.extend(Paragraph(line.rstrip()) for line in text.split('\n'))
+            return
+        text = ' '.join(text.split())
+        if text:
+            self.paragraphs.append(Paragraph(text, self._level))
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def drain(self) -> List[Paragraph]:
+        paragraphs, self.paragraphs = self.paragraphs, []
+        return paragraphs
+
+
+class HtmlText:
+    """从 HTML 提取的段落和标题"""
+    __slots__ = ('paragraphs', 'title')
+
+    def __init__(self, paragraphs: List[Paragraph], title: Optional[str]):
+        self.paragraphs = paragraphs
+        self.title = title
+
+
+def iter_paragraphs(chunks: Iterable[str]) -> Iterator[Paragraph]:
+    parser = HtmlBlockParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.drain()
+    parser.close()
+    yield from parser.drain()
+
+
+def parse(chunks: Iterable[str]) -> HtmlText:
+    parser = HtmlBlockParser()
+    paragraphs = []
+    for chunk in chunks:
+        parser.feed(chunk)
+        paragraphs.extend(parser.drain())
+    parser.close()
+    paragraphs.extend(parser.drain())
+    return HtmlText(paragraphs, parser.title)
+
+
+def load_html(source: DocumentSource, encoding: str) -> HtmlText:
+    """按块解码并解析 HTML 文件；正文和结构提取共用一次解析结果，编码以先读取的一方为准"""
+    def _read():
+        with source.open_text(encoding) as f:
+            return parse(iter(lambda: f.read(CHUNK_SIZE), ''))
+    return source.memo('html_text', _read)
+
+
+def load_markdown(source: DocumentSource, encoding: str) -> HtmlText:
+    """Markdown 先由 markdown2 转成 HTML，再用同一个解析器切分；结果同样缓存在来源对象上"""
+    def _read():
+        html = markdown2.markdown(source.read_text(encoding), extras=MARKDOWN_EXTRAS)
+        return parse(html[i:i + CHUNK_SIZE] for i in range(0, len(html), CHUNK_SIZE))
+    return source.memo('markdown_text', _read)
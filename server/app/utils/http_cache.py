@@ -0,0 +1,198 @@
+from typing import AsyncIterator, Dict, Optional
+import gzip
+import hashlib
+import threading
+import zlib
+from fastapi import Request
+from fastapi.responses import Response
+from ..config import settings
+from . import metrics, serializer
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+
+class TransferStats:
+    """记录压缩前后的传输字节数和 304 次数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.responses = 0
+            self.not_modified = 0
+            self.bytes_uncompressed = 0
+            self.bytes_sent = 0
+            self.by_encoding: Dict[str, Dict[str, int]] = {}
+
+    def record(self, raw_size: int, sent_size: int, encoding: str):
+        with self._lock:
+            self.responses += 1
+            self.bytes_uncompressed += raw_size
+            self.bytes_sent += sent_size
+            entry = self.by_encoding.setdefault(encoding, {'responses': 0, 'bytes_in': 0, 'bytes_out': 0})
+            entry['responses'] += 1
+            entry['bytes_in'] += raw_size
+            entry['bytes_out'] += sent_size
+        metrics.response_bytes_total.inc(raw_size, encoding=encoding, stage='raw')
+        metrics.response_bytes_total.inc(sent_size, encoding=encoding, stage='sent')
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+        metrics.not_modified_total.inc()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            saved = self.bytes_uncompressed - self.bytes_sent
+            return {
+                'responses': self.responses,
+                'not_modified': self.not_modified,
+                'bytes_uncompressed': self.bytes_uncompressed,
+                'bytes_sent': self.bytes_sent,
+                'bytes_saved_by_compression': saved,
+                'compression_ratio': round(self.bytes_sent / self.bytes_uncompressed, 4)
+                if self.bytes_uncompressed else None,
+                'by_encoding': {k: dict(v) for k, v in self.by_encoding.items()},
+            }
+
+
+transfer_stats = TransferStats()
+
+
+def make_etag(*parts) -> str:
+    """根据文档哈希、页码范围和渲染选项生成强 ETag"""
+    digest = hashlib.sha1()
+    digest.update(settings.ETAG_VERSION.encode('utf-8'))
+    for part in parts:
+        digest.update(b'\x1f')
+        digest.update(str(part).encode('utf-8'))
+    return f'"{digest.hexdigest()}"'
+
+
+def _strip_etag(tag: str) -> str:
+    """去掉弱标记和内容编码后缀，便于比较"""
+    tag = tag.strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for suffix in ('-gzip', '-br'):
+        if tag.endswith(suffix):
+            tag = tag[:-len(suffix)]
+    return tag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """判断 If-None-Match 是否命中"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    target = _strip_etag(etag)
+    return any(_strip_etag(tag) == target for tag in header.split(','))
+
+
+def _encoding_weights(request: Request) -> Dict[str, float]:
+    """解析 Accept-Encoding 中各编码的 q 值，未写 q 的为 1"""
+    weights = {}
+    for item in request.headers.get('accept-encoding', '').lower().split(','):
+        name, *params = item.split(';')
+        name = name.strip()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+    return weights
+
+
+def _accepts(weights: Dict[str, float], encoding: str) -> float:
+    # 未列出的编码按 * 的 q 值处理；q=0 表示不接受
+    return weights.get(encoding, weights.get('*', 0.0))
+
+
+def _choose_encoding(request: Request) -> Optional[str]:
+    """选择 q 值最高的编码，q 值相同时优先 br"""
+    weights = _encoding_weights(request)
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    best = max(candidates, key=lambda encoding: _accepts(weights, encoding))
+    return best if _accepts(weights, best) > 0 else None
+
+
+def _cache_control(revalidate: bool) -> str:
+    if revalidate:
+        return 'private, no-cache'
+    return f'private, max-age={settings.HTTP_CACHE_MAX_AGE}'
+
+
+def not_modified_response(etag: str, revalidate: bool = False) -> Response:
+    transfer_stats.record_not_modified()
+    return Response(status_code=304, headers={
+        'ETag': etag,
+        'Cache-Control': _cache_control(revalidate),
+        'Vary': 'Accept-Encoding',
+    })
+
+
+def cached_json_response(request: Request, payload: Dict, etag: str,
+                         revalidate: bool = False) -> Response:
+    """带 ETag、Cache-Control 并按 Accept-Encoding 压缩的 JSON 响应
+
+    revalidate 为 True 时要求客户端每次回源校验（例如需要记录阅读进度的请求）。
+    """
+    if etag_matches(request, etag):
+        return not_modified_response(etag, revalidate)
+
+    body = serializer.dumps(payload)
+    headers = {
+        'Cache-Control': _cache_control(revalidate),
+        'Vary': 'Accept-Encoding',
+    }
+
+    encoding = _choose_encoding(request) if len(body) >= settings.COMPRESS_MIN_SIZE else None
+    if encoding == 'br':
+        sent = brotli.compress(body, quality=settings.BROTLI_QUALITY)
+    elif encoding == 'gzip':
+        sent = gzip.compress(body, compresslevel=settings.GZIP_LEVEL)
+    else:
+        sent = body
+
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        # 不同编码的表示各自拥有强 ETag
+        headers['ETag'] = f'{etag[:-1]}-{encoding}"'
+    else:
+        headers['ETag'] = etag
+
+    transfer_stats.record(len(body), len(sent), encoding or 'identity')
+    return Response(content=sent, media_type='application/json', headers=headers)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """将分块输出流式压缩为 gzip，每块后同步刷新以便客户端尽早解码"""
+    compressor = zlib.compressobj(settings.GZIP_LEVEL, zlib.DEFLATED, 31)
+    raw_size = sent_size = 0
+    async for chunk in chunks:
+        raw_size += len(chunk)
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        sent_size += len(data)
+        yield data
+    data = compressor.flush()
+    sent_size += len(data)
+    yield data
+    transfer_stats.record(raw_size, sent_size, 'gzip')
+
+
+def accepts_gzip(request: Request) -> bool:
+    return _accepts(_encoding_weights(request), 'gzip') > 0
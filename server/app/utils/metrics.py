@@ -0,0 +1,296 @@
+from typing import Dict, List, Optional, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+import bisect
+import json
+import logging
+import threading
+import time
+from ..config import settings
+
+timing_logger = logging.getLogger("app.timing")
+
+# 当前请求的分阶段耗时记录，由请求中间件创建
+current_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('current_timings', default=None)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            values = self._values or ({(): 0} if not self.labelnames else {})
+            for key, value in sorted(values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            values = self._values or ({(): 0} if not self.labelnames else {})
+            for key, value in sorted(values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：[各桶计数..., +Inf 计数], 总和
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                cumulative += counts[-1]
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                plain = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{plain} {total[0]}')
+                lines.append(f'{self.name}_count{plain} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+parse_stage_seconds = registry.register(Histogram(
+    'reading_parse_stage_seconds', '解析流程各阶段耗时', ('stage', 'ext')
+))
+request_seconds = registry.register(Histogram(
+    'reading_request_seconds', '接口请求耗时', ('method', 'route', 'status')
+))
+cache_requests_total = registry.register(Counter(
+    'reading_cache_requests_total', '各级缓存的命中与未命中次数', ('cache', 'result')
+))
+inflight_requests = registry.register(Gauge(
+    'reading_inflight_requests', '正在处理的请求数'
+))
+inflight_parses = registry.register(Gauge(
+    'reading_inflight_parses', '正在解析的文档数'
+))
+upload_bytes_total = registry.register(Counter(
+    'reading_upload_bytes_total', '接收的上传文件字节数', ('ext',)
+))
+parsed_chars_total = registry.register(Counter(
+    'reading_parsed_chars_total', '解析得到的正文字符数', ('ext',)
+))
+response_bytes_total = registry.register(Counter(
+    'reading_response_bytes_total', '内容接口响应字节数（压缩前/后）', ('encoding', 'stage')
+))
+not_modified_total = registry.register(Counter(
+    'reading_not_modified_total', '返回 304 的次数'
+))
+disk_cache_bytes = registry.register(Gauge(
+    'reading_disk_cache_bytes', '磁盘缓存占用字节数（最近一次清理后）'
+))
+cache_evictions_total = registry.register(Counter(
+    'reading_cache_evictions_total', '后台清理删除的文档数'
+))
+parse_peak_memory_bytes = registry.register(Histogram(
+    'reading_parse_peak_memory_bytes', '单次解析的峰值内存增长', ('ext',),
+    buckets=tuple(mb * 1024 * 1024 for mb in (8, 16, 32, 64, 128, 256, 512, 1024, 2048))
+))
+parse_memory_exceeded_total = registry.register(Counter(
+    'reading_parse_memory_exceeded_total', '因超出内存预算而中止的解析次数', ('ext',)
+))
+
+stats_events_total = registry.register(Counter(
+    'reading_stats_events_total', '上报的翻页事件数', ('result',)
+))
+
+import_requests_total = registry.register(Counter(
+    'reading_import_requests_total', '在线导入次数（重新下载/源站返回未修改）', ('result',)
+))
+
+
+@contextmanager
+def timer(stage: str, ext: str = ''):
+    """记录一个解析阶段的耗时，同时写入当前请求的耗时记录"""
+    if not settings.METRICS_ENABLED and current_timings.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        parse_stage_seconds.observe(elapsed, stage=stage, ext=ext)
+        timings = current_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def record_cache(cache: str, hit: bool):
+    cache_requests_total.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def render_cache_ratios() -> List[str]:
+    """按缓存类型计算命中率，作为 gauge 附加在输出末尾"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for (cache, result), value in list(cache_requests_total._values.items()):
+        totals.setdefault(cache, {})[result] = value
+    lines = ['# HELP reading_cache_hit_ratio 各级缓存命中率', '# TYPE reading_cache_hit_ratio gauge']
+    for cache, counts in sorted(totals.items()):
+        total = counts.get('hit', 0) + counts.get('miss', 0)
+        if total:
+            lines.append(f'reading_cache_hit_ratio{{cache="{_escape(cache)}"}} {counts.get("hit", 0) / total}')
+    return lines
+
+
+def render_metrics() -> str:
+    return registry.render() + '\n'.join(render_cache_ratios()) + '\n'
+
+
+class RequestTimingMiddleware:
+    """记录接口耗时指标，并按需输出包含各解析阶段耗时的结构化日志
+
+    只在 METRICS_ENABLED 或 REQUEST_TIMING_LOG 开启时挂载；纯 ASGI 实现，不额外包装请求和响应流。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = current_timings.set(timings)
+        inflight_requests.inc()
+        status = {'code': 500}
+
+        async def _send(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - start
+            inflight_requests.dec()
+            current_timings.reset(token)
+            # 路由匹配后 Starlette 把 route 写入同一个 scope
+            route = scope.get('route')
+            route_path = route.path if route is not None else 'unmatched'
+            request_seconds.observe(elapsed, method=scope['method'], route=route_path, status=status['code'])
+            if settings.REQUEST_TIMING_LOG:
+                timing_logger.info(json.dumps({
+                    'method': scope['method'],
+                    'route': route_path,
+                    'path': scope['path'],
+                    'status': status['code'],
+                    'duration_ms': round(elapsed * 1000, 3),
+                    'stages_ms': {stage: round(value * 1000, 3) for stage, value in timings.items()},
+                }, ensure_ascii=False))
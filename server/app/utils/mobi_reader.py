@@ -0,0 +1,179 @@
+from typing import BinaryIO, Dict, Iterator, List, Optional
+import struct
+from . import html_reader
+from .paragraph import Paragraph
+from .source import CHUNK_SIZE, DocumentSource, UnsupportedFormat
+
+# PalmDB 文件头：名称、属性、时间戳……类型、创建者、记录数
+_PDB_HEADER = struct.Struct('>32sHHIIIIII4s4sIIH')
+_RECORD_ENTRY = struct.Struct('>II')
+_BOOK_TYPES = {b'BOOKMOBI', b'TEXtREAd'}
+
+COMPRESSION_NONE = 1
+COMPRESSION_PALMDOC = 2
+COMPRESSION_HUFFCDIC = 17480
+
+# EXTH 记录类型 -> 元数据字段
+_EXTH_FIELDS = {100: 'author', 101: 'publisher', 103: 'description', 106: 'published', 503: 'title', 524: 'language'}
+
+
+def palmdoc_decompress(data: bytes) -> bytes:
+    """PalmDOC（LZ77 变体）解压"""
+    out = bytearray()
+    i, length = 0, len(data)
+    while i < length:
+        c = data[i]
+        i += 1
+        if 1 <= c <= 8:
+            # 其后 c 个字节原样输出
+            out += data[i:i + c]
+            i += c
+        elif c < 0x80:
+            out.append(c)
+        elif c >= 0xC0:
+            # 空格 + 字符
+            out.append(0x20)
+            out.append(c ^ 0x80)
+        elif i < length:
+            # 2 字节回溯引用：11 位距离、3 位长度
+            pair = (c << 8) | data[i]
+            i += 1
+            distance = (pair >> 3) & 0x07FF
+            count = (pair & 0x07) + 3
+            if not 0 < distance <= len(out):
+                raise ValueError("MOBI 压缩数据损坏")
+            start = len(out) - distance
+            if distance >= count:
+                out += out[start:start + count]
+            else:
+                for k in range(count):
+                    out.append(out[start + k])
+    return bytes(out)
+
+
+def _trailing_entry_size(data: bytes, size: int) -> int:
+    """从记录末尾向前读取一个变长整数"""
+    result, shift = 0, 0
+    while size > 0:
+        value = data[size - 1]
+        result |= (value & 0x7F) << shift
+        shift += 7
+        size -= 1
+        if value & 0x80 or shift >= 28:
+            break
+    return result
+
+
+def _strip_trailing_entries(data: bytes, flags: int) -> bytes:
+    """去掉文本记录末尾的附加数据（由 MOBI 头的 extra data flags 描述）"""
+    size = len(data)
+    bits = flags >> 1
+    while bits:
+        if bits & 1:
+            size -= _trailing_entry_size(data, size)
+        bits >>= 1
+    if flags & 1 and size > 0:
+        # 跨记录的多字节字符
+        size -= (data[size - 1] & 0x03) + 1
+    return data[:max(size, 0)]
+
+
+class MobiBook:
+    """解压后的 MOBI 正文（HTML）和元数据"""
+    __slots__ = ('text', 'metadata')
+
+    def __init__(self, text: str, metadata: Dict[str, Optional[str]]):
+        self.text = text
+        self.metadata = metadata
+
+
+def _read_exth(record0: bytes, offset: int, encoding: str) -> Dict[str, str]:
+    if record0[offset:offset + 4] != b'EXTH':
+        return {}
+    values = {}
+    _, count = struct.unpack_from('>II', record0, offset + 4)
+    position = offset + 12
+    for _ in range(count):
+        if position + 8 > len(record0):
+            break
+        kind, length = struct.unpack_from('>II', record0, position)
+        if length < 8:
+            break
+        if kind in _EXTH_FIELDS:
+            values[_EXTH_FIELDS[kind]] = record0[position + 8:position + length].decode(encoding, errors='replace')
+        position += length
+    return values
+
+
+def read_book(stream: BinaryIO) -> MobiBook:
+    """逐条读取并解压文本记录；不支持 DRM 和 HUFF/CDIC 压缩"""
+    header = stream.read(_PDB_HEADER.size)
+    if len(header) < _PDB_HEADER.size:
+        raise UnsupportedFormat("无法读取 MOBI 文件：文件头不完整")
+    fields = _PDB_HEADER.unpack(header)
+    name, book_type, record_count = fields[0], fields[9] + fields[10], fields[13]
+    if book_type not in _BOOK_TYPES or record_count < 2:
+        raise UnsupportedFormat("无法读取 MOBI 文件：不是 MOBI/PalmDOC 电子书")
+    entries = stream.read(_RECORD_ENTRY.size * record_count)
+    offsets = [_RECORD_ENTRY.unpack_from(entries, i * _RECORD_ENTRY.size)[0] for i in range(record_count)]
+
+    def _record(index: int) -> bytes:
+        stream.seek(offsets[index])
+        if index + 1 < record_count:
+            return stream.read(offsets[index + 1] - offsets[index])
+        return stream.read()
+
+    record0 = _record(0)
+    if len(record0) < 16:
+        raise UnsupportedFormat("无法读取 MOBI 文件：文件头不完整")
+    # PalmDOC 头：压缩方式、正文长度、文本记录数、记录大小、加密方式（PalmDOC 中为阅读位置）
+    compression, _, _, text_records, _, encryption = struct.unpack_from('>HHIHHH', record0)
+    if book_type == b'TEXtREAd':
+        encryption = 0
+    if encryption:
+        raise UnsupportedFormat("无法读取受 DRM 保护的 MOBI 文件")
+    if compression == COMPRESSION_HUFFCDIC:
+        raise UnsupportedFormat("暂不支持 HUFF/CDIC 压缩的 MOBI 文件")
+    if compression not in (COMPRESSION_NONE, COMPRESSION_PALMDOC):
+        raise UnsupportedFormat(f"无法读取 MOBI 文件：未知的压缩方式 {compression}")
+
+    encoding = 'cp1252'
+    extra_flags = 0
+    metadata: Dict[str, Optional[str]] = {'title': name.rstrip(b'\0').decode('latin-1')}
+    if record0[16:20] == b'MOBI':
+        mobi_length, _, codepage = struct.unpack_from('>III', record0, 20)
+        encoding = 'utf-8' if codepage == 65001 else 'cp1252'
+        mobi_version = struct.unpack_from('>I', record0, 0x68)[0] if len(record0) >= 0x6C else 0
+        if mobi_length >= 0xE4 and mobi_version >= 5 and len(record0) >= 0xF4:
+            extra_flags = struct.unpack_from('>H', record0, 0xF2)[0]
+        name_offset, name_length = struct.unpack_from('>II', record0, 0x54)
+        if name_length:
+            metadata['title'] = record0[name_offset:name_offset + name_length].decode(encoding, errors='replace')
+        if len(record0) >= 0x84 and struct.unpack_from('>I', record0, 0x80)[0] & 0x40:
+            metadata.update(_read_exth(record0, 16 + mobi_length, encoding))
+
+    chunks = []
+    for index in range(1, min(text_records, record_count - 1) + 1):
+        data = _record(index)
+        if extra_flags:
+            data = _strip_trailing_entries(data, extra_flags)
+        chunks.append(palmdoc_decompress(data) if compression == COMPRESSION_PALMDOC else data)
+    text = b''.join(chunks).decode(encoding, errors='replace')
+    return MobiBook(text, metadata)
+
+
+def load_book(source: DocumentSource) -> MobiBook:
+    """解压结果缓存在来源对象上，正文和结构提取只解压一次"""
+    def _read():
+        with source.open() as stream:
+            return read_book(stream)
+    return source.memo('mobi_book', _read)
+
+
+def iter_paragraphs(book: MobiBook) -> Iterator[Paragraph]:
+    text = book.text
+    return html_reader.iter_paragraphs(text[i:i + CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE))
+
+
+def read_paragraphs(source: DocumentSource) -> List[Paragraph]:
+    return source.memo('mobi_paragraphs', lambda: list(iter_paragraphs(load_book(source))))
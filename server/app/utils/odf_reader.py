@@ -0,0 +1,193 @@
+from typing import BinaryIO, Dict, Iterator, List, Optional
+import zipfile
+from lxml import etree
+from .paragraph import Paragraph
+from .source import DocumentSource, UnsupportedFormat
+
+OFFICE = '{urn:oasis:names:tc:opendocument:xmlns:office:1.0}'
+TEXT = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+TABLE = '{urn:oasis:names:tc:opendocument:xmlns:table:1.0}'
+DRAW = '{urn:oasis:names:tc:opendocument:xmlns:drawing:1.0}'
+PRESENTATION = '{urn:oasis:names:tc:opendocument:xmlns:presentation:1.0}'
+
+_TEXT_P = TEXT + 'p'
+_TEXT_H = TEXT + 'h'
+_TEXT_S = TEXT + 's'
+_TEXT_TAB = TEXT + 'tab'
+_TEXT_BREAK = TEXT + 'line-break'
+_OUTLINE_LEVEL = TEXT + 'outline-level'
+_TABLE = TABLE + 'table'
+_ROW = TABLE + 'table-row'
+_CELL = TABLE + 'table-cell'
+_COVERED_CELL = TABLE + 'covered-table-cell'
+_TABLE_NAME = TABLE + 'name'
+_ROWS_REPEATED = TABLE + 'number-rows-repeated'
+_COLUMNS_REPEATED = TABLE + 'number-columns-repeated'
+
+# 段落内不属于正文的内容：脚注、批注、嵌入的图形和文本框
+_SKIP_INLINE = {TEXT + 'note', OFFICE + 'annotation', DRAW + 'frame', DRAW + 'custom-shape', TEXT + 'tracked-changes'}
+# 位于这些元素内的段落不输出
+_SKIP_CONTAINERS = {TEXT + 'note', OFFICE + 'annotation', PRESENTATION + 'notes', TEXT + 'tracked-changes'}
+# 这些元素结束时释放其之前的兄弟节点，使内存占用与文档长度无关
+_BODY_CHILDREN = (TEXT + 'list', TEXT + 'section', _TABLE, DRAW + 'page')
+# 表格中重复的非空行/列最多展开的次数（空行常被重复到表格最大行数）
+_MAX_REPEAT = 1000
+
+_META = {
+    'title': '{http://purl.org/dc/elements/1.1/}title',
+    'author': '{http://purl.org/dc/elements/1.1/}creator',
+    'initial_author': '{urn:oasis:names:tc:opendocument:xmlns:meta:1.0}initial-creator',
+    'created': '{urn:oasis:names:tc:opendocument:xmlns:meta:1.0}creation-date',
+    'modified': '{http://purl.org/dc/elements/1.1/}date',
+}
+
+
+def _collect_text(element, parts: List[str]):
+    if element.text:
+        parts.append(element.text)
+    for child in element:
+        tag = child.tag
+        if tag == _TEXT_S:
+            parts.append(' ' * int(child.get(TEXT + 'c', '1')))
+        elif tag == _TEXT_TAB:
+            parts.append('\t')
+        elif tag == _TEXT_BREAK:
+            parts.append('\n')
+        elif tag not in _SKIP_INLINE:
+            _collect_text(child, parts)
+        # 子元素之后的文字属于当前元素，跳过的子元素也要保留
+        if child.tail:
+            parts.append(child.tail)
+
+
+def _text(element) -> str:
+    parts: List[str] = []
+    _collect_text(element, parts)
+    return ''.join(parts)
+
+
+def _release(element):
+    """清空已处理的元素并删除其之前的兄弟节点"""
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def _open_content(stream: BinaryIO):
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise UnsupportedFormat("无法读取 OpenDocument 文档：文件不是有效的 zip 包")
+    try:
+        content = archive.open('content.xml')
+    except KeyError:
+        archive.close()
+        raise UnsupportedFormat("无法读取 OpenDocument 文档：缺少 content.xml")
+    return archive, content
+
+
+def _iterparse(content, tags):
+    try:
+        yield from etree.iterparse(content, events=('start', 'end'), tag=tags,
+                                   resolve_entities=False, huge_tree=True)
+    except etree.XMLSyntaxError:
+        # 加密文档的 content.xml 不是 XML
+        raise UnsupportedFormat("无法读取 OpenDocument 文档：content.xml 已加密或损坏")
+
+
+def iter_text_paragraphs(stream: BinaryIO) -> Iterator[Paragraph]:
+    """流式读取 .odt / .odp 的 content.xml，按顺序产出段落和标题
+
+    文本框中的段落单独输出；脚注、批注和演示文稿的备注页不输出。
+    """
+    archive, content = _open_content(stream)
+    with archive, content:
+        skipping = 0
+        for event, element in _iterparse(content, (_TEXT_P, _TEXT_H) + tuple(_SKIP_CONTAINERS) + _BODY_CHILDREN):
+            tag = element.tag
+            if tag in _SKIP_CONTAINERS:
+                skipping += 1 if event == 'start' else -1
+                continue
+            if event == 'start':
+                continue
+            if tag in _BODY_CHILDREN:
+                if element.getparent() is not None and element.getparent().tag.startswith(OFFICE):
+                    _release(element)
+                continue
+            if skipping:
+                continue
+            level = int(element.get(_OUTLINE_LEVEL, '1')) if tag == _TEXT_H else 0
+            yield Paragraph(_text(element), level)
+            if element.getparent() is not None and element.getparent().tag.startswith(OFFICE):
+                _release(element)
+
+
+def _row_cells(row) -> List[str]:
+    cells = []
+    for cell in row:
+        if cell.tag not in (_CELL, _COVERED_CELL):
+            continue
+        value = '\n'.join(_text(p) for p in cell.iterchildren(_TEXT_P))
+        if not value.strip():
+            continue
+        repeat = min(int(cell.get(_COLUMNS_REPEATED, '1')), _MAX_REPEAT)
+        cells.extend([value] * repeat)
+    return cells
+
+
+def iter_sheet_rows(stream: BinaryIO) -> Iterator[Paragraph]:
+    """流式读取 .ods：每个工作表先产出 level=1 的表名，再逐行产出以 ' | ' 连接的非空单元格"""
+    archive, content = _open_content(stream)
+    with archive, content:
+        for event, element in _iterparse(content, (_TABLE, _ROW)):
+            if element.tag == _TABLE:
+                if event == 'start':
+                    yield Paragraph(element.get(_TABLE_NAME, ''), 1)
+                else:
+                    _release(element)
+                continue
+            if event == 'start':
+                continue
+            cells = _row_cells(element)
+            if cells:
+                text = ' | '.join(cells)
+                for _ in range(min(int(element.get(_ROWS_REPEATED, '1')), _MAX_REPEAT)):
+                    yield Paragraph(text)
+            _release(element)
+
+
+def read_metadata(stream: BinaryIO) -> Dict[str, Optional[str]]:
+    """meta.xml 中的标题、作者和时间"""
+    try:
+        with zipfile.ZipFile(stream) as archive:
+            root = etree.fromstring(archive.read('meta.xml'))
+    except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError):
+        return {'title': None, 'author': None, 'created': None, 'modified': None}
+    values = {}
+    for key, tag in _META.items():
+        element = root.find(f'.//{tag}')
+        values[key] = element.text.strip() if element is not None and element.text else None
+    return {
+        'title': values['title'],
+        'author': values['author'] or values['initial_author'],
+        'created': values['created'],
+        'modified': values['modified'],
+    }
+
+
+def read_paragraphs(source: DocumentSource) -> List[Paragraph]:
+    """读取 .odt / .odp 的全部段落；正文和结构提取共用一次解析结果"""
+    def _read():
+        with source.open() as stream:
+            return list(iter_text_paragraphs(stream))
+    return source.memo('odf_paragraphs', _read)
+
+
+def read_sheet_rows(source: DocumentSource) -> List[Paragraph]:
+    """读取 .ods 的全部表名和行；正文和结构提取共用一次解析结果"""
+    def _read():
+        with source.open() as stream:
+            return list(iter_sheet_rows(stream))
+    return source.memo('odf_sheet_rows', _read)
@@ -0,0 +1,41 @@
+from typing import List
+import openpyxl
+from pptx import Presentation
+from .paragraph import Paragraph
+from .source import DocumentSource
+
+
+def read_workbook(source: DocumentSource) -> List[Paragraph]:
+    """读取 .xlsx：每个工作表先产出 level=1 的表名，再逐行产出以 ' | ' 连接的非空单元格
+
+    正文和结构提取共用一次解析结果。
+    """
+    def _read():
+        with source.open() as stream:
+            wb = openpyxl.load_workbook(stream)
+            rows = []
+            for sheet in wb.sheetnames:
+                rows.append(Paragraph(sheet, 1))
+                for row in wb[sheet].iter_rows(values_only=True):
+                    rows.append(Paragraph(' | '.join(str(cell) for cell in row if cell is not None)))
+            return rows
+    return source.memo('workbook_rows', _read)
+
+
+def read_slides(source: DocumentSource) -> List[Paragraph]:
+    """读取 .pptx：按顺序产出各幻灯片中有文字的形状，标题占位符为 level=1
+
+    正文和结构提取共用一次解析结果。
+    """
+    def _read():
+        with source.open() as stream:
+            prs = Presentation(stream)
+            paragraphs = []
+            for slide in prs.slides:
+                title = slide.shapes.title
+                title_id = title.shape_id if title is not None else None
+                for shape in slide.shapes:
+                    if hasattr(shape, "text") and shape.text.strip():
+                        paragraphs.append(Paragraph(shape.text, 1 if shape.shape_id == title_id else 0))
+            return paragraphs
+    return source.memo('slides', _read)
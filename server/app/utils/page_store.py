@@ -0,0 +1,284 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+import bisect
+import os
+import struct
+import threading
+import zlib
+from ..config import settings
+from .pagination import PageLayout
+from . import serializer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 文件格式：MAGIC | 头部长度(uint32) | 头部 JSON | 字典 | 各数据块
+MAGIC = b'RPS1'
+_HEADER_LENGTH = struct.Struct('<I')
+# 共享字典的采样片段长度
+_DICT_SAMPLE = 1024
+
+
+def available_codecs() -> List[str]:
+    codecs = ['zlib', 'none']
+    if zstandard is not None:
+        codecs.insert(0, 'zstd')
+    return codecs
+
+
+def resolve_codec(name: Optional[str] = None) -> str:
+    name = name or settings.PAGE_STORE_CODEC
+    if name == 'auto':
+        return 'zstd' if zstandard is not None else 'zlib'
+    if name not in available_codecs():
+        raise ValueError(f"不可用的压缩方式: {name}")
+    return name
+
+
+class _Codec:
+    """带共享字典的块压缩；zlib 用 zdict，zstd 用原始内容字典"""
+
+    def __init__(self, name: str, dictionary: bytes = b'', level: Optional[int] = None):
+        self.name = name
+        self.dictionary = dictionary
+        self.level = settings.PAGE_STORE_LEVEL if level is None else level
+        self._zstd_dict = None
+        if name == 'zstd' and dictionary:
+            self._zstd_dict = zstandard.ZstdCompressionDict(
+                dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT
+            )
+
+    def compress(self, data: bytes) -> bytes:
+        if self.name == 'none':
+            return data
+        if self.name == 'zstd':
+            return zstandard.ZstdCompressor(level=self.level, dict_data=self._zstd_dict).compress(data)
+        if self.dictionary:
+            compressor = zlib.compressobj(self.level, zdict=self.dictionary)
+        else:
+            compressor = zlib.compressobj(self.level)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.name == 'none':
+            return data
+        if self.name == 'zstd':
+            return zstandard.ZstdDecompressor(dict_data=self._zstd_dict).decompress(data)
+        if self.dictionary:
+            decompressor = zlib.decompressobj(zdict=self.dictionary)
+        else:
+            decompressor = zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+def build_dictionary(blocks: List[bytes], size: int) -> bytes:
+    """从各块开头均匀采样拼出共享字典；单块文档不需要字典"""
+    if len(blocks) < 2 or size <= 0:
+        return b''
+    count = min(len(blocks), max(1, size // _DICT_SAMPLE))
+    per_block = size // count
+    indexes = [i * len(blocks) // count for i in range(count)]
+    return b''.join(blocks[i][:per_block] for i in indexes)
+
+
+def block_ranges(layout: PageLayout, pages_per_block: int) -> List[Tuple[int, int]]:
+    """按默认分页每 pages_per_block 页划分段落块，返回各块的 [起始段落, 结束段落)
+
+    页面从段落中间开始时，该段落同时放入前后两块，保证每块都能独立渲染其中的页面。
+    """
+    ranges = []
+    for first_page in range(0, layout.total_pages, pages_per_block):
+        last_page = min(first_page + pages_per_block, layout.total_pages) - 1
+        start, _ = layout.page_bounds(first_page)
+        _, (end_para, end_offset) = layout.page_bounds(last_page)
+        ranges.append((start[0], end_para + 1 if end_offset > 0 else end_para))
+    return ranges
+
+
+class StoredDocument:
+    """已打开的压缩段落流：头部常驻内存，段落按块读取"""
+
+    def __init__(self, path: str, header: Dict, dictionary: bytes, data_offset: int):
+        self.path = path
+        self.header = header
+        self.codec = _Codec(header['codec'], dictionary)
+        self.data_offset = data_offset
+        # 每块：[起始段落, 结束段落, 数据偏移, 压缩长度]
+        self.blocks: List[List[int]] = header['blocks']
+        self._block_starts = [block[0] for block in self.blocks]
+        self.total_paragraphs: int = header['total_paragraphs']
+        self.total_chars: int = header['total_chars']
+        self.created_at: str = header['created_at']
+        # 读取时的渲染方式，如代码文档 {'kind': 'code', 'lexer': 'python'}；普通文档为 None
+        self.render: Optional[Dict] = header.get('render')
+        starts = header['starts']
+        self.layout = PageLayout(
+            header['page_size'],
+            [(starts[i], starts[i + 1]) for i in range(0, len(starts), 2)],
+            self.total_paragraphs
+        )
+
+    def blocks_for(self, first_para: int, last_para: int) -> List[int]:
+        """覆盖 [first_para, last_para] 的最少数据块"""
+        result = []
+        position = first_para
+        index = max(0, bisect.bisect_right(self._block_starts, position) - 1)
+        while position <= last_para and index < len(self.blocks):
+            start, end = self.blocks[index][0], self.blocks[index][1]
+            if start <= position < end:
+                result.append(index)
+                position = end
+            index += 1
+        return result
+
+    def read_blocks(self, indexes: Iterable[int]) -> Dict[int, List[str]]:
+        result = {}
+        with open(self.path, 'rb') as f:
+            for index in indexes:
+                _, _, offset, length = self.blocks[index]
+                f.seek(self.data_offset + offset)
+                data = self.codec.decompress(f.read(length))
+                result[index] = data.decode('utf-8').split('\n')
+        return result
+
+    def read_range(self, first_para: int, last_para: int) -> 'ParagraphWindow':
+        """读取包含 [first_para, last_para] 的段落，通常只需解压一块"""
+        indexes = self.blocks_for(first_para, last_para)
+        return ParagraphWindow(self, self.read_blocks(indexes))
+
+    def iter_paragraphs(self) -> Iterator[str]:
+        """按块依次解压并生成全部段落，同一时刻只保留一块"""
+        emitted = 0
+        for index, (start, end, _, _) in enumerate(self.blocks):
+            paragraphs = self.read_blocks([index])[index]
+            # 相邻块共享的段落只取一次
+            for paragraph in paragraphs[emitted - start:]:
+                yield paragraph
+            emitted = max(emitted, end)
+
+    def read_all(self) -> List[str]:
+        paragraphs: List[str] = []
+        decoded = self.read_blocks(range(len(self.blocks)))
+        for index, (start, end, _, _) in enumerate(self.blocks):
+            # 相邻块共享的段落只取一次
+            skip = len(paragraphs) - start
+            paragraphs.extend(decoded[index][skip:])
+        return paragraphs
+
+
+class ParagraphWindow:
+    """按全局段落下标访问已解压块中的段落，供 PageLayout.render_page 使用"""
+
+    def __init__(self, document: StoredDocument, decoded: Dict[int, List[str]]):
+        self._ranges = [(document.blocks[i][0], document.blocks[i][1], decoded[i])
+                        for i in sorted(decoded)]
+
+    def __getitem__(self, index: int) -> str:
+        for start, end, paragraphs in self._ranges:
+            if start <= index < end:
+                return paragraphs[index - start]
+        raise IndexError(index)
+
+
+def write_document(path: str, paragraphs: List[str], layout: PageLayout, created_at: str,
+                   codec: Optional[str] = None, pages_per_block: Optional[int] = None,
+                   render: Optional[Dict] = None) -> int:
+    """按块压缩写入段落流，先写临时文件再替换，读者不会看到写了一半的文件"""
+    codec_name = resolve_codec(codec)
+    pages_per_block = pages_per_block or settings.MAX_PAGES_PER_REQUEST
+    ranges = block_ranges(layout, pages_per_block)
+    raw_blocks = ['\n'.join(paragraphs[start:end]).encode('utf-8') for start, end in ranges]
+
+    dictionary = b''
+    if codec_name != 'none':
+        dictionary = build_dictionary(raw_blocks, settings.PAGE_STORE_DICT_SIZE)
+    block_codec = _Codec(codec_name, dictionary)
+
+    blocks, payloads, offset = [], [], 0
+    for (start, end), raw in zip(ranges, raw_blocks):
+        data = block_codec.compress(raw)
+        blocks.append([start, end, offset, len(data)])
+        payloads.append(data)
+        offset += len(data)
+
+    # 字典本身不带字典压缩存放
+    stored_dict = _Codec(codec_name).compress(dictionary) if dictionary else b''
+    header = {
+        'codec': codec_name,
+        'dict_length': len(stored_dict),
+        'blocks': blocks,
+        'total_paragraphs': len(paragraphs),
+        'total_chars': sum(len(p) for p in paragraphs),
+        'created_at': created_at,
+        'page_size': layout.page_size,
+        'starts': [value for start in layout.starts for value in start],
+    }
+    if render:
+        header['render'] = render
+    header_bytes = serializer.dumps(header)
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header_bytes)))
+        f.write(header_bytes)
+        f.write(stored_dict)
+        for data in payloads:
+            f.write(data)
+        size = f.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+def open_document(path: str) -> Optional[StoredDocument]:
+    """读取头部和字典，不读取数据块"""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"无法识别的缓存文件: {path}")
+        (length,) = _HEADER_LENGTH.unpack(f.read(_HEADER_LENGTH.size))
+        header = serializer.loads(f.read(length))
+        stored_dict = f.read(header['dict_length'])
+        dictionary = _Codec(header['codec']).decompress(stored_dict) if stored_dict else b''
+        data_offset = len(MAGIC) + _HEADER_LENGTH.size + length + header['dict_length']
+    return StoredDocument(path, header, dictionary, data_offset)
+
+
+class DocumentCache:
+    """已打开文档头部的 LRU，用 inode 和文件大小判断文件是否已被替换"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], StoredDocument]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, path: str) -> Optional[StoredDocument]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.invalidate(path)
+            return None
+        stamp = (st.st_ino, st.st_size)
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == stamp:
+                self._entries.move_to_end(path)
+                return cached[1]
+        document = open_document(path)
+        if document is None:
+            return None
+        with self._lock:
+            self._entries[path] = (stamp, document)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return document
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._entries.pop(path, None)
@@ -0,0 +1,132 @@
+from typing import Iterable, List, Optional, Tuple
+from collections import OrderedDict
+import bisect
+import threading
+
+
+class PageLayout:
+    """某一页面大小下的分页结果，只记录每页起点，不复制段落内容"""
+
+    def __init__(self, page_size: int, starts: List[Tuple[int, int]], total_paragraphs: int):
+        self.page_size = page_size
+        # 每页的起点：(段落下标, 段内字符偏移)
+        self.starts = starts
+        self.total_paragraphs = total_paragraphs
+
+    @property
+    def total_pages(self) -> int:
+        return len(self.starts)
+
+    def page_bounds(self, page_index: int) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        """返回页面的 [起点, 终点) 位置"""
+        start = self.starts[page_index]
+        if page_index + 1 < len(self.starts):
+            end = self.starts[page_index + 1]
+        else:
+            end = (self.total_paragraphs, 0)
+        return start, end
+
+    def page_of(self, paragraph: int) -> int:
+        """段落起点所在的页（二分查找页面起点）"""
+        index = bisect.bisect_right(self.starts, (paragraph, 0)) - 1
+        return max(0, min(index, self.total_pages - 1))
+
+    def render_page(self, paragraphs: List[str], page_index: int) -> str:
+        """根据分页边界拼出页面文本"""
+        (start_para, start_offset), (end_para, end_offset) = self.page_bounds(page_index)
+        parts = []
+        para = start_para
+        offset = start_offset
+        while para < end_para or (para == end_para and offset < end_offset):
+            text = paragraphs[para]
+            if para == end_para:
+                parts.append(text[offset:end_offset])
+                break
+            parts.append(text[offset:])
+            para += 1
+            offset = 0
+        return '\n'.join(parts)
+
+
+def _find_cut(paragraph: str, start: int, limit: int, sentence_only: bool = False) -> Optional[int]:
+    """在 [start, start + limit] 内寻找切分点：优先句末，其次空白，最后硬切"""
+    end = start + limit
+    if end >= len(paragraph):
+        return len(paragraph)
+    cut = paragraph.rfind('. ', start, end)
+    if cut > start:
+        return cut + 2
+    if sentence_only:
+        return None
+    cut = max(paragraph.rfind(' ', start, end), paragraph.rfind('\t', start, end))
+    if cut > start:
+        return cut + 1
+    return end
+
+
+def compute_layout(paragraphs: Iterable[str], page_size: int) -> PageLayout:
+    """按页面大小计算分页边界，规则与原 split_content 一致：
+    段落整体放入页面，超长段落按句子切分；只顺序读取一遍段落"""
+    starts: List[Tuple[int, int]] = []
+    current_size = 0
+    page_open = False
+    count = 0
+
+    for index, paragraph in enumerate(paragraphs):
+        count = index + 1
+        length = len(paragraph)
+        if length > page_size:
+            offset = 0
+            while offset < length:
+                if not page_open or current_size >= page_size:
+                    starts.append((index, offset))
+                    page_open = True
+                    current_size = 0
+                # 页面已有内容时只在句末切分，放不下则换页
+                cut = _find_cut(paragraph, offset, page_size - current_size,
+                                sentence_only=current_size > 0)
+                if cut is None:
+                    page_open = False
+                    continue
+                current_size += cut - offset
+                offset = cut
+        else:
+            if not page_open or current_size + length > page_size:
+                starts.append((index, 0))
+                page_open = True
+                current_size = 0
+            current_size += length
+
+    if not starts:
+        starts.append((0, 0))
+    return PageLayout(page_size, starts, count)
+
+
+class LayoutCache:
+    """按 (文档ID, 页面大小) 缓存分页结果的 LRU"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], PageLayout]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doc_id: str, page_size: int):
+        key = (doc_id, page_size)
+        with self._lock:
+            layout = self._entries.get(key)
+            if layout is not None:
+                self._entries.move_to_end(key)
+            return layout
+
+    def put(self, doc_id: str, layout: PageLayout):
+        key = (doc_id, layout.page_size)
+        with self._lock:
+            self._entries[key] = layout
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doc_id: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == doc_id]:
+                del self._entries[key]
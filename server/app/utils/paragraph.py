@@ -0,0 +1,26 @@
+from typing import Iterable
+
+
+class Paragraph:
+    """格式读取器产出的正文段落；level 为标题级别，普通段落为 0"""
+    __slots__ = ('text', 'level')
+
+    def __init__(self, text: str, level: int = 0):
+        self.text = text
+        self.level = level
+
+    def __repr__(self) -> str:
+        return f"Paragraph({self.text!r}, level={self.level})"
+
+
+def to_html(paragraphs: Iterable[Paragraph]) -> str:
+    """按处理器的统一格式输出：每个非空行一个 <p>
+
+    段内换行（软回车）也拆成单独的 <p>，段落流按行切分时不会把标签拆开。
+    """
+    return '\n'.join(
+        f"<p>{line}</p>"
+        for para in paragraphs
+        for line in para.text.split('\n')
+        if line.strip()
+    )
@@ -0,0 +1,257 @@
+from typing import Dict, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import errno
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from ..config import settings
+from . import metrics
+from .source import DocumentSource, UnsupportedFormat, spool_dir
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# 工作进程因超出内存预算而自行退出时使用的退出码
+MEMORY_EXIT_CODE = 86
+
+
+class MemoryBudgetExceeded(Exception):
+    """文档解析超出内存预算"""
+
+
+def _rss() -> int:
+    """当前进程的常驻内存（字节）"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return 0
+        # ru_maxrss 为历史峰值（Linux 下单位 KB），只能作近似
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# 虚拟内存上限之外的余量：线程栈和 glibc 为新线程预留的 malloc arena 等
+_RLIMIT_HEADROOM = 128 * 1024 * 1024
+# 工作进程异常退出（非超出预算）时，受牵连的解析在新的进程池中重试的次数
+_BROKEN_POOL_RETRIES = 1
+# 说明地址空间不足的错误信息：RLIMIT_AS 下线程创建、lxml 等 C 扩展的分配失败不一定表现为 MemoryError
+_OUT_OF_MEMORY_MESSAGES = ("can't start new thread", 'cannot allocate memory', 'memory allocation failed',
+                           'out of memory')
+
+# 工作进程中当前的解析任务：(任务ID, 基线 RSS, 峰值 RSS)，由监视线程读取
+_current_job: Optional[list] = None
+
+
+def _exceeded_marker(job_id: str) -> str:
+    """工作进程因超出预算退出前写入的标记文件，主进程据此确定是哪个解析超出预算"""
+    return os.path.join(spool_dir(), f"{job_id}.exceeded")
+
+
+def _watch(budget_bytes: int, poll_interval: float):
+    while True:
+        time.sleep(poll_interval)
+        job = _current_job
+        if job is None:
+            continue
+        rss = _rss()
+        if rss > job[2]:
+            job[2] = rss
+        if budget_bytes and rss - job[1] > budget_bytes:
+            try:
+                with open(_exceeded_marker(job[0]), 'wb'):
+                    pass
+            finally:
+                os._exit(MEMORY_EXIT_CODE)
+
+
+def _init_worker(budget_bytes: int, poll_interval: float):
+    """工作进程初始化：导入各格式的处理模块、启动内存监视线程，再以虚拟内存上限兜底
+
+    上限在导入和线程启动之后测量，预算只用于解析本身。
+    """
+    from .. import processors  # noqa: F401  lxml、pygments、PyPDF2 等在此导入
+    from . import document_structure  # noqa: F401
+
+    threading.Thread(target=_watch, args=(budget_bytes, poll_interval), daemon=True).start()
+    if resource is None or not budget_bytes:
+        return
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            vm_size = int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+        limit = vm_size + budget_bytes * 2 + _RLIMIT_HEADROOM
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (OSError, ValueError, IndexError):
+        pass
+
+
+def _out_of_memory(error: BaseException) -> bool:
+    """错误（或其起因）是否由内存上限导致"""
+    while error is not None:
+        if isinstance(error, MemoryError):
+            return True
+        if isinstance(error, OSError) and error.errno == errno.ENOMEM:
+            return True
+        message = str(error).lower()
+        if any(text in message for text in _OUT_OF_MEMORY_MESSAGES):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def run_parse(job_id: str, source: DocumentSource, file_ext: str,
+              encoding: str) -> Tuple[str, Optional[dict], int]:
+    """在工作进程中解析正文并提取结构，返回 (内容, 结构, 峰值内存增长)
+
+    监视线程按间隔采样 RSS，超出预算时写入标记后直接结束工作进程；
+    C 扩展（lxml、PyPDF2 等）分配的内存也能被统计到。
+    抛给主进程的异常都转为可 pickle 的普通异常。
+    """
+    global _current_job
+    from ..processors import FileProcessor
+    from .document_structure import DocumentStructure
+
+    baseline = _rss()
+    job = [job_id, baseline, baseline]
+    _current_job = job
+    try:
+        handler = FileProcessor().processors[file_ext]
+        content = asyncio.run(handler(source, encoding))
+        try:
+            structure = DocumentStructure().extract_structure(source, file_ext)
+        except Exception as e:
+            if _out_of_memory(e):
+                raise
+            # 结构提取失败不影响正文阅读
+            logger.exception("提取文档结构失败 (%s)", file_ext)
+            structure = None
+    except UnsupportedFormat as e:
+        raise UnsupportedFormat(str(e)) from None
+    except Exception as e:
+        if _out_of_memory(e):
+            raise MemoryBudgetExceeded(f"解析 {file_ext} 文件超出内存限制") from None
+        raise Exception(f"{type(e).__name__}: {e}") from None
+    finally:
+        _current_job = None
+    return content, structure, max(job[2], _rss()) - baseline
+
+
+class ParseMemoryStats:
+    """按格式汇总解析峰值内存，用于估算容器内存规格"""
+
+    def __init__(self):
+        self._formats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, ext: str, peak_bytes: int):
+        metrics.parse_peak_memory_bytes.observe(peak_bytes, ext=ext)
+        with self._lock:
+            entry = self._formats.setdefault(ext, {'parses': 0, 'exceeded': 0, 'total_bytes': 0, 'max_bytes': 0})
+            entry['parses'] += 1
+            entry['total_bytes'] += peak_bytes
+            entry['max_bytes'] = max(entry['max_bytes'], peak_bytes)
+
+    def record_exceeded(self, ext: str):
+        metrics.parse_memory_exceeded_total.inc(ext=ext)
+        with self._lock:
+            entry = self._formats.setdefault(ext, {'parses': 0, 'exceeded': 0, 'total_bytes': 0, 'max_bytes': 0})
+            entry['exceeded'] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            formats = {
+                ext: {
+                    'parses': entry['parses'],
+                    'exceeded': entry['exceeded'],
+                    'max_bytes': entry['max_bytes'],
+                    'mean_bytes': entry['total_bytes'] // entry['parses'] if entry['parses'] else 0,
+                }
+                for ext, entry in sorted(self._formats.items())
+            }
+        return {'budget_bytes': settings.PARSE_MEMORY_LIMIT_MB * 1024 * 1024, 'formats': formats}
+
+
+class ParseWorkerPool:
+    """解析工作进程池；进程因超出内存被结束后自动重建"""
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.stats = ParseMemoryStats()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.PARSE_MEMORY_LIMIT_MB > 0
+
+    @property
+    def budget_bytes(self) -> int:
+        return settings.PARSE_MEMORY_LIMIT_MB * 1024 * 1024
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=settings.PARSE_WORKERS,
+                    mp_context=multiprocessing.get_context(settings.PARSE_WORKER_START_METHOD),
+                    initializer=_init_worker,
+                    initargs=(self.budget_bytes, settings.PARSE_MEMORY_POLL_INTERVAL)
+                )
+            return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    async def parse(self, source: DocumentSource, file_ext: str, encoding: str) -> Tuple[str, Optional[dict]]:
+        """在工作进程中解析文件，返回 (内容, 结构)
+
+        内存中的小文件随任务一起传给工作进程，转存到临时文件的只传路径。
+        一个工作进程退出会使整个池失效、池中所有解析同时失败：只有留下超出预算标记的
+        那个解析返回超出内存限制，其他解析在新的进程池中重试。
+        """
+        loop = asyncio.get_running_loop()
+        job_id = uuid.uuid4().hex
+        for attempt in range(_BROKEN_POOL_RETRIES + 1):
+            executor = self._get_executor()
+            try:
+                content, structure, peak = await loop.run_in_executor(
+                    executor, run_parse, job_id, source, file_ext, encoding
+                )
+            except MemoryBudgetExceeded:
+                self.stats.record_exceeded(file_ext)
+                raise
+            except BrokenProcessPool:
+                self._discard(executor)
+                marker = _exceeded_marker(job_id)
+                if os.path.exists(marker):
+                    os.remove(marker)
+                    self.stats.record_exceeded(file_ext)
+                    raise MemoryBudgetExceeded(
+                        f"解析 {file_ext} 文件超出内存限制 ({settings.PARSE_MEMORY_LIMIT_MB}MB)"
+                    )
+                # 其他解析超出预算，或工作进程被系统结束
+                if attempt == _BROKEN_POOL_RETRIES:
+                    raise Exception(f"解析 {file_ext} 文件时工作进程异常退出")
+                continue
+            self.stats.record(file_ext, peak)
+            return content, structure
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+parse_pool = ParseWorkerPool()
@@ -0,0 +1,185 @@
+from typing import Callable, Dict, List, Optional
+from contextvars import ContextVar
+import asyncio
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from ..config import settings
+
+# 当前请求的性能分析会话；为 None 时 to_thread 直接退化为 asyncio.to_thread
+_active_session: ContextVar[Optional['ProfileSession']] = ContextVar('profile_session', default=None)
+
+PROFILE_NAME = re.compile(r'^[0-9]{8}T[0-9]{6}_[A-Z]+_[\w.-]+_[0-9a-f]{8}\.prof$')
+
+
+def token_accepted(value: Optional[str]) -> bool:
+    """请求头的值必须与 PROFILE_TOKEN 相同；未配置 PROFILE_TOKEN 时一律拒绝"""
+    if not settings.PROFILE_TOKEN:
+        return False
+    return value is not None and hmac.compare_digest(value.encode('utf-8'), settings.PROFILE_TOKEN.encode('utf-8'))
+
+
+class ProfileSession:
+    """一次请求的性能分析：事件循环线程一个 Profile，每个工作线程任务各一个"""
+
+    def __init__(self):
+        self.main = cProfile.Profile()
+        self.thread_profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add_thread_profile(self, profile: cProfile.Profile):
+        with self._lock:
+            self.thread_profiles.append(profile)
+
+    def dump(self, path: str):
+        stats = pstats.Stats(self.main)
+        for profile in self.thread_profiles:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+
+async def to_thread(func: Callable, *args, **kwargs):
+    """asyncio.to_thread 的替代：请求被分析时，同时分析工作线程中的代码"""
+    session = _active_session.get()
+    if session is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    def _run():
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ 的 cProfile 基于 sys.monitoring，全局只能启用一个，
+            # 此时工作线程的调用已由事件循环线程上的 Profile 记录
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            session.add_thread_profile(profile)
+
+    return await asyncio.to_thread(_run)
+
+
+class ProfileStore:
+    """磁盘上的环形缓冲区，只保留最近 PROFILE_MAX_FILES 份分析结果"""
+
+    def __init__(self, directory: Optional[str] = None, max_files: Optional[int] = None):
+        self.directory = directory or settings.PROFILE_DIR or os.path.join(settings.UPLOAD_DIR, 'profiles')
+        self.max_files = max_files or settings.PROFILE_MAX_FILES
+        os.makedirs(self.directory, exist_ok=True)
+
+    def new_name(self, method: str, path: str) -> str:
+        route = re.sub(r'[^\w.-]+', '-', path.strip('/'))[:60] or 'root'
+        stamp = time.strftime('%Y%m%dT%H%M%S')
+        return f"{stamp}_{method.upper()}_{route}_{uuid.uuid4().hex[:8]}.prof"
+
+    def save(self, session: ProfileSession, name: str, info: Dict):
+        session.dump(os.path.join(self.directory, name))
+        with open(os.path.join(self.directory, name + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False)
+        self._evict()
+
+    def _evict(self):
+        names = sorted(n for n in os.listdir(self.directory) if PROFILE_NAME.match(n))
+        for name in names[:max(0, len(names) - self.max_files)]:
+            for path in (name, name + '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, path))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[Dict]:
+        result = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not PROFILE_NAME.match(name):
+                continue
+            info = {'name': name, 'size': os.path.getsize(os.path.join(self.directory, name))}
+            try:
+                with open(os.path.join(self.directory, name + '.json'), encoding='utf-8') as f:
+                    info.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+            result.append(info)
+        return result
+
+    def path_for(self, name: str) -> Optional[str]:
+        """校验文件名后返回路径，防止越权读取"""
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    """按请求头或采样率对请求做 cProfile 分析
+
+    只在 PROFILING_ENABLED 时挂载；未被选中的请求只多一次请求头查找和随机数判断。
+    按请求头触发需要配置 PROFILE_TOKEN，未配置时只按采样率分析。
+    cProfile 作用于整个事件循环线程，分析期间并发的其他请求也会计入，
+    因此同一时间只分析一个请求。
+    """
+
+    def __init__(self, app, store: Optional[ProfileStore] = None):
+        self.app = app
+        self.store = store or ProfileStore()
+        self.header = settings.PROFILE_HEADER.lower().encode('latin-1')
+        self._busy = False
+
+    def _triggered(self, scope) -> Optional[str]:
+        for key, value in scope.get('headers', ()):
+            if key == self.header:
+                if token_accepted(value.decode('latin-1')):
+                    return 'header'
+                return None
+        if settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return 'sample'
+        return None
+
+    async def __call__(self, scope, receive, send):
+        # 查看分析结果的接口也带同一请求头，不分析这些请求
+        if scope['type'] != 'http' or self._busy or scope['path'].startswith('/api/profiles'):
+            await self.app(scope, receive, send)
+            return
+        trigger = self._triggered(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        self._busy = True
+        session = ProfileSession()
+        token = _active_session.set(session)
+        status = {'code': 500}
+
+        async def _send(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        session.main.enable()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            session.main.disable()
+            elapsed = time.perf_counter() - start
+            _active_session.reset(token)
+            self._busy = False
+            name = self.store.new_name(scope['method'], scope['path'])
+            info = {
+                'method': scope['method'],
+                'path': scope['path'],
+                'query': scope.get('query_string', b'').decode('latin-1'),
+                'status': status['code'],
+                'trigger': trigger,
+                'duration_ms': round(elapsed * 1000, 3),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+            await asyncio.to_thread(self.store.save, session, name, info)
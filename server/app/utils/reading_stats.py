@@ -0,0 +1,515 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from ..config import settings
+from . import metrics, serializer
+from .profiling import to_thread
+from .document_manager import is_document_id
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只支持单进程
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_TAG = re.compile(r'<[^>]+>')
+# 中日韩文字每字计一词
+_CJK = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]')
+_WORD = re.compile(r'\w+')
+# 单次读取日志的最大字节数，积压较多时分几次汇总
+_READ_CHUNK = 8 * 1024 * 1024
+
+
+def lock_file(path: str, blocking: bool = True) -> Optional[int]:
+    """获取跨进程的排他文件锁，返回文件描述符（关闭即释放）；非阻塞时锁被占用返回 None"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    if fcntl is None:
+        return fd
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def count_words(text: str) -> int:
+    """页面字数：去掉标签后，中日韩文字每字计一词，其余按连续的字母数字计词"""
+    text = _TAG.sub(' ', text)
+    cjk = len(_CJK.findall(text))
+    return cjk + len(_WORD.findall(_CJK.sub(' ', text)))
+
+
+def page_lengths(pages: Iterable[str]) -> List[Tuple[int, int]]:
+    """各页去掉标签后的字符数和字数"""
+    return [(len(_TAG.sub('', page)), count_words(page)) for page in pages]
+
+
+class EventLog:
+    """追加写的翻页事件日志
+
+    事件先进入内存缓冲，由后台任务按批一次写入（每行一个 JSON 数组），请求路径上没有磁盘 I/O。
+    缓冲超过上限时丢弃新事件，避免磁盘异常时内存无限增长。
+    """
+
+    def __init__(self, path: str, max_buffer: int, lock_path: str):
+        self.path = path
+        self.max_buffer = max_buffer
+        # 同一 UPLOAD_DIR 下的各工作进程共用日志，追加和清空都在文件锁内进行
+        self.lock_path = lock_path
+        self._buffer: List[list] = []
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def append(self, events: List[list]) -> int:
+        """加入缓冲，返回接受的事件数"""
+        with self._lock:
+            room = max(0, self.max_buffer - len(self._buffer))
+            accepted = events[:room]
+            self._buffer.extend(accepted)
+        return len(accepted)
+
+    def flush(self) -> int:
+        """把缓冲中的事件一次追加到日志文件"""
+        with self._lock:
+            events, self._buffer = self._buffer, []
+        if not events:
+            return 0
+        data = b''.join(serializer.dumps(event) + b'\n' for event in events)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = lock_file(self.lock_path)
+            try:
+                with open(self.path, 'ab') as f:
+                    f.write(data)
+            finally:
+                os.close(fd)
+        except OSError:
+            # 写入失败时放回缓冲，下次再试
+            with self._lock:
+                self._buffer[:0] = events
+            raise
+        return len(events)
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def read_from(self, offset: int) -> Tuple[List[list], int]:
+        """读取 offset 之后的完整行，返回事件和新的偏移；日志被截断过时从头读"""
+        if offset > self.size():
+            offset = 0
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(_READ_CHUNK)
+        except FileNotFoundError:
+            return [], 0
+        # 只处理完整的行，写了一半的行留到下次
+        end = data.rfind(b'\n') + 1
+        events = []
+        for line in data[:end].splitlines():
+            try:
+                events.append(serializer.loads(line))
+            except ValueError:
+                continue
+        return events, offset + end
+
+    def truncate(self):
+        """清空日志；调用方须持有文件锁"""
+        with open(self.path, 'wb'):
+            pass
+
+
+class ReadingTotals:
+    """阅读时间、页数、字符数和字数的累计值，速度由累计值直接算出"""
+    __slots__ = ('seconds', 'pages', 'chars', 'words', 'first_read', 'last_read')
+
+    def __init__(self, seconds: float = 0.0, pages: int = 0, chars: int = 0, words: int = 0,
+                 first_read: Optional[float] = None, last_read: Optional[float] = None):
+        self.seconds = seconds
+        self.pages = pages
+        self.chars = chars
+        self.words = words
+        self.first_read = first_read
+        self.last_read = last_read
+
+    def add(self, seconds: float, chars: int, words: int, timestamp: float):
+        self.seconds += seconds
+        self.pages += 1
+        self.chars += chars
+        self.words += words
+        self.first_read = timestamp if self.first_read is None else min(self.first_read, timestamp)
+        self.last_read = timestamp if self.last_read is None else max(self.last_read, timestamp)
+
+    def merge(self, other: 'ReadingTotals'):
+        self.seconds += other.seconds
+        self.pages += other.pages
+        self.chars += other.chars
+        self.words += other.words
+        if other.first_read is not None:
+            self.first_read = other.first_read if self.first_read is None else min(self.first_read, other.first_read)
+        if other.last_read is not None:
+            self.last_read = other.last_read if self.last_read is None else max(self.last_read, other.last_read)
+
+    def to_dict(self) -> Dict:
+        minutes = self.seconds / 60
+        return {
+            'time_read_seconds': round(self.seconds, 1),
+            'pages_read': self.pages,
+            'chars_read': self.chars,
+            'words_read': self.words,
+            'pages_per_minute': round(self.pages / minutes, 2) if minutes else None,
+            'words_per_minute': round(self.words / minutes, 1) if minutes else None,
+            'chars_per_minute': round(self.chars / minutes, 1) if minutes else None,
+            'first_read': datetime.fromtimestamp(self.first_read).isoformat() if self.first_read else None,
+            'last_read': datetime.fromtimestamp(self.last_read).isoformat() if self.last_read else None,
+        }
+
+    def to_state(self) -> list:
+        return [self.seconds, self.pages, self.chars, self.words, self.first_read, self.last_read]
+
+    @classmethod
+    def from_state(cls, state: list) -> 'ReadingTotals':
+        return cls(*state)
+
+
+class ReadingStats:
+    """按用户、按 (用户, 文档) 汇总的阅读统计，查询只是字典查找
+
+    持久化为快照（rollup.json）加增量日志（rollup.journal）：每次汇总只向增量日志追加
+    本次新增的 (用户, 文档) 累计值，各进程查询前只读取自己尚未应用的增量。
+    增量日志过大时由汇总进程写入新快照并换成新的空日志，其他进程发现日志文件被替换后重新加载快照。
+    """
+
+    def __init__(self):
+        self.users: Dict[str, ReadingTotals] = {}
+        self.documents: Dict[str, Dict[str, ReadingTotals]] = {}
+        # 已汇总到的事件日志偏移
+        self.offset = 0
+        self.updated_at: Optional[float] = None
+        # 已应用的汇总次数，快照和每条增量都带有该编号
+        self.generation = 0
+        # 已读取的增量日志 (设备, inode) 和偏移
+        self.journal_id: Optional[Tuple[int, int]] = None
+        self.journal_offset = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        # 加载和应用增量互斥，避免并发查询重复应用
+        self._sync_lock = threading.Lock()
+
+    def add(self, user_id: str, doc_id: str, seconds: float, chars: int, words: int, timestamp: float):
+        with self._lock:
+            self.users.setdefault(user_id, ReadingTotals()).add(seconds, chars, words, timestamp)
+            documents = self.documents.setdefault(user_id, {})
+            documents.setdefault(doc_id, ReadingTotals()).add(seconds, chars, words, timestamp)
+
+    def user(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            totals = self.users.get(user_id)
+            if totals is None:
+                return None
+            result = totals.to_dict()
+            result['documents'] = len(self.documents.get(user_id, {}))
+            return result
+
+    def document(self, user_id: str, doc_id: str) -> Optional[Dict]:
+        with self._lock:
+            totals = self.documents.get(user_id, {}).get(doc_id)
+            return totals.to_dict() if totals is not None else None
+
+    def documents_state(self) -> Dict:
+        with self._lock:
+            return {
+                user: {doc: totals.to_state() for doc, totals in documents.items()}
+                for user, documents in self.documents.items()
+            }
+
+    def save(self, path: str):
+        """写入快照"""
+        with self._lock:
+            state = {
+                'generation': self.generation,
+                'offset': self.offset,
+                'updated_at': self.updated_at,
+                'users': {user: totals.to_state() for user, totals in self.users.items()},
+                'documents': {
+                    user: {doc: totals.to_state() for doc, totals in documents.items()}
+                    for user, documents in self.documents.items()
+                },
+            }
+        _write_atomic(path, serializer.dumps(state))
+
+    def _load_snapshot(self, path: str):
+        try:
+            with open(path, 'rb') as f:
+                state = serializer.loads(f.read())
+        except FileNotFoundError:
+            state = {}
+        with self._lock:
+            self.generation = state.get('generation', 0)
+            self.offset = state.get('offset', 0)
+            self.updated_at = state.get('updated_at')
+            self.users = {user: ReadingTotals.from_state(s) for user, s in state.get('users', {}).items()}
+            self.documents = {
+                user: {doc: ReadingTotals.from_state(s) for doc, s in documents.items()}
+                for user, documents in state.get('documents', {}).items()
+            }
+
+    def _apply(self, record: list):
+        """应用一条增量：[编号, 事件日志偏移, 汇总时间, {用户: {文档: 累计值}}]"""
+        generation, offset, updated_at, documents = record
+        if generation <= self.generation:
+            return
+        with self._lock:
+            for user, items in documents.items():
+                user_totals = self.users.setdefault(user, ReadingTotals())
+                user_documents = self.documents.setdefault(user, {})
+                for doc, state in items.items():
+                    totals = ReadingTotals.from_state(state)
+                    user_totals.merge(totals)
+                    user_documents.setdefault(doc, ReadingTotals()).merge(totals)
+            self.generation = generation
+            self.offset = offset
+            self.updated_at = updated_at
+
+    def refresh(self, path: str, journal_path: str):
+        """应用增量日志中尚未应用的部分；日志被替换（或首次调用）时先重新加载快照"""
+        with self._sync_lock:
+            try:
+                f = open(journal_path, 'rb')
+            except FileNotFoundError:
+                f = None
+            try:
+                stat = os.fstat(f.fileno()) if f is not None else None
+                journal_id = (stat.st_dev, stat.st_ino) if stat is not None else None
+                if not self._loaded or journal_id != self.journal_id:
+                    # 先打开日志再读快照：快照总是先于日志替换写入，已包含旧日志中的全部增量
+                    self._load_snapshot(path)
+                    self._loaded = True
+                    self.journal_id = journal_id
+                    self.journal_offset = 0
+                if f is None or stat.st_size <= self.journal_offset:
+                    return
+                f.seek(self.journal_offset)
+                data = f.read()
+            finally:
+                if f is not None:
+                    f.close()
+            # 只处理完整的行
+            end = data.rfind(b'\n') + 1
+            for line in data[:end].splitlines():
+                try:
+                    record = serializer.loads(line)
+                except ValueError:
+                    continue
+                self._apply(record)
+            self.journal_offset += end
+
+    def append_delta(self, journal_path: str, delta: 'ReadingStats', offset: int, updated_at: float) -> int:
+        """把一次汇总的新增累计值追加到增量日志，返回该次汇总的编号；调用方须持有文件锁"""
+        generation = self.generation + 1
+        data = serializer.dumps([generation, offset, updated_at, delta.documents_state()]) + b'\n'
+        with open(journal_path, 'a+b') as f:
+            # 上次写入中断留下的半行单独成行，不影响本条
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    data = b'\n' + data
+            f.write(data)
+        return generation
+
+    def compact(self, path: str, journal_path: str):
+        """写入快照并换成新的空增量日志；调用方须持有文件锁，且已应用全部增量"""
+        with self._sync_lock:
+            self.save(path)
+            _write_atomic(journal_path, b'')
+            stat = os.stat(journal_path)
+            self.journal_id = (stat.st_dev, stat.st_ino)
+            self.journal_offset = 0
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class ReadingStatsService:
+    """阅读统计：接收翻页事件、批量写日志、定期汇总
+
+    客户端上报每次翻页在上一页停留的秒数；汇总时按文档分页计算各页的字符数和字数，
+    得到阅读时间、页/分钟和字/分钟。统计数据保存在 UPLOAD_DIR/stats：
+    同一 UPLOAD_DIR 下的各工作进程共用一个事件日志和一个汇总状态文件，
+    追加、汇总和清空日志都在文件锁内进行；同一时刻只有一个进程汇总，
+    汇总前和查询前都先应用其他进程追加的增量，各进程看到的结果一致。
+    """
+
+    def __init__(self):
+        self.directory = os.path.join(settings.UPLOAD_DIR, 'stats')
+        self.lock_path = os.path.join(self.directory, 'stats.lock')
+        self.log = EventLog(os.path.join(self.directory, 'events.log'), settings.STATS_BUFFER_MAX,
+                            self.lock_path)
+        self.stats = ReadingStats()
+        self.state_path = os.path.join(self.directory, 'rollup.json')
+        self.journal_path = os.path.join(self.directory, 'rollup.journal')
+        # (文档ID, 页面大小) -> {页码: (字符数, 字数)}，只包含被阅读过的页
+        self._lengths: "OrderedDict[Tuple[str, int], Dict[int, Tuple[int, int]]]" = OrderedDict()
+        self._flush_now = asyncio.Event()
+
+    def record(self, user_id: str, events: List[Dict]) -> int:
+        """校验并缓冲翻页事件，返回接受的事件数；不做磁盘 I/O"""
+        now = time.time()
+        rows = []
+        for event in events:
+            try:
+                doc_id = str(event['doc_id'])
+                page = int(event['page'])
+                seconds = float(event['seconds'])
+                page_size = int(event.get('page_size') or settings.PAGE_SIZE)
+            except (KeyError, TypeError, ValueError):
+                continue
+            # 文档ID会用作缓存文件名，只接受 get_document_id 生成的格式
+            if page < 1 or seconds < 0 or not is_document_id(doc_id):
+                continue
+            # 停留过久视为离开，按上限计
+            rows.append([now, user_id, doc_id, page, page_size, min(seconds, settings.STATS_MAX_PAGE_SECONDS)])
+        accepted = self.log.append(rows)
+        metrics.stats_events_total.inc(accepted, result='accepted')
+        if len(events) > len(rows):
+            metrics.stats_events_total.inc(len(events) - len(rows), result='invalid')
+        if len(rows) > accepted:
+            metrics.stats_events_total.inc(len(rows) - accepted, result='dropped')
+        if self.log.pending >= settings.STATS_FLUSH_BATCH:
+            self._flush_now.set()
+        return accepted
+
+    def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.stats.refresh(self.state_path, self.journal_path)
+
+    async def flush(self) -> int:
+        return await to_thread(self.log.flush)
+
+    async def _page_lengths(self, doc_manager, doc_id: str, page_size: int,
+                            pages: Iterable[int]) -> Optional[Dict[int, Tuple[int, int]]]:
+        """各页的字符数和字数；只读取尚未计算过的页，文档不存在时返回 None"""
+        page_size = doc_manager.resolve_page_size(page_size)
+        key = (doc_id, page_size)
+        lengths = self._lengths.get(key)
+        if lengths is not None:
+            self._lengths.move_to_end(key)
+        missing = {page for page in pages if lengths is None or page not in lengths}
+        if missing:
+            texts = await doc_manager.read_page_texts(doc_id, missing, page_size)
+            if texts is None:
+                return None
+            lengths = self._lengths.setdefault(key, {})
+            lengths.update(zip(texts, await to_thread(page_lengths, texts.values())))
+            while len(self._lengths) > settings.LAYOUT_CACHE_SIZE:
+                self._lengths.popitem(last=False)
+        return lengths
+
+    async def rollup(self, doc_manager) -> int:
+        """把日志中尚未汇总的事件计入统计并保存，返回处理的事件数
+
+        其他进程正在汇总时跳过本次，本进程写入的事件由该进程一并汇总。
+        """
+        await self.flush()
+        fd = await to_thread(lock_file, self.lock_path, False)
+        if fd is None:
+            return 0
+        try:
+            return await self._rollup_locked(doc_manager)
+        finally:
+            os.close(fd)
+
+    async def _rollup_locked(self, doc_manager) -> int:
+        # 先应用其他进程的汇总结果
+        await to_thread(self.stats.refresh, self.state_path, self.journal_path)
+        delta = ReadingStats()
+        offset = self.stats.offset
+        total = 0
+        # 本次汇总中已确认不存在的文档，每个只查找一次
+        missing = set()
+        while True:
+            events, next_offset = await to_thread(self.log.read_from, offset)
+            # 每个 (文档, 页面大小) 一次读取本批涉及的页
+            wanted: Dict[Tuple[str, int], set] = {}
+            for _, _, doc_id, page, page_size, _ in events:
+                wanted.setdefault((doc_id, page_size), set()).add(page)
+            lengths = {}
+            for (doc_id, page_size), pages in wanted.items():
+                if doc_id not in missing:
+                    lengths[doc_id, page_size] = await self._page_lengths(doc_manager, doc_id, page_size, pages)
+                    if lengths[doc_id, page_size] is None:
+                        missing.add(doc_id)
+            for timestamp, user_id, doc_id, page, page_size, seconds in events:
+                # 文档已被清理时只计时间
+                chars, words = (lengths.get((doc_id, page_size)) or {}).get(page, (0, 0))
+                delta.add(user_id, doc_id, seconds, chars, words, timestamp)
+            done = next_offset == offset
+            offset = next_offset
+            total += len(events)
+            if done:
+                break
+        # 日志已全部汇总且超过大小上限时清空；追加日志需要同一把文件锁，期间不会有新的写入
+        if offset >= settings.STATS_LOG_MAX_BYTES and offset >= self.log.size():
+            await to_thread(self.log.truncate)
+            offset = 0
+        # 没有新内容时不写任何文件，其他进程的查询也无需重新读取
+        if not total and offset == self.stats.offset:
+            return 0
+        await to_thread(self.stats.append_delta, self.journal_path, delta, offset,
+                        time.time() if total else self.stats.updated_at)
+        await to_thread(self.stats.refresh, self.state_path, self.journal_path)
+        if self.stats.journal_offset >= settings.STATS_JOURNAL_MAX_BYTES:
+            await to_thread(self.stats.compact, self.state_path, self.journal_path)
+        return total
+
+    async def run(self, doc_manager):
+        """后台任务：按间隔（或缓冲达到批量大小时）写日志，按汇总间隔汇总"""
+        next_rollup = time.monotonic() + settings.STATS_ROLLUP_INTERVAL
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), settings.STATS_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            try:
+                await self.flush()
+                if time.monotonic() >= next_rollup:
+                    next_rollup = time.monotonic() + settings.STATS_ROLLUP_INTERVAL
+                    with metrics.timer('stats_rollup'):
+                        await self.rollup(doc_manager)
+            except Exception:
+                logger.exception("阅读统计写入或汇总失败")
+
+    async def user(self, user_id: str) -> Optional[Dict]:
+        await to_thread(self.stats.refresh, self.state_path, self.journal_path)
+        return self.stats.user(user_id)
+
+    async def document(self, user_id: str, doc_id: str) -> Optional[Dict]:
+        await to_thread(self.stats.refresh, self.state_path, self.journal_path)
+        return self.stats.document(user_id, doc_id)
+
+    @property
+    def updated_at(self) -> Optional[str]:
+        updated = self.stats.updated_at
+        return datetime.fromtimestamp(updated).isoformat() if updated else None
+
+
+reading_stats = ReadingStatsService()
@@ -0,0 +1,240 @@
+from typing import BinaryIO, Dict, Iterator, List, Optional
+import codecs
+import re
+from .paragraph import Paragraph
+from .source import CHUNK_SIZE, DocumentSource
+
+# 控制字 \word[-]N、十六进制字符 \'hh、控制符号 \x、分组括号、换行、普通文本
+_TOKEN = re.compile(
+    rb"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-fA-F]{2})|\\(.)|([{}])|[\r\n]+|([^\\{}\r\n]+)",
+    re.DOTALL
+)
+# 一个完整记号的最大长度，数据块末尾这么长的内容留到下一块再切分
+_MAX_TOKEN = 64
+
+# 不带 \* 前缀、也不输出内容的目标组（字体表、样式表、图片、页眉页脚、脚注等）；
+# 其余 Word 扩展的目标组都以 \* 标记为可忽略
+_SKIP_DESTINATIONS = {
+    'fonttbl', 'colortbl', 'stylesheet', 'info', 'pict', 'object', 'objdata', 'shp',
+    'nonshppict', 'header', 'headerl', 'headerr', 'headerf', 'footer', 'footerl', 'footerr',
+    'footerf', 'footnote', 'annotation', 'fldinst', 'listtable', 'listoverridetable',
+    'revtbl', 'rsidtbl', 'filetbl', 'pntext', 'pntxta', 'pntxtb', 'listtext', 'txe', 'xe', 'tc',
+}
+
+# 输出为字符的控制字
+_CHARACTERS = {
+    'tab': '\t', 'cell': '\t', 'line': '\n', 'emdash': '\u2014', 'endash': '\u2013',
+    'emspace': '\u2003', 'enspace': '\u2002', 'qmspace': '\u2005', 'bullet': '\u2022',
+    'lquote': '\u2018', 'rquote': '\u2019', 'ldblquote': '\u201c', 'rdblquote': '\u201d',
+}
+# 结束当前段落的控制字
+_BREAKS = {'par', 'sect', 'page', 'row'}
+_SYMBOLS = {'~': '\u00a0', '_': '\u2011', '-': '', '\\': '\\', '{': '{', '}': '}'}
+
+# \fcharset 到代码页
+_CHARSET_CODEPAGES = {
+    128: 932, 129: 949, 130: 1361, 134: 936, 136: 950, 161: 1253, 162: 1254, 163: 1258,
+    177: 1255, 178: 1256, 186: 1257, 204: 1251, 222: 874, 238: 1250,
+}
+
+
+class _Group:
+    """分组状态，进入 { 时复制，遇到 } 时恢复"""
+    __slots__ = ('skip', 'uc', 'font', 'in_fonttbl')
+
+    def __init__(self, skip=False, uc=1, font=None, in_fonttbl=False):
+        self.skip = skip
+        self.uc = uc
+        self.font = font
+        self.in_fonttbl = in_fonttbl
+
+    def copy(self) -> '_Group':
+        return _Group(self.skip, self.uc, self.font, self.in_fonttbl)
+
+
+def _codec(codepage: int) -> str:
+    name = 'utf-8' if codepage == 65001 else f'cp{codepage}'
+    try:
+        codecs.lookup(name)
+        return name
+    except LookupError:
+        return 'cp1252'
+
+
+class RtfReader:
+    """按块切分 RTF 记号并输出段落，内存占用只与当前段落有关
+
+    处理 \\ansicpg 与字体 \\fcharset 指定的代码页、\\'hh 多字节字符、\\uN 及其替代字符（\\ucN）、
+    \\* 可忽略目标组和常见的不输出内容的目标组；\\outlinelevelN 作为标题级别。
+    """
+
+    def __init__(self):
+        self.codepage = 1252
+        self.fonts: Dict[int, int] = {}
+        self.group = _Group()
+        self.stack: List[_Group] = []
+        self.parts: List[str] = []
+        self.pending = bytearray()
+        self.level = 0
+        # \uN 之后待跳过的替代字符数
+        self.skip_chars = 0
+        # \binN 之后待跳过的二进制字节数
+        self.skip_bytes = 0
+        # 刚进入分组，下一个控制字可能是目标组名
+        self.group_start = False
+        self.ignorable = False
+        self.font_number: Optional[int] = None
+        # 数据块末尾未切分的内容
+        self.remainder = b''
+
+    def _current_codec(self) -> str:
+        codepage = self.fonts.get(self.group.font, self.codepage)
+        return _codec(codepage)
+
+    def _flush_bytes(self):
+        if self.pending:
+            self.parts.append(self.pending.decode(self._current_codec(), errors='replace'))
+            self.pending.clear()
+
+    def _emit_bytes(self, data: bytes):
+        if self.group.skip:
+            return
+        if self.skip_chars:
+            consumed = min(self.skip_chars, len(data))
+            self.skip_chars -= consumed
+            data = data[consumed:]
+            if not data:
+                return
+        self.pending.extend(data)
+
+    def _emit_text(self, text: str):
+        if self.group.skip:
+            return
+        if self.skip_chars:
+            self.skip_chars -= 1
+            return
+        self._flush_bytes()
+        self.parts.append(text)
+
+    def _end_paragraph(self) -> Paragraph:
+        self._flush_bytes()
+        text = ''.join(self.parts)
+        self.parts = []
+        return Paragraph(text, self.level)
+
+    def _control_word(self, word: str, param: Optional[int]) -> Optional[Paragraph]:
+        group_start, self.group_start = self.group_start, False
+        ignorable, self.ignorable = self.ignorable, False
+        group = self.group
+
+        if word in _SKIP_DESTINATIONS or (ignorable and group_start):
+            if word == 'fonttbl':
+                group.in_fonttbl = True
+            group.skip = True
+        if group.in_fonttbl:
+            if word == 'f':
+                self.font_number = param
+            elif word == 'fcharset' and self.font_number is not None and param in _CHARSET_CODEPAGES:
+                self.fonts[self.font_number] = _CHARSET_CODEPAGES[param]
+            return None
+
+        if word == 'bin':
+            self.skip_bytes = param or 0
+        elif word == 'ansicpg' and param:
+            self.codepage = param
+        elif word == 'f':
+            self._flush_bytes()
+            group.font = param
+        elif word == 'uc' and param is not None:
+            group.uc = param
+        elif word == 'u' and param is not None:
+            self._emit_text(chr(param + 65536 if param < 0 else param))
+            self.skip_chars = group.uc
+        elif group.skip:
+            return None
+        elif word in _BREAKS:
+            return self._end_paragraph()
+        elif word in _CHARACTERS:
+            self._emit_text(_CHARACTERS[word])
+        elif word == 'pard':
+            self.level = 0
+        elif word == 'outlinelevel' and param is not None:
+            self.level = param + 1 if 0 <= param < 9 else 0
+        return None
+
+    def _token(self, match) -> Optional[Paragraph]:
+        word, param, hex_char, symbol, brace, text = match.groups()
+        if word is not None:
+            return self._control_word(word.decode('ascii'), int(param) if param else None)
+        if hex_char is not None:
+            self.group_start = False
+            self._emit_bytes(bytes([int(hex_char, 16)]))
+        elif brace is not None:
+            self._flush_bytes()
+            if brace == b'{':
+                self.stack.append(self.group)
+                self.group = self.group.copy()
+                self.group_start = True
+            else:
+                if self.stack:
+                    self.group = self.stack.pop()
+                self.group_start = False
+            self.skip_chars = 0
+        elif symbol is not None:
+            if symbol == b'*':
+                self.ignorable = True
+                return None
+            self.group_start = False
+            char = _SYMBOLS.get(symbol.decode('latin-1'))
+            if char is None and symbol in (b'\n', b'\r'):
+                return None if self.group.skip else self._end_paragraph()
+            if char:
+                self._emit_text(char)
+        elif text is not None:
+            self.group_start = False
+            self._emit_bytes(text)
+        return None
+
+    def feed(self, data: bytes, final: bool = False) -> Iterator[Paragraph]:
+        """切分 data 中的完整记号，产出已结束的段落；未处理的剩余部分保存在 remainder"""
+        position = 0
+        limit = len(data) if final else len(data) - _MAX_TOKEN
+        while position < limit:
+            if self.skip_bytes:
+                consumed = min(self.skip_bytes, len(data) - position)
+                self.skip_bytes -= consumed
+                position += consumed
+                continue
+            match = _TOKEN.match(data, position)
+            if match is None:
+                position += 1
+                continue
+            position = match.end()
+            paragraph = self._token(match)
+            if paragraph is not None:
+                yield paragraph
+        self.remainder = data[position:]
+        if final:
+            paragraph = self._end_paragraph()
+            if paragraph.text:
+                yield paragraph
+
+    def read(self, stream: BinaryIO) -> Iterator[Paragraph]:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            data = self.remainder + chunk
+            yield from self.feed(data, final=not chunk)
+            if not chunk:
+                return
+
+
+def iter_paragraphs(stream: BinaryIO) -> Iterator[Paragraph]:
+    return RtfReader().read(stream)
+
+
+def read_paragraphs(source: DocumentSource) -> List[Paragraph]:
+    """读取全部段落；正文和结构提取共用一次解析结果"""
+    def _read():
+        with source.open() as stream:
+            return list(iter_paragraphs(stream))
+    return source.memo('rtf_paragraphs', _read)
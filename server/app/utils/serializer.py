@@ -0,0 +1,73 @@
+from typing import Any, List, Optional, Union
+from datetime import date, datetime, time
+from decimal import Decimal
+import json
+from fastapi.responses import JSONResponse
+from ..config import settings
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库
+    orjson = None
+
+
+def available_backends() -> List[str]:
+    return ['orjson', 'json'] if orjson is not None else ['json']
+
+
+def resolve_backend(name: Optional[str] = None) -> str:
+    name = name or settings.JSON_BACKEND
+    if name == 'auto':
+        return 'orjson' if orjson is not None else 'json'
+    if name not in available_backends():
+        raise ValueError(f"不可用的 JSON 序列化方式: {name}")
+    return name
+
+
+def _default(obj: Any) -> Any:
+    """两种后端都不能直接序列化的对象：日期时间、PDF 元数据中的字节串和间接引用等"""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).decode('utf-8', errors='replace')
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, dict):
+        return {str(key): value for key, value in obj.items()}
+    return str(obj)
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    try:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # 超出 64 位的整数等 orjson 不支持的值，交给标准库
+        return _json_dumps(obj)
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def dumps(obj: Any, backend: Optional[str] = None) -> bytes:
+    """序列化为紧凑的 UTF-8 JSON"""
+    if resolve_backend(backend) == 'orjson':
+        return _orjson_dumps(obj)
+    return _json_dumps(obj)
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str], backend: Optional[str] = None) -> Any:
+    if resolve_backend(backend) == 'orjson':
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """使用 dumps() 编码的 JSON 响应，作为应用的默认响应类"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
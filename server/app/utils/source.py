@@ -0,0 +1,240 @@
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Iterator, Optional, Union
+import io
+import os
+import re
+import tempfile
+import time
+from ..config import settings
+
+# 读取上传和计算哈希的块大小
+CHUNK_SIZE = 1024 * 1024
+
+# 旧版本保存在 UPLOAD_DIR 下的上传文件名：f"{uuid.uuid4()}{file_ext}"
+_LEGACY_UPLOAD = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}(\.[a-z0-9]+)$')
+
+
+class FileTooLarge(Exception):
+    """上传超过 MAX_FILE_SIZE"""
+
+
+class UnsupportedFormat(Exception):
+    """扩展名受支持，但文件内容无法按该格式解析（如旧版二进制 .doc）"""
+
+
+def spool_dir() -> str:
+    path = os.path.join(settings.UPLOAD_DIR, 'spool')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def clean_spool(max_age: float = 3600) -> int:
+    """删除进程异常退出时遗留的临时文件，以及旧版本留在 UPLOAD_DIR 下的上传文件"""
+    removed = 0
+    now = time.time()
+    directories = [spool_dir(), settings.UPLOAD_DIR]
+    for directory in directories:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file() or now - entry.stat().st_mtime < max_age:
+                    continue
+                # UPLOAD_DIR 下只清理上传文件（<uuid>.<ext>），不动其他文件
+                if directory == settings.UPLOAD_DIR:
+                    match = _LEGACY_UPLOAD.match(entry.name)
+                    if not match or match.group(1) not in settings.ALLOWED_EXTENSIONS:
+                        continue
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+    return removed
+
+
+class DocumentSource:
+    """待解析的文档内容
+
+    小文件直接保存在内存中，超过 PARSE_SPOOL_THRESHOLD 的写入 spool 目录下的
+    临时文件，close 时删除。处理器通过 open() 得到只读的二进制流，
+    不再依赖上传后落盘的路径；对象可被 pickle，传给解析工作进程。
+    """
+
+    def __init__(self, name: str, data: Union[bytes, memoryview, None] = None,
+                 path: Optional[str] = None, owned: bool = False):
+        self.name = name
+        self.ext = os.path.splitext(name)[1].lower()
+        self._data = data
+        self._path = path
+        # 临时文件由本对象负责删除
+        self._owned = owned
+        # 同一来源上的派生结果（如解压后的正文），供正文和结构提取共用
+        self._memo: Dict[str, Any] = {}
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview], name: str) -> 'DocumentSource':
+        if isinstance(data, bytearray):
+            data = memoryview(data)
+        return cls(name, data=data)
+
+    @classmethod
+    def from_path(cls, path: str, name: Optional[str] = None) -> 'DocumentSource':
+        return cls(name or os.path.basename(path), path=path)
+
+    @classmethod
+    def coerce(cls, source, name: str) -> 'DocumentSource':
+        """把 bytes / memoryview / 文件对象 / 路径统一为 DocumentSource"""
+        if isinstance(source, DocumentSource):
+            return source
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return cls.from_bytes(source, name)
+        if isinstance(source, (str, os.PathLike)):
+            return cls.from_path(os.fspath(source), name)
+        if hasattr(source, 'read'):
+            return cls.from_chunks(iter(lambda: source.read(CHUNK_SIZE), b''), name)
+        raise TypeError(f"不支持的文档来源: {type(source).__name__}")
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterator[bytes], name: str,
+                    max_size: Optional[int] = None) -> 'DocumentSource':
+        """从数据块构造，超过阈值时转存临时文件；超过 max_size 立即停止读取"""
+        writer = _SpoolWriter(name, max_size)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.discard()
+            raise
+        return writer.finish()
+
+    @classmethod
+    async def from_upload(cls, upload, max_size: Optional[int] = None) -> 'DocumentSource':
+        """按块读取 UploadFile，读取过程中即检查大小"""
+        writer = _SpoolWriter(upload.filename or '', max_size)
+        try:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+        except BaseException:
+            writer.discard()
+            raise
+        return writer.finish()
+
+    @classmethod
+    async def from_async_chunks(cls, chunks: AsyncIterator[bytes], name: str,
+                                max_size: Optional[int] = None) -> 'DocumentSource':
+        """从异步数据块（如 HTTP 响应体）构造，超过 max_size 立即停止读取"""
+        writer = _SpoolWriter(name, max_size)
+        try:
+            async for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.discard()
+            raise
+        return writer.finish()
+
+    @property
+    def in_memory(self) -> bool:
+        return self._data is not None
+
+    @property
+    def size(self) -> int:
+        if self._data is not None:
+            return len(self._data)
+        return os.path.getsize(self._path)
+
+    def open(self) -> BinaryIO:
+        """返回一个新的二进制读取流"""
+        if self._data is not None:
+            return io.BytesIO(self._data)
+        return open(self._path, 'rb')
+
+    def read_bytes(self) -> bytes:
+        if self._data is not None:
+            return bytes(self._data)
+        with open(self._path, 'rb') as f:
+            return f.read()
+
+    def read_text(self, encoding: str) -> str:
+        """按文本模式读取（统一换行符），与原先 open(path, 'r') 的结果一致"""
+        with self.open_text(encoding) as f:
+            return f.read()
+
+    def open_text(self, encoding: str) -> io.TextIOWrapper:
+        return io.TextIOWrapper(self.open(), encoding=encoding)
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        if self._data is not None:
+            view = memoryview(self._data)
+            for start in range(0, len(view), CHUNK_SIZE):
+                yield view[start:start + CHUNK_SIZE]
+            return
+        with open(self._path, 'rb') as f:
+            yield from iter(lambda: f.read(CHUNK_SIZE), b'')
+
+    def memo(self, key: str, factory: Callable[[], Any]) -> Any:
+        """在本对象上缓存 factory() 的结果，随对象一起释放"""
+        if key not in self._memo:
+            self._memo[key] = factory()
+        return self._memo[key]
+
+    def close(self):
+        self._memo.clear()
+        if self._owned and self._path:
+            try:
+                os.remove(self._path)
+            except FileNotFoundError:
+                pass
+            self._owned = False
+
+    def __enter__(self) -> 'DocumentSource':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        # 工作进程只读取内容，不负责删除临时文件
+        data = bytes(self._data) if isinstance(self._data, memoryview) else self._data
+        return {'name': self.name, 'ext': self.ext, '_data': data, '_path': self._path,
+                '_owned': False, '_memo': {}}
+
+
+# process_file 接受的文档来源
+SourceLike = Union[DocumentSource, bytes, bytearray, memoryview, BinaryIO, str]
+
+
+class _SpoolWriter:
+    def __init__(self, name: str, max_size: Optional[int]):
+        self.name = name
+        self.max_size = max_size
+        self.threshold = settings.PARSE_SPOOL_THRESHOLD
+        self.size = 0
+        self.buffer = io.BytesIO()
+        self.file = None
+        self.path = None
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise FileTooLarge(self.size)
+        if self.file is None and self.size > self.threshold:
+            fd, self.path = tempfile.mkstemp(dir=spool_dir(), suffix=os.path.splitext(self.name)[1])
+            self.file = os.fdopen(fd, 'wb')
+            self.file.write(self.buffer.getbuffer())
+            self.buffer = None
+        if self.file is not None:
+            self.file.write(chunk)
+        else:
+            self.buffer.write(chunk)
+
+    def finish(self) -> DocumentSource:
+        if self.file is None:
+            return DocumentSource(self.name, data=self.buffer.getbuffer())
+        self.file.close()
+        return DocumentSource(self.name, path=self.path, owned=True)
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+            os.remove(self.path)
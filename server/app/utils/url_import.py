@@ -0,0 +1,230 @@
+from typing import Dict, Optional
+from email.message import Message
+from datetime import datetime
+from urllib.parse import unquote
+import asyncio
+import hashlib
+import ipaddress
+import mimetypes
+import os
+import posixpath
+import socket
+import aiofiles
+import httpx
+from ..config import settings
+from . import serializer
+from .source import CHUNK_SIZE, DocumentSource, FileTooLarge
+
+
+class DownloadError(Exception):
+    """下载失败；status_code 为返回给客户端的状态码"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FetchResult:
+    """一次下载的结果：not_modified 时没有 source，沿用上次导入的文档"""
+    __slots__ = ('url', 'ext', 'source', 'etag', 'last_modified', 'not_modified')
+
+    def __init__(self, url: str, ext: str, source: Optional[DocumentSource] = None,
+                 etag: Optional[str] = None, last_modified: Optional[str] = None,
+                 not_modified: bool = False):
+        self.url = url
+        self.ext = ext
+        self.source = source
+        self.etag = etag
+        self.last_modified = last_modified
+        self.not_modified = not_modified
+
+
+def _filename_from_disposition(value: str) -> Optional[str]:
+    message = Message()
+    message['content-disposition'] = value
+    filename = message.get_filename()
+    return posixpath.basename(filename) if filename else None
+
+
+def extension_for(response: httpx.Response) -> str:
+    """依次按 URL 路径、Content-Disposition 文件名和 Content-Type 确定扩展名"""
+    names = [posixpath.basename(unquote(response.url.path))]
+    disposition = response.headers.get('content-disposition')
+    if disposition:
+        names.insert(0, _filename_from_disposition(disposition) or '')
+    for name in names:
+        ext = os.path.splitext(name)[1].lower()
+        if ext in settings.ALLOWED_EXTENSIONS:
+            return ext
+    content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+    if not content_type:
+        return ''
+    return mimetypes.guess_extension(content_type) or ''
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    # is_global 已排除回环、私有、链路本地（含云元数据地址）、保留和共享地址
+    return ip.is_global and not ip.is_multicast
+
+
+async def resolve_public_host(host: str, port: int) -> Optional[str]:
+    """解析主机名并确认所有地址都是公网地址，返回用于连接的地址
+
+    IMPORT_ALLOWED_HOSTS 中的主机不检查，返回 None（按主机名连接）。
+    """
+    if host.lower() in settings.IMPORT_ALLOWED_HOSTS:
+        return None
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise DownloadError(502, f"下载失败：无法解析主机 {host}")
+    addresses = [info[4][0] for info in infos]
+    if not addresses or not all(_is_public(address) for address in addresses):
+        raise DownloadError(403, "不允许导入内网或保留地址")
+    return addresses[0]
+
+
+class Downloader:
+    """在线导入的下载器
+
+    所有请求共用一个带连接池的 httpx.AsyncClient（首次使用时创建，关闭服务时关闭），
+    响应体按块写入 DocumentSource，与上传走同一条解析路径，边下载边检查 MAX_FILE_SIZE。
+    每个 URL 记录上次导入得到的文档ID和 ETag/Last-Modified，再次导入时发条件请求，
+    源站返回 304 即直接使用已解析的文档。
+
+    为防止借导入访问内网，每一跳（包括重定向）都先解析主机名、拒绝非公网地址，
+    再直接连接检查过的地址，避免两次解析结果不同；重定向因此由这里逐跳处理。
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.directory = os.path.join(settings.UPLOAD_DIR, 'imports')
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.IMPORT_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.IMPORT_MAX_KEEPALIVE
+                ),
+                timeout=httpx.Timeout(settings.IMPORT_TIMEOUT, connect=settings.IMPORT_CONNECT_TIMEOUT),
+                follow_redirects=False,
+                headers={'User-Agent': settings.IMPORT_USER_AGENT}
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _record_path(self, url: str) -> str:
+        return os.path.join(self.directory, f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json")
+
+    async def load_record(self, url: str) -> Optional[Dict]:
+        """上次导入该 URL 的记录"""
+        try:
+            async with aiofiles.open(self._record_path(url), 'rb') as f:
+                return serializer.loads(await f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    async def save_record(self, url: str, doc_id: str, fetched: FetchResult):
+        os.makedirs(self.directory, exist_ok=True)
+        record = {
+            'url': url,
+            'doc_id': doc_id,
+            'ext': fetched.ext,
+            'etag': fetched.etag,
+            'last_modified': fetched.last_modified,
+            'fetched_at': datetime.now().isoformat()
+        }
+        async with aiofiles.open(self._record_path(url), 'wb') as f:
+            await f.write(serializer.dumps(record))
+
+    @staticmethod
+    def _check_url(url: httpx.URL):
+        if url.scheme not in ('http', 'https') or not url.host:
+            raise DownloadError(400, "只支持 http/https 地址")
+
+    async def _send(self, url: httpx.URL, headers: Dict[str, str]) -> httpx.Response:
+        """发送一跳请求：连接检查过的地址，Host 和 TLS SNI 仍使用原主机名"""
+        address = await resolve_public_host(url.host, url.port or (443 if url.scheme == 'https' else 80))
+        extensions = {}
+        if address is not None:
+            headers = {**headers, 'Host': url.netloc.decode('ascii')}
+            if url.scheme == 'https':
+                extensions['sni_hostname'] = url.host
+            url = url.copy_with(host=address)
+        request = self.client.build_request('GET', url, headers=headers, extensions=extensions)
+        return await self.client.send(request, stream=True)
+
+    async def _open(self, url: httpx.URL, headers: Dict[str, str]) -> httpx.Response:
+        """逐跳跟随重定向，每一跳都重新检查目标地址"""
+        for _ in range(settings.IMPORT_MAX_REDIRECTS + 1):
+            response = await self._send(url, headers)
+            location = response.headers.get('location')
+            if not (response.is_redirect and location):
+                return response
+            await response.aclose()
+            url = url.join(location)
+            self._check_url(url)
+        raise DownloadError(502, "下载失败：重定向次数过多")
+
+    async def fetch(self, url: str, record: Optional[Dict] = None,
+                    file_ext: Optional[str] = None) -> FetchResult:
+        """下载 url；record 为上次导入的记录时发条件请求
+
+        超过 MAX_FILE_SIZE 时抛出 FileTooLarge（Content-Length 已超出时不读取响应体）。
+        """
+        try:
+            parsed = httpx.URL(url)
+        except (httpx.InvalidURL, TypeError):
+            raise DownloadError(400, "无效的 URL")
+        self._check_url(parsed)
+
+        headers = {}
+        if record:
+            if record.get('etag'):
+                headers['If-None-Match'] = record['etag']
+            if record.get('last_modified'):
+                headers['If-Modified-Since'] = record['last_modified']
+
+        try:
+            response = await self._open(parsed, headers)
+            try:
+                etag = response.headers.get('etag')
+                last_modified = response.headers.get('last-modified')
+                if response.status_code == 304 and record:
+                    return FetchResult(url, record['ext'], etag=etag or record.get('etag'),
+                                       last_modified=last_modified or record.get('last_modified'),
+                                       not_modified=True)
+                if response.status_code != 200:
+                    raise DownloadError(502, f"下载失败：源站返回 {response.status_code}")
+
+                ext = (file_ext or extension_for(response)).lower()
+                if ext not in settings.ALLOWED_EXTENSIONS:
+                    raise DownloadError(400, "不支持的文件格式")
+                length = response.headers.get('content-length', '')
+                if length.isdigit() and 'content-encoding' not in response.headers:
+                    # 压缩传输时 Content-Length 是压缩后的大小，只能边解压边检查
+                    if int(length) > settings.MAX_FILE_SIZE:
+                        raise FileTooLarge(int(length))
+
+                source = await DocumentSource.from_async_chunks(
+                    response.aiter_bytes(CHUNK_SIZE), f"document{ext}", settings.MAX_FILE_SIZE
+                )
+                return FetchResult(url, ext, source, etag, last_modified)
+            finally:
+                await response.aclose()
+        except httpx.TimeoutException:
+            raise DownloadError(504, "下载超时")
+        except httpx.HTTPError as e:
+            raise DownloadError(502, f"下载失败：{e}")
+
+
+downloader = Downloader()
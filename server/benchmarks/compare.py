@@ -0,0 +1,86 @@
+"""对比两份基准测试报告
+
+    python -m benchmarks.compare old.json new.json --threshold 10
+
+逐项比较耗时中位数、峰值内存和吞吐，变化超过阈值（百分比）的项会标出；
+加 --fail-on-regression 时存在退化则以非零状态退出，便于在 CI 中使用。
+"""
+from typing import Dict, Tuple
+import argparse
+import json
+import sys
+
+# 指标名 -> 数值越大越好
+METRICS = {
+    'median_ms': False,
+    'peak_memory_bytes': False,
+    'chars_per_sec': True,
+    'output_bytes': False,
+    'stored_bytes': False,
+}
+
+
+def flatten(report: Dict) -> Dict[str, Tuple[float, bool]]:
+    """把报告展开为 {指标路径: (数值, 是否越大越好)}"""
+    values = {}
+
+    def visit(prefix: str, node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in METRICS and isinstance(value, (int, float)):
+                    values[f'{prefix}.{key}'] = (value, METRICS[key])
+                else:
+                    visit(f'{prefix}.{key}' if prefix else key, value)
+
+    for entry in report.get('parse', []):
+        if 'error' not in entry:
+            visit(f"parse.{entry['format']}/{entry['size']}/{entry['lang']}", entry)
+    for section in ('pagination', 'store', 'docx', 'html', 'bionic', 'json', 'http'):
+        visit(section, report.get(section, {}))
+    return values
+
+
+def compare(old: Dict, new: Dict, threshold: float):
+    old_values, new_values = flatten(old), flatten(new)
+    rows, regressions = [], 0
+    for key in sorted(set(old_values) & set(new_values)):
+        before, higher_is_better = old_values[key]
+        after = new_values[key][0]
+        if not before:
+            continue
+        change = (after - before) / before * 100
+        worse = change < -threshold if higher_is_better else change > threshold
+        better = change > threshold if higher_is_better else change < -threshold
+        if worse:
+            regressions += 1
+        rows.append((key, before, after, change, 'REGRESSION' if worse else ('improved' if better else '')))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比两份基准测试报告')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help='标记变化的百分比阈值')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    with open(args.old, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+
+    rows, regressions = compare(old, new, args.threshold)
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"{'metric':<{width}}  {'old':>14}  {'new':>14}  {'change':>8}")
+    for key, before, after, change, mark in rows:
+        print(f'{key:<{width}}  {before:>14.3f}  {after:>14.3f}  {change:>7.1f}%  {mark}')
+    print(f"\n{old['meta'].get('git_revision')} -> {new['meta'].get('git_revision')}: "
+          f'{len(rows)} metrics, {regressions} regressions (threshold {args.threshold}%)')
+
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
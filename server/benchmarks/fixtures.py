@@ -0,0 +1,298 @@
+"""基准测试用的合成文档
+
+所有内容由固定种子的随机数生成，同一参数多次生成的文本完全一致，
+可以在不同版本之间对比解析结果和耗时。
+"""
+from typing import Dict, List, Tuple
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+SIZES: Dict[str, int] = {
+    'small': 50,      # 段落数
+    'medium': 1000,
+    'large': 8000,
+}
+
+LANGS = ('en', 'zh')
+
+FORMATS = ('txt', 'md', 'html', 'csv', 'json', 'xml', 'docx', 'xlsx', 'pptx', 'pdf', 'epub')
+
+EN_WORDS = (
+    'reading', 'bionic', 'the', 'document', 'chapter', 'quickly', 'attention', 'a', 'focus',
+    'paragraph', 'of', 'eye', 'movement', 'and', 'fixation', 'well-known', 'study', 'to',
+    'comprehension', 'text', 'letters', 'in', 'human', 'brain', 'pattern', 'is', 'words',
+    'experiment', 'results', 'with', 'interface', 'design', 'typography', 'for', 'screen',
+    'page', 'book', 'library', 'knowledge', 'learning', 'memory', 'speed', 'highlight',
+)
+
+ZH_CHARS = (
+    '阅读仿生文档章节快速注意力集中段落眼睛移动注视研究理解文字字母大脑模式单词实验结果'
+    '界面设计排版屏幕页面书籍图书馆知识学习记忆速度高亮中文测试内容数据分析方法系统'
+)
+
+
+def _rng(fmt: str, size: str, lang: str) -> random.Random:
+    seed = int(hashlib.md5(f'{fmt}:{size}:{lang}'.encode('utf-8')).hexdigest()[:8], 16)
+    return random.Random(seed)
+
+
+def _sentence(rng: random.Random, lang: str) -> str:
+    if lang == 'zh':
+        length = rng.randint(12, 30)
+        return ''.join(rng.choice(ZH_CHARS) for _ in range(length)) + rng.choice('。！？')
+    words = [rng.choice(EN_WORDS) for _ in range(rng.randint(6, 18))]
+    words[0] = words[0].capitalize()
+    return ' '.join(words) + rng.choice('.!?')
+
+
+def paragraphs(rng: random.Random, lang: str, count: int) -> List[str]:
+    sep = '' if lang == 'zh' else ' '
+    return [sep.join(_sentence(rng, lang) for _ in range(rng.randint(2, 6))) for _ in range(count)]
+
+
+def sections(rng: random.Random, lang: str, count: int) -> List[Tuple[str, List[str]]]:
+    """按章节组织的段落：[(标题, 段落列表), ...]，每章约 20 段"""
+    result = []
+    body = paragraphs(rng, lang, count)
+    for index in range(0, len(body), 20):
+        number = index // 20 + 1
+        title = f'第{number}章 {body[index][:8]}' if lang == 'zh' else f'Chapter {number} {body[index][:24]}'
+        result.append((title, body[index:index + 20]))
+    return result
+
+
+def _txt(secs) -> bytes:
+    lines = []
+    for title, body in secs:
+        lines.append(title)
+        lines.extend(body)
+    return '\n'.join(lines).encode('utf-8')
+
+
+def _md(secs) -> bytes:
+    lines = []
+    for index, (title, body) in enumerate(secs):
+        lines.append(f"{'#' if index % 5 == 0 else '##'} {title}")
+        lines.append('')
+        for para in body:
+            lines.append(para)
+            lines.append('')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def _html(secs) -> bytes:
+    # 嵌套 div 模拟真实网页的布局容器
+    parts = ['<html><head><title>Benchmark</title></head><body><div class="page"><div class="content">']
+    for title, body in secs:
+        parts.append(f'<div class="section"><h2>{escape(title)}</h2>')
+        for para in body:
+            parts.append(f'<div class="block"><p>{escape(para)}</p></div>')
+        parts.append('</div>')
+    parts.append('</div></div></body></html>')
+    return '\n'.join(parts).encode('utf-8')
+
+
+def _csv(secs) -> bytes:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['chapter', 'index', 'text'])
+    for title, body in secs:
+        for index, para in enumerate(body):
+            writer.writerow([title, index, para])
+    return out.getvalue().encode('utf-8')
+
+
+def _json(secs) -> bytes:
+    data = {'title': 'Benchmark', 'chapters': [{'title': t, 'paragraphs': b} for t, b in secs]}
+    return json.dumps(data, ensure_ascii=False, indent=1).encode('utf-8')
+
+
+def _xml(secs) -> bytes:
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>', '<book>']
+    for title, body in secs:
+        parts.append(f'<chapter><title>{escape(title)}</title>')
+        parts.extend(f'<para>{escape(para)}</para>' for para in body)
+        parts.append('</chapter>')
+    parts.append('</book>')
+    return '\n'.join(parts).encode('utf-8')
+
+
+def _docx(secs) -> bytes:
+    import docx
+    document = docx.Document()
+    for title, body in secs:
+        document.add_heading(title, level=1)
+        for para in body:
+            document.add_paragraph(para)
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def _xlsx(secs) -> bytes:
+    import openpyxl
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'Sheet1'
+    for title, body in secs:
+        for index, para in enumerate(body):
+            sheet.append([title, index, para])
+    out = io.BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+def _pptx(secs) -> bytes:
+    from pptx import Presentation
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]
+    for title, body in secs:
+        for start in range(0, len(body), 5):
+            slide = presentation.slides.add_slide(layout)
+            slide.shapes.title.text = title
+            slide.placeholders[1].text = '\n'.join(body[start:start + 5])
+    out = io.BytesIO()
+    presentation.save(out)
+    return out.getvalue()
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _pdf(secs, lang: str) -> bytes:
+    """手写最小 PDF：标准 Helvetica 字体，每页 40 行
+
+    标准字体不含中文字形，中文语料在 PDF 中以 Unicode 转义形式的占位文本代替。
+    """
+    lines = []
+    for title, body in secs:
+        lines.append(title)
+        for para in body:
+            while para:
+                lines.append(para[:90])
+                para = para[90:]
+    if lang == 'zh':
+        lines = [line.encode('unicode_escape').decode('ascii').replace('\\u', 'u')[:90] for line in lines]
+
+    pages = [lines[i:i + 40] for i in range(0, len(lines), 40)] or [[]]
+    objects: List[bytes] = []
+    # 1: catalog, 2: pages, 3: font，之后每页两个对象（页面、内容流）
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects.append(b'<< /Type /Catalog /Pages 2 0 R >>')
+    kids = ' '.join(f'{pid} 0 R' for pid in page_ids)
+    objects.append(f'<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>'.encode('ascii'))
+    objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+    for index, page_lines in enumerate(pages):
+        stream = ['BT', '/F1 10 Tf', '12 TL', '40 800 Td']
+        for line in page_lines:
+            stream.append(f'({_pdf_escape(line)}) Tj T*')
+        stream.append('ET')
+        data = '\n'.join(stream).encode('latin-1', 'replace')
+        objects.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {page_ids[index] + 1} 0 R >>'.encode('ascii')
+        )
+        objects.append(f'<< /Length {len(data)} >>\nstream\n'.encode('ascii') + data + b'\nendstream')
+
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f'{number} 0 obj\n'.encode('ascii') + body + b'\nendobj\n')
+    xref = out.tell()
+    out.write(f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('ascii'))
+    for offset in offsets:
+        out.write(f'{offset:010d} 00000 n \n'.encode('ascii'))
+    out.write(f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('ascii'))
+    return out.getvalue()
+
+
+def _epub(secs, lang: str) -> bytes:
+    """按 EPUB 3 结构直接打包，避免生成结果受第三方库版本影响"""
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w') as archive:
+        archive.writestr(zipfile.ZipInfo('mimetype'), 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        archive.writestr('META-INF/container.xml', (
+            '<?xml version="1.0"?><container version="1.0" '
+            'xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+            '<rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+            '</rootfiles></container>'
+        ))
+        manifest, spine, nav_items = [], [], []
+        for index, (title, body) in enumerate(secs):
+            name = f'chap_{index + 1}.xhtml'
+            paras = ''.join(f'<p>{escape(para)}</p>' for para in body)
+            archive.writestr(f'OEBPS/{name}', (
+                '<?xml version="1.0" encoding="utf-8"?><html xmlns="http://www.w3.org/1999/xhtml">'
+                f'<head><title>{escape(title)}</title></head><body><h1>{escape(title)}</h1>{paras}</body></html>'
+            ))
+            manifest.append(f'<item id="c{index}" href="{name}" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="c{index}"/>')
+            nav_items.append(f'<li><a href="{name}">{escape(title)}</a></li>')
+        archive.writestr('OEBPS/nav.xhtml', (
+            '<?xml version="1.0" encoding="utf-8"?><html xmlns="http://www.w3.org/1999/xhtml" '
+            'xmlns:epub="http://www.idpf.org/2007/ops"><head><title>toc</title></head><body>'
+            f'<nav epub:type="toc"><ol>{"".join(nav_items)}</ol></nav></body></html>'
+        ))
+        archive.writestr('OEBPS/content.opf', (
+            '<?xml version="1.0" encoding="utf-8"?><package xmlns="http://www.idpf.org/2007/opf" '
+            'version="3.0" unique-identifier="id"><metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<dc:identifier id="id">benchmark-{lang}</dc:identifier><dc:title>Benchmark</dc:title>'
+            f'<dc:language>{lang}</dc:language></metadata><manifest>'
+            '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>'
+            f'{"".join(manifest)}</manifest><spine>{"".join(spine)}</spine></package>'
+        ))
+    return out.getvalue()
+
+
+_BUILDERS = {
+    'txt': _txt, 'md': _md, 'html': _html, 'csv': _csv, 'json': _json, 'xml': _xml,
+    'docx': _docx, 'xlsx': _xlsx, 'pptx': _pptx,
+}
+
+
+def build_fixture(fmt: str, size: str, lang: str, nonce: str = '') -> bytes:
+    """生成一个合成文档的字节内容
+
+    nonce 非空时在第一章开头加入一段包含它的文本，其余内容不变；
+    文档ID随之不同，用于测量实际解析而不是解析缓存。
+    """
+    secs = sections(_rng(fmt, size, lang), lang, SIZES[size])
+    if nonce:
+        title, body = secs[0]
+        secs[0] = (title, [f'Sample {nonce}.'] + body)
+    if fmt == 'pdf':
+        return _pdf(secs, lang)
+    if fmt == 'epub':
+        return _epub(secs, lang)
+    return _BUILDERS[fmt](secs)
+
+
+def write_fixtures(directory: str, formats=FORMATS, sizes=tuple(SIZES), langs=LANGS) -> List[Dict]:
+    """把合成文档写入目录，返回清单；缺少生成依赖的格式记录错误后跳过"""
+    os.makedirs(directory, exist_ok=True)
+    manifest = []
+    for fmt in formats:
+        for size in sizes:
+            for lang in langs:
+                entry = {'format': fmt, 'size': size, 'lang': lang}
+                try:
+                    data = build_fixture(fmt, size, lang)
+                except ImportError as e:
+                    entry['error'] = f'missing dependency: {e.name}'
+                    manifest.append(entry)
+                    continue
+                path = os.path.join(directory, f'{size}_{lang}.{fmt}')
+                with open(path, 'wb') as f:
+                    f.write(data)
+                entry.update(path=path, bytes=len(data))
+                manifest.append(entry)
+    return manifest
@@ -0,0 +1,255 @@
+"""并发读者压测：按真实操作比例回放请求，输出各接口吞吐和延迟分位数
+
+    cd server
+    python -m benchmarks.loadtest --concurrency 1,8,32,64 --duration 20
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8000 --concurrency 16
+
+默认在进程内通过 ASGI 直接调用 FastAPI 应用，并使用进程内 Redis 替身（memory://）；
+指定 --base-url 时改为压测已启动的服务。每个并发档位单独统计，
+可以看出 /api/content 的延迟从哪一档开始明显上升。需要安装 httpx。
+"""
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+from . import fixtures
+
+# 操作及其权重：翻页为主，偶尔上传新书、查看目录、读取进度
+DEFAULT_MIX = {
+    'page_turn': 70,
+    'structure': 10,
+    'progress': 15,
+    'upload': 5,
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法计算分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, elapsed: float, ok: bool):
+        self.latencies.setdefault(endpoint, []).append(elapsed)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, duration: float) -> Dict:
+        result = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            result[endpoint] = {
+                'requests': len(values),
+                'errors': self.errors.get(endpoint, 0),
+                'throughput_rps': round(len(values) / duration, 2),
+                'p50_ms': round(percentile(values, 50) * 1000, 3),
+                'p90_ms': round(percentile(values, 90) * 1000, 3),
+                'p99_ms': round(percentile(values, 99) * 1000, 3),
+                'max_ms': round(max(values) * 1000, 3),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        result['_total'] = {
+            'requests': total,
+            'errors': sum(self.errors.values()),
+            'throughput_rps': round(total / duration, 2),
+        }
+        return result
+
+
+class Reader:
+    """一个虚拟读者：打开一本书顺序翻页，按比例穿插其他操作"""
+
+    def __init__(self, index: int, client, library: List[Dict], uploads: List[Dict],
+                 mix: Dict[str, int], recorder: Recorder, think_time: float, seed: int):
+        self.user_id = f'load-{index}'
+        self.client = client
+        self.library = library
+        self.uploads = uploads
+        self.recorder = recorder
+        self.think_time = think_time
+        self.rng = random.Random(seed + index)
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        # 每次上传加入唯一的一段，内容哈希不同，确实经过解析而不是命中解析缓存
+        self.upload_prefix = f'{uuid.uuid4().hex[:8]}-{index}'
+        self.uploaded = 0
+        self._open(self.rng.choice(library))
+
+    def _open(self, book: Dict):
+        self.book = book
+        self.page = 1
+
+    async def _timed(self, endpoint: str, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        return response
+
+    async def step(self):
+        operation = self.rng.choices(self.operations, self.weights)[0]
+        doc_id = self.book['doc_id']
+        if operation == 'page_turn':
+            await self._timed('GET /api/content', self.client.get(
+                f'/api/content/{doc_id}',
+                params={'page': self.page, 'user_id': self.user_id}
+            ))
+            # 读完一本换一本
+            self.page += 1
+            if self.page > self.book['total_pages']:
+                self._open(self.rng.choice(self.library))
+        elif operation == 'structure':
+            await self._timed('GET /api/document/structure', self.client.get(
+                f'/api/document/{doc_id}/structure'
+            ))
+        elif operation == 'progress':
+            await self._timed('GET /api/progress', self.client.get(
+                f'/api/progress/{doc_id}', params={'user_id': self.user_id}
+            ))
+        elif operation == 'upload':
+            upload = self.rng.choice(self.uploads)
+            self.uploaded += 1
+            data = unique_upload(upload, f'{self.upload_prefix}-{self.uploaded}')
+            await self._timed('POST /api/parse', self.client.post(
+                '/api/parse', files={'file': (upload['name'], data)}
+            ))
+        if self.think_time:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.think_time))
+
+    async def run(self, deadline: float):
+        while time.perf_counter() < deadline:
+            await self.step()
+
+
+def unique_upload(item: Dict, nonce: str) -> bytes:
+    """在语料末尾加入包含 nonce 的一段（HTML 放在 </body> 之前）"""
+    paragraph = f'Upload {nonce}.'
+    if item['name'].endswith('.html'):
+        return item['data'].replace(b'</body>', f'<p>{paragraph}</p></body>'.encode('utf-8'), 1)
+    return item['data'] + f'\n\n{paragraph}\n'.encode('utf-8')
+
+
+def build_corpus(langs, sizes) -> List[Dict]:
+    corpus = []
+    for fmt in ('txt', 'md', 'html'):
+        for size in sizes:
+            for lang in langs:
+                corpus.append({
+                    'name': f'{size}_{lang}.{fmt}',
+                    'data': fixtures.build_fixture(fmt, size, lang),
+                })
+    return corpus
+
+
+async def prepare_library(client, corpus: List[Dict]) -> List[Dict]:
+    """预先上传语料，得到可供翻页的文档列表"""
+    library = []
+    for item in corpus:
+        response = await client.post('/api/parse', files={'file': (item['name'], item['data'])})
+        if response.status_code != 200:
+            raise RuntimeError(f"上传 {item['name']} 失败: {response.status_code} {response.text[:200]}")
+        body = response.json()
+        library.append({'doc_id': body['doc_id'], 'total_pages': body['total_pages']})
+    return library
+
+
+async def run_level(client, library, uploads, concurrency: int, duration: float,
+                    mix: Dict[str, int], think_time: float, seed: int) -> Dict:
+    recorder = Recorder()
+    readers = [Reader(i, client, library, uploads, mix, recorder, think_time, seed)
+               for i in range(concurrency)]
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(reader.run(deadline) for reader in readers))
+    elapsed = time.perf_counter() - start
+    return {'concurrency': concurrency, 'duration_s': round(elapsed, 3),
+            'endpoints': recorder.summary(elapsed)}
+
+
+def _client(base_url: Optional[str]):
+    import httpx
+    timeout = httpx.Timeout(60.0)
+    if base_url:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        return httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits)
+    from app.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://loadtest',
+                             timeout=timeout)
+
+
+async def run(args) -> Dict:
+    mix = dict(DEFAULT_MIX)
+    if args.mix:
+        mix.update(json.loads(args.mix))
+    levels = [int(level) for level in args.concurrency.split(',')]
+    sizes = tuple(args.sizes.split(','))
+    langs = tuple(args.langs.split(','))
+    corpus = build_corpus(langs, sizes)
+
+    report = {
+        'mode': args.base_url or 'in-process',
+        'mix': mix,
+        'think_time_s': args.think_time,
+        'levels': [],
+    }
+    async with _client(args.base_url) as client:
+        library = await prepare_library(client, corpus)
+        for concurrency in levels:
+            result = await run_level(client, library, corpus, concurrency, args.duration,
+                                     mix, args.think_time, args.seed)
+            report['levels'].append(result)
+            content = result['endpoints'].get('GET /api/content', {})
+            print(f"concurrency={concurrency}: {result['endpoints']['_total']['throughput_rps']} req/s, "
+                  f"content p50={content.get('p50_ms')} ms p99={content.get('p99_ms')} ms",
+                  file=sys.stderr)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='仿生阅读服务并发压测')
+    parser.add_argument('--base-url', default=None, help='压测已启动的服务，默认进程内调用')
+    parser.add_argument('--concurrency', default='1,8,32', help='逗号分隔的并发读者数档位')
+    parser.add_argument('--duration', type=float, default=10.0, help='每个档位持续秒数')
+    parser.add_argument('--think-time', type=float, default=0.0, help='读者操作间平均停顿秒数')
+    parser.add_argument('--mix', default=None, help='覆盖操作权重的 JSON，如 {"upload": 0}')
+    parser.add_argument('--sizes', default='small,medium')
+    parser.add_argument('--langs', default='en,zh')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default='-', help='报告输出路径，- 表示标准输出')
+    args = parser.parse_args(argv)
+
+    if not args.base_url:
+        # 必须在导入 app 之前设置
+        workdir = tempfile.mkdtemp(prefix='reading-load-')
+        os.environ.setdefault('UPLOAD_DIR', os.path.join(workdir, 'uploads'))
+        os.environ.setdefault('REDIS_URL', 'memory://')
+
+    report = asyncio.run(run(args))
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(data)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(data)
+
+
+if __name__ == '__main__':
+    main()
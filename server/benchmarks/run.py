@@ -0,0 +1,465 @@
+"""运行基准测试并输出 JSON 报告
+
+    cd server
+    python -m benchmarks.run --sizes small,medium --output bench.json
+    python -m benchmarks.compare old.json bench.json
+
+测试内容：
+- 各格式处理器的解析耗时和峰值内存（tracemalloc）
+- 不同页面大小的分页吞吐
+- DOCX：python-docx 对象模型与流式读取（zip + iterparse）的耗时和峰值内存
+- HTML / Markdown：BeautifulSoup find_all 与单遍块级切分的耗时、峰值内存和输出段落数
+- 段落流存储：旧版 JSON 与各压缩方式的体积、读取一次页面范围和读取全文的耗时
+- 仿生阅读 HTML / spans 两种输出的渲染吞吐
+- JSON 序列化：各可用后端（orjson / 标准库）编码和解码一次内容接口响应的耗时
+- 通过进程内 ASGI 客户端请求 /api/parse 和 /api/content 的端到端延迟（每次上传内容不同，冷读取针对刚解析的文档）
+
+运行时使用临时 UPLOAD_DIR 和进程内 Redis 替身（memory://），不影响本地数据。
+端到端测试需要额外安装 httpx。
+"""
+from typing import Dict, List
+import argparse
+import asyncio
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from . import fixtures
+
+REPORT_VERSION = 1
+PAGE_SIZES = (1000, 3000, 6000)
+
+
+def summarize(samples: List[float]) -> Dict:
+    """把耗时样本（秒）汇总为毫秒统计"""
+    values = sorted(samples)
+    return {
+        'runs': len(values),
+        'mean_ms': round(statistics.fmean(values) * 1000, 3),
+        'median_ms': round(statistics.median(values) * 1000, 3),
+        'min_ms': round(values[0] * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3),
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+async def bench_parse(processor, entry: Dict, repeat: int) -> Dict:
+    import chardet
+    from app.utils.source import DocumentSource
+
+    result = {key: entry[key] for key in ('format', 'size', 'lang', 'bytes')}
+    path = entry['path']
+    handler = processor.processors['.' + entry['format']]
+    with open(path, 'rb') as f:
+        data = f.read()
+    encoding = chardet.detect(data)['encoding'] or 'utf-8'
+    name = os.path.basename(path)
+
+    # 与上传路径一致，从内存解析；每次新建来源，避免复用其上缓存的解析结果
+    samples = []
+    content = ''
+    for _ in range(repeat):
+        start = time.perf_counter()
+        content = await handler(DocumentSource.from_bytes(data, name), encoding)
+        samples.append(time.perf_counter() - start)
+    result['parse'] = summarize(samples)
+
+    # 峰值内存单独测量，避免 tracemalloc 影响计时
+    tracemalloc.start()
+    try:
+        await handler(DocumentSource.from_bytes(data, name), encoding)
+        result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    paragraphs = processor.doc_manager.split_paragraphs(content)
+    result['paragraphs'] = len(paragraphs)
+    result['chars'] = sum(len(p) for p in paragraphs)
+    result['_paragraphs'] = paragraphs
+    return result
+
+
+def bench_pagination(paragraphs: List[str], repeat: int) -> Dict:
+    from app.utils.pagination import compute_layout
+
+    chars = sum(len(p) for p in paragraphs)
+    results = {}
+    for page_size in PAGE_SIZES:
+        samples = []
+        pages = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            layout = compute_layout(paragraphs, page_size)
+            samples.append(time.perf_counter() - start)
+            pages = layout.total_pages
+        stats = summarize(samples)
+        stats['pages'] = pages
+        stats['chars_per_sec'] = round(chars / max(statistics.median(samples), 1e-9))
+        results[str(page_size)] = stats
+    return results
+
+
+def bench_store(paragraphs: List[str], repeat: int, workdir: str) -> Dict:
+    """对比旧版 JSON 段落流与各压缩方式的体积、整页范围读取和全文读取耗时"""
+    import json
+    from app.config import settings
+    from app.utils import page_store
+    from app.utils.pagination import compute_layout
+
+    layout = compute_layout(paragraphs, settings.PAGE_SIZE)
+    pages_per_block = settings.MAX_PAGES_PER_REQUEST
+    # 读取中间一段对齐的页面范围，与 /api/content 一次请求相同
+    start_page = (layout.total_pages // 2) // pages_per_block * pages_per_block
+    end_page = min(start_page + pages_per_block, layout.total_pages)
+    first_para = layout.page_bounds(start_page)[0][0]
+    end_para, end_offset = layout.page_bounds(end_page - 1)[1]
+    last_para = max(first_para, end_para if end_offset > 0 else end_para - 1)
+
+    results = {}
+    legacy_path = os.path.join(workdir, 'legacy.json')
+    with open(legacy_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'paragraphs': paragraphs, 'total_chars': 0, 'created_at': ''}))
+
+    def _legacy_range():
+        with open(legacy_path, encoding='utf-8') as f:
+            data = json.loads(f.read())['paragraphs']
+        return [layout.render_page(data, i) for i in range(start_page, end_page)]
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _legacy_range()
+        samples.append(time.perf_counter() - start)
+    results['json'] = {'stored_bytes': os.path.getsize(legacy_path), 'range': summarize(samples)}
+
+    variants = [(codec, settings.PAGE_STORE_DICT_SIZE) for codec in page_store.available_codecs()]
+    variants.append(('zlib', 0))
+    original_dict_size = settings.PAGE_STORE_DICT_SIZE
+    for codec, dict_size in variants:
+        label = codec if dict_size or codec == 'none' else f'{codec}/no_dict'
+        path = os.path.join(workdir, f'store_{label.replace("/", "_")}.pages')
+        settings.PAGE_STORE_DICT_SIZE = dict_size
+        try:
+            start = time.perf_counter()
+            size = page_store.write_document(path, paragraphs, layout, '', codec=codec)
+            encode = time.perf_counter() - start
+        finally:
+            settings.PAGE_STORE_DICT_SIZE = original_dict_size
+
+        range_samples, all_samples = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            document = page_store.open_document(path)
+            window = document.read_range(first_para, last_para)
+            [layout.render_page(window, i) for i in range(start_page, end_page)]
+            range_samples.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            document.read_all()
+            all_samples.append(time.perf_counter() - start)
+        results[label] = {
+            'stored_bytes': size,
+            'blocks': len(document.blocks),
+            'encode_ms': round(encode * 1000, 3),
+            'range': summarize(range_samples),
+            'read_all': summarize(all_samples),
+        }
+    return results
+
+
+def bench_docx(path: str, repeat: int) -> Dict:
+    """对比 python-docx 与流式读取器提取段落文本和标题样式的耗时、峰值内存"""
+    import docx
+    from app.utils import docx_reader
+
+    def _python_docx():
+        return [(p.text, p.style.name) for p in docx.Document(path).paragraphs]
+
+    def _streaming():
+        with open(path, 'rb') as f:
+            return [(p.text, p.level) for p in docx_reader.iter_paragraphs(f)]
+
+    results = {}
+    for label, reader in (('python_docx', _python_docx), ('streaming', _streaming)):
+        samples = []
+        paragraphs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            paragraphs = reader()
+            samples.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            reader()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        stats = summarize(samples)
+        stats['peak_memory_bytes'] = peak
+        stats['paragraphs'] = len(paragraphs)
+        results[label] = stats
+    return results
+
+
+def bench_html(path: str, fmt: str, repeat: int) -> Dict:
+    """对比原先的 BeautifulSoup 提取与单遍块级切分；嵌套 div 会让前者重复输出同一段文字"""
+    from bs4 import BeautifulSoup
+    import markdown2
+    from app.utils import html_reader
+
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    tags = ['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'] if fmt == 'html' else ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+
+    def _beautifulsoup():
+        html = text if fmt == 'html' else markdown2.markdown(text)
+        return [p.get_text() for p in BeautifulSoup(html, 'html.parser').find_all(tags)]
+
+    def _single_pass():
+        html = text if fmt == 'html' else markdown2.markdown(text, extras=html_reader.MARKDOWN_EXTRAS)
+        return [p.text for p in html_reader.parse([html]).paragraphs]
+
+    results = {}
+    for label, reader in (('beautifulsoup', _beautifulsoup), ('single_pass', _single_pass)):
+        samples = []
+        paragraphs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            paragraphs = reader()
+            samples.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            reader()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        stats = summarize(samples)
+        stats['peak_memory_bytes'] = peak
+        stats['paragraphs'] = len(paragraphs)
+        stats['chars'] = sum(len(p) for p in paragraphs)
+        results[label] = stats
+    return results
+
+
+def bench_bionic(paragraphs: List[str], repeat: int) -> Dict:
+    from app.utils import bionic
+    from app.utils.pagination import compute_layout
+
+    layout = compute_layout(paragraphs, 3000)
+    pages = [layout.render_page(paragraphs, i) for i in range(min(layout.total_pages, 20))]
+    chars = sum(len(p) for p in pages)
+    default = [bionic.get_profile()]
+    everyone = list(bionic.get_profiles().values())
+
+    results = {}
+    for bionic_format in bionic.BIONIC_FORMATS:
+        for label, profiles in (('default', default), ('all_profiles', everyone)):
+            samples = []
+            output_bytes = 0
+            for _ in range(repeat):
+                bionic.analyze_word.cache_clear()
+                start = time.perf_counter()
+                rendered = [bionic.render_all(page, bionic_format, profiles) for page in pages]
+                samples.append(time.perf_counter() - start)
+                output_bytes = sum(len(str(r[profiles[0].name]).encode('utf-8')) for r in rendered)
+            stats = summarize(samples)
+            stats['chars_per_sec'] = round(chars / max(statistics.median(samples), 1e-9))
+            stats['output_bytes'] = output_bytes
+            results[f'{bionic_format}/{label}'] = stats
+    return results
+
+
+def bench_json(paragraphs: List[str], repeat: int) -> Dict:
+    """按内容接口的格式构造一次请求的响应（MAX_PAGES_PER_REQUEST 页仿生阅读结果），对比各后端"""
+    from app.config import settings
+    from app.utils import bionic, serializer
+    from app.utils.pagination import compute_layout
+
+    layout = compute_layout(paragraphs, 3000)
+    pages = [layout.render_page(paragraphs, i)
+             for i in range(min(layout.total_pages, settings.MAX_PAGES_PER_REQUEST))]
+
+    results = {}
+    for bionic_format in bionic.BIONIC_FORMATS:
+        payload = {
+            'success': True,
+            'content': [bionic.render_all(page, bionic_format, [bionic.get_profile()])[settings.DEFAULT_BIONIC_PROFILE]
+                        for page in pages],
+            'current_page': 1,
+            'total_pages': layout.total_pages,
+            'page_size': 3000,
+            'has_more': layout.total_pages > len(pages),
+        }
+        for backend in serializer.available_backends():
+            encoded = serializer.dumps(payload, backend)
+            dump_samples, load_samples = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                serializer.dumps(payload, backend)
+                dump_samples.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                serializer.loads(encoded, backend)
+                load_samples.append(time.perf_counter() - start)
+            results[f'{bionic_format}/{backend}'] = {
+                'dumps': summarize(dump_samples),
+                'loads': summarize(load_samples),
+                'output_bytes': len(encoded),
+            }
+    return results
+
+
+async def bench_http(entries: List[Dict], repeat: int) -> Dict:
+    """端到端延迟
+
+    每次 /api/parse 上传内容不同的同一文档（fixtures 的 nonce），测到的是实际解析而不是按内容哈希命中缓存；
+    冷读取对每份刚解析的文档请求一次与保存时不同的页面大小，需要计算分页、解压数据块并渲染，
+    热读取重复同一请求。
+    """
+    import httpx
+    from app.config import settings
+    from app.main import app
+
+    run_id = uuid.uuid4().hex[:8]
+    cold_page_size = next(size for size in PAGE_SIZES if size != settings.PAGE_SIZE)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for entry in entries:
+            key = f"{entry['format']}/{entry['size']}/{entry['lang']}"
+            filename = os.path.basename(entry['path'])
+
+            parse_samples, doc_ids = [], []
+            for index in range(repeat):
+                data = fixtures.build_fixture(entry['format'], entry['size'], entry['lang'],
+                                              nonce=f'{run_id}-{index}')
+                start = time.perf_counter()
+                response = await client.post('/api/parse', files={'file': (filename, data)})
+                parse_samples.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    results[key] = {'error': f'/api/parse {response.status_code}: {response.text[:200]}'}
+                    break
+                doc_ids.append(response.json().get('doc_id'))
+            if key in results or not all(doc_ids):
+                continue
+
+            cold, warm = [], []
+            params = {'page': 1, 'page_size': cold_page_size}
+            for samples in (cold, warm):
+                for doc_id in doc_ids:
+                    start = time.perf_counter()
+                    await client.get(f'/api/content/{doc_id}', params=params)
+                    samples.append(time.perf_counter() - start)
+            results[key] = {
+                'parse': summarize(parse_samples),
+                'content_cold': summarize(cold),
+                'content_warm': summarize(warm),
+                'content_page_size': cold_page_size,
+            }
+    return results
+
+
+async def run(args) -> Dict:
+    from app.processors import FileProcessor
+
+    formats = fixtures.FORMATS if args.formats == 'all' else tuple(args.formats.split(','))
+    sizes = tuple(args.sizes.split(','))
+    langs = tuple(args.langs.split(','))
+    manifest = fixtures.write_fixtures(args.fixture_dir, formats, sizes, langs)
+
+    report = {
+        'version': REPORT_VERSION,
+        'meta': {
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'parse': [],
+        'pagination': {},
+        'store': {},
+        'docx': {},
+        'html': {},
+        'bionic': {},
+        'json': {},
+        'http': {},
+    }
+
+    processor = FileProcessor()
+    parsed = []
+    for entry in manifest:
+        key = f"{entry['format']}/{entry['size']}/{entry['lang']}"
+        if 'error' in entry:
+            report['parse'].append({k: entry[k] for k in ('format', 'size', 'lang', 'error')})
+            continue
+        try:
+            result = await bench_parse(processor, entry, args.repeat)
+        except Exception as e:
+            report['parse'].append({**{k: entry[k] for k in ('format', 'size', 'lang')},
+                                    'error': f'{type(e).__name__}: {e}'})
+            continue
+        paragraphs = result.pop('_paragraphs')
+        report['parse'].append(result)
+        parsed.append(entry)
+        print(f"parse {key}: {result['parse']['median_ms']} ms", file=sys.stderr)
+
+        # 分页和仿生渲染只在 txt 语料上测，避免各格式重复
+        if entry['format'] == 'txt':
+            report['pagination'][key] = bench_pagination(paragraphs, args.repeat)
+            report['store'][key] = bench_store(paragraphs, args.repeat, args.fixture_dir)
+            report['bionic'][key] = bench_bionic(paragraphs, args.repeat)
+            report['json'][key] = bench_json(paragraphs, args.repeat)
+        elif entry['format'] == 'docx':
+            report['docx'][key] = bench_docx(entry['path'], args.repeat)
+        elif entry['format'] in ('html', 'md'):
+            report['html'][key] = bench_html(entry['path'], entry['format'], args.repeat)
+
+    if not args.skip_http:
+        report['http'] = await bench_http([e for e in parsed if e['size'] != 'large'], args.repeat)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='仿生阅读服务基准测试')
+    parser.add_argument('--formats', default='all', help='逗号分隔的格式列表，默认全部')
+    parser.add_argument('--sizes', default='small,medium', help='small,medium,large')
+    parser.add_argument('--langs', default='en,zh')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-http', action='store_true', help='跳过端到端接口测试')
+    parser.add_argument('--fixture-dir', default=None, help='合成文档输出目录，默认临时目录')
+    parser.add_argument('--output', default='-', help='报告输出路径，- 表示标准输出')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='reading-bench-')
+    args.fixture_dir = args.fixture_dir or os.path.join(workdir, 'fixtures')
+    # 必须在导入 app 之前设置
+    os.environ.setdefault('UPLOAD_DIR', os.path.join(workdir, 'uploads'))
+    os.environ.setdefault('REDIS_URL', 'memory://')
+    os.environ.setdefault('REQUEST_TIMING_LOG', 'false')
+
+    report = asyncio.run(run(args))
+
+    import json
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(data)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(data)
+
+
+if __name__ == '__main__':
+    main()
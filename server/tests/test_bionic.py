@@ -0,0 +1,71 @@
+"""仿生阅读渲染和按档位缓存的测试"""
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.processors import FileProcessor, _warm_tasks
+from app.utils import bionic, serializer
+
+PAGE = '<p>Reading quickly improves comprehension of the document.</p>'
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'UPLOAD_DIR', str(tmp_path))
+    monkeypatch.setattr(settings, 'REDIS_URL', 'memory://')
+    return FileProcessor()
+
+
+def _cached(processor, doc_id, profile):
+    key = processor._bionic_cache_key(doc_id, 3000, 1, 'spans', profile)
+    value = asyncio.run(processor.cache.get(key))
+    return serializer.loads(value) if value is not None else None
+
+
+def _render(processor, doc_id, profile):
+    async def _main():
+        result = await processor.render_bionic_page(doc_id, 3000, 1, PAGE, 'spans', profile)
+        await asyncio.gather(*_warm_tasks)
+        return result
+    return asyncio.run(_main())
+
+
+def test_miss_renders_only_requested_profile(processor, monkeypatch):
+    monkeypatch.setattr(settings, 'BIONIC_WARM_PROFILES', [])
+    doc_id = 'b' * 40
+    assert _render(processor, doc_id, 'light') == bionic.render_spans(PAGE, bionic.get_profile('light'))
+    assert _cached(processor, doc_id, 'light') is not None
+    assert _cached(processor, doc_id, 'default') is None and _cached(processor, doc_id, 'strong') is None
+
+
+def test_warm_profiles_rendered_in_one_pass(processor, monkeypatch):
+    monkeypatch.setattr(settings, 'BIONIC_WARM_PROFILES', ['strong', 'missing'])
+    calls = []
+    render_all = bionic.render_all
+    monkeypatch.setattr(bionic, 'render_all', lambda *args: calls.append(args) or render_all(*args))
+
+    doc_id = 'c' * 40
+    _render(processor, doc_id, 'light')
+    assert [[profile.name for profile in call[2]] for call in calls] == [['light', 'strong']]
+    assert _cached(processor, doc_id, 'strong') == bionic.render_spans(PAGE, bionic.get_profile('strong'))
+    assert _cached(processor, doc_id, 'default') is None
+
+
+def test_span_offsets_are_utf16_code_units():
+    content = '<p>Go 😀 reading 𠀀quickly</p>\n<p>naïve 𝒳-ray words</p>'
+    profile = bionic.get_profile('strong')
+    result = bionic.render_spans(content, profile)
+
+    # 模拟客户端按 JS 字符串下标（UTF-16 码元）切出加粗部分
+    units = result['text'].encode('utf-16-le')
+    bolded = [units[2 * start:2 * (start + length)].decode('utf-16-le')
+              for start, length in bionic.decode_spans(result['spans'])]
+
+    expected = [word[start:start + length]
+                for word in bionic.TOKEN_PATTERN.findall(result['text'])
+                for start, length in bionic.word_spans(word, profile)]
+    assert bolded == expected
+    # 基本平面外的字符在加粗区间内和区间之前都按两个码元计
+    assert expected[2] == '𠀀quic' and result['spans'][5] == 6
+    assert expected[4:] == ['r', 'wor']
@@ -0,0 +1,43 @@
+"""性能分析接口的访问控制测试"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.utils.profiling import ProfilingMiddleware, ProfileStore
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'UPLOAD_DIR', str(tmp_path))
+    monkeypatch.setattr(settings, 'PROFILING_ENABLED', True)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize('headers', [{}, {'X-Profile': ''}, {'X-Profile': 'anything'}])
+def test_profiles_rejected_without_configured_token(client, monkeypatch, headers):
+    monkeypatch.setattr(settings, 'PROFILE_TOKEN', '')
+    assert client.get('/api/profiles', headers=headers).status_code == 403
+    name = '20260101T000000_GET_health_0123abcd.prof'
+    assert client.get(f'/api/profiles/{name}', headers=headers).status_code == 403
+
+
+def test_profiles_require_matching_token(client, monkeypatch):
+    monkeypatch.setattr(settings, 'PROFILE_TOKEN', 's3cret')
+    assert client.get('/api/profiles').status_code == 403
+    assert client.get('/api/profiles', headers={'X-Profile': 'wrong'}).status_code == 403
+    response = client.get('/api/profiles', headers={'X-Profile': 's3cret'})
+    assert response.status_code == 200 and response.json()['profiles'] == []
+
+
+def test_header_does_not_trigger_profiling_without_token(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+    middleware = ProfilingMiddleware(None, ProfileStore(str(tmp_path)))
+    scope = {'type': 'http', 'headers': [(b'x-profile', b'')]}
+
+    monkeypatch.setattr(settings, 'PROFILE_TOKEN', '')
+    assert middleware._triggered(scope) is None
+
+    monkeypatch.setattr(settings, 'PROFILE_TOKEN', 's3cret')
+    assert middleware._triggered(scope) is None
+    assert middleware._triggered({'type': 'http', 'headers': [(b'x-profile', b's3cret')]}) == 'header'
@@ -0,0 +1,85 @@
+"""阅读统计的汇总和跨进程增量同步测试"""
+import asyncio
+import os
+
+import pytest
+
+from app.config import settings
+from app.utils.reading_stats import ReadingStatsService
+
+DOC = 'a' * 40
+
+
+class _Documents:
+    """只提供 read_page_texts 的文档管理器，记录被读取的页"""
+
+    def __init__(self):
+        self.requested = []
+
+    def resolve_page_size(self, page_size):
+        return page_size or settings.PAGE_SIZE
+
+    async def read_page_texts(self, doc_id, pages, page_size=None):
+        pages = sorted(pages)
+        self.requested.append(pages)
+        return {page: '<p>one two three</p>' for page in pages}
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    """同一 UPLOAD_DIR 下的两个工作进程"""
+    monkeypatch.setattr(settings, 'UPLOAD_DIR', str(tmp_path))
+    services = [ReadingStatsService(), ReadingStatsService()]
+    for service in services:
+        service.load()
+    return services
+
+
+def _rollup(service, documents):
+    async def _main():
+        await service.flush()
+        return await service.rollup(documents)
+    return asyncio.run(_main())
+
+
+def test_rollup_reads_only_requested_pages(workers):
+    writer, _ = workers
+    documents = _Documents()
+    writer.record('u', [{'doc_id': DOC, 'page': page, 'seconds': 30} for page in (2, 5, 2)])
+    assert _rollup(writer, documents) == 3
+    assert documents.requested == [[2, 5]]
+
+    stats = asyncio.run(writer.document('u', DOC))
+    assert stats['pages_read'] == 3 and stats['words_read'] == 9 and stats['time_read_seconds'] == 90
+
+
+def test_idle_rollup_writes_nothing(workers):
+    writer, _ = workers
+    writer.record('u', [{'doc_id': DOC, 'page': 1, 'seconds': 10}])
+    _rollup(writer, _Documents())
+    before = os.stat(writer.journal_path)
+    assert _rollup(writer, _Documents()) == 0
+    after = os.stat(writer.journal_path)
+    assert (after.st_mtime_ns, after.st_size) == (before.st_mtime_ns, before.st_size)
+
+
+def test_other_workers_apply_increments(workers, monkeypatch):
+    writer, reader = workers
+    reloads = []
+    load_snapshot = reader.stats._load_snapshot
+    monkeypatch.setattr(reader.stats, '_load_snapshot', lambda path: reloads.append(path) or load_snapshot(path))
+
+    for _ in range(3):
+        writer.record('u', [{'doc_id': DOC, 'page': 1, 'seconds': 10}])
+        _rollup(writer, _Documents())
+        assert asyncio.run(reader.user('u'))['pages_read'] == writer.stats.users['u'].pages
+    # 增量日志存在后只在首次查询时加载一次快照
+    assert len(reloads) == 1
+
+    # 增量日志过大时写入快照并换新，其他进程重新加载后结果不变
+    monkeypatch.setattr(settings, 'STATS_JOURNAL_MAX_BYTES', 1)
+    writer.record('u', [{'doc_id': DOC, 'page': 1, 'seconds': 10}])
+    _rollup(writer, _Documents())
+    assert os.path.getsize(writer.journal_path) == 0
+    assert asyncio.run(reader.user('u'))['pages_read'] == 4
+    assert len(reloads) == 2
@@ -0,0 +1,72 @@
+"""Office 二进制格式的结构和元数据提取测试"""
+import io
+
+import openpyxl
+import pytest
+from fastapi.testclient import TestClient
+from pptx import Presentation
+
+from app.config import settings
+from app.main import app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'UPLOAD_DIR', str(tmp_path))
+    monkeypatch.setattr(settings, 'REDIS_URL', 'memory://')
+    monkeypatch.setattr(settings, 'PARSE_MEMORY_LIMIT_MB', 0)
+    return TestClient(app)
+
+
+def _xlsx() -> bytes:
+    wb = openpyxl.Workbook()
+    wb.properties.title = 'Quarterly numbers'
+    wb.properties.creator = 'Finance'
+    first = wb.active
+    first.title = 'Sales'
+    first.append(['region', 'amount'])
+    first.append(['north', 10])
+    first.append(['south', 20])
+    wb.create_sheet('Costs').append(['rent', 5])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _pptx() -> bytes:
+    prs = Presentation()
+    prs.core_properties.title = 'Kickoff'
+    prs.core_properties.author = 'Team'
+    for title, body in [('Agenda', 'Goals for the quarter'), ('Timeline', 'Milestones')]:
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = title
+        slide.placeholders[1].text = body
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+
+def _upload(client, name, data):
+    response = client.post('/api/parse', files={'file': (name, data)}, params={'bionic_enabled': False})
+    assert response.status_code == 200, response.text
+    return response.json()['doc_id']
+
+
+@pytest.mark.parametrize('name, build, title, author, toc', [
+    # Sales 表名、表头和两行之后是 Costs
+    ('book.xlsx', _xlsx, 'Quarterly numbers', 'Finance', [('Sales', 0), ('Costs', 4)]),
+    ('deck.pptx', _pptx, 'Kickoff', 'Team', [('Agenda', 0), ('Timeline', 2)]),
+])
+def test_office_structure_and_metadata(client, caplog, name, build, title, author, toc):
+    doc_id = _upload(client, name, build())
+    assert '提取文档结构失败' not in caplog.text
+
+    response = client.get(f'/api/document/{doc_id}/structure')
+    assert response.status_code == 200
+    entries = response.json()['structure']['toc']
+    assert [(entry['title'], entry['position']) for entry in entries] == toc
+
+    response = client.get(f'/api/document/{doc_id}/metadata')
+    assert response.status_code == 200
+    metadata = response.json()['metadata']
+    assert metadata['title'] == title and metadata['author'] == author
@@ -0,0 +1,169 @@
+"""在线导入下载器的测试：用 http.server 在本机模拟源站"""
+import asyncio
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.config import settings
+from app.utils.source import FileTooLarge, spool_dir
+from app.utils import url_import
+from app.utils.url_import import Downloader, DownloadError
+
+BOOK = ("Hello reading world. " * 200 + "\n\n").encode() * 5
+
+
+class _Origin(BaseHTTPRequestHandler):
+    bodies = {}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/book.txt')
+            self.end_headers()
+            return
+        body = self.bodies.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        if self.path != '/chunked.txt':
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def origin():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Origin)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    _Origin.bodies = {'/book.txt': BOOK, '/big.txt': b'x' * 4096, '/chunked.txt': b'y' * 4096}
+    _Origin.requests = []
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'UPLOAD_DIR', str(tmp_path))
+    monkeypatch.setattr(settings, 'IMPORT_ALLOWED_HOSTS', {'127.0.0.1'})
+    monkeypatch.setattr(settings, 'MAX_FILE_SIZE', 1024)
+    monkeypatch.setattr(settings, 'PARSE_SPOOL_THRESHOLD', 512)
+    return Downloader()
+
+
+def _run(downloader, coro):
+    async def _main():
+        try:
+            return await coro
+        finally:
+            await downloader.close()
+    return asyncio.run(_main())
+
+
+def test_fetch_and_conditional_refetch(downloader, origin, monkeypatch):
+    monkeypatch.setattr(settings, 'MAX_FILE_SIZE', 1024 * 1024)
+    url = f'{origin}/book.txt'
+
+    async def _import_twice():
+        fetched = await downloader.fetch(url)
+        with fetched.source:
+            assert fetched.source.read_bytes() == BOOK
+        assert fetched.ext == '.txt' and not fetched.not_modified and fetched.etag
+        await downloader.save_record(url, 'a' * 40, fetched)
+
+        record = await downloader.load_record(url)
+        again = await downloader.fetch(url, record)
+        assert again.not_modified and again.source is None and again.ext == '.txt'
+        return record
+
+    record = _run(downloader, _import_twice())
+    assert record['doc_id'] == 'a' * 40
+    assert _Origin.requests == [('/book.txt', None), ('/book.txt', record['etag'])]
+
+
+def test_redirect_is_followed(downloader, origin, monkeypatch):
+    monkeypatch.setattr(settings, 'MAX_FILE_SIZE', 1024 * 1024)
+    fetched = _run(downloader, downloader.fetch(f'{origin}/redirect'))
+    with fetched.source:
+        assert fetched.ext == '.txt' and fetched.source.size == len(BOOK)
+
+
+@pytest.mark.parametrize('path', ['/big.txt', '/chunked.txt'])
+def test_body_over_max_file_size(downloader, origin, path):
+    # /api/import 把 FileTooLarge 返回为 400；未声明长度时边下载边检查，临时文件随即删除
+    with pytest.raises(FileTooLarge):
+        _run(downloader, downloader.fetch(f'{origin}{path}'))
+    assert os.listdir(spool_dir()) == []
+
+
+@pytest.mark.parametrize('url', ['ftp://127.0.0.1/book.txt', 'file:///etc/passwd', 'not a url'])
+def test_non_http_scheme_is_rejected(downloader, url):
+    with pytest.raises(DownloadError) as excinfo:
+        _run(downloader, downloader.fetch(url))
+    assert excinfo.value.status_code == 400
+
+
+@pytest.mark.parametrize('host', ['127.0.0.1', 'localhost', '169.254.169.254', '10.0.0.1', '[::1]'])
+def test_private_hosts_are_rejected(downloader, monkeypatch, host):
+    monkeypatch.setattr(settings, 'IMPORT_ALLOWED_HOSTS', set())
+    with pytest.raises(DownloadError) as excinfo:
+        _run(downloader, downloader.fetch(f'http://{host}/book.txt'))
+    assert excinfo.value.status_code == 403
+
+
+def _redirect_to_metadata(handler):
+    handler.send_response(302)
+    handler.send_header('Location', 'http://169.254.169.254/latest/meta-data/')
+    handler.end_headers()
+
+
+def test_redirect_to_private_host_is_rejected(downloader, origin, monkeypatch):
+    # 源站本身允许访问，但重定向到内网地址
+    _Origin.bodies['/book.txt'] = BOOK
+    monkeypatch.setattr(_Origin, 'do_GET', _redirect_to_metadata)
+    with pytest.raises(DownloadError) as excinfo:
+        _run(downloader, downloader.fetch(f'{origin}/book.txt'))
+    assert excinfo.value.status_code == 403
+
+
+def test_connection_uses_checked_address(downloader, origin, monkeypatch):
+    # 主机名解析一次并检查，之后直接连接该地址，Host 头保持原主机名
+    hosts = []
+
+    async def _resolve(host, port):
+        hosts.append(host)
+        return '127.0.0.1'
+
+    seen = []
+    original = _Origin.do_GET
+
+    def _record_host(handler):
+        seen.append(handler.headers.get('Host'))
+        original(handler)
+
+    monkeypatch.setattr(url_import, 'resolve_public_host', _resolve)
+    monkeypatch.setattr(_Origin, 'do_GET', _record_host)
+    monkeypatch.setattr(settings, 'MAX_FILE_SIZE', 1024 * 1024)
+    port = origin.rsplit(':', 1)[1]
+    fetched = _run(downloader, downloader.fetch(f'http://books.example:{port}/book.txt'))
+    fetched.source.close()
+    assert hosts == ['books.example']
+    assert seen == [f'books.example:{port}']